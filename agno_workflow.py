@@ -1,4 +1,7 @@
-import json
+import asyncio
+import os
+import re
+from collections import OrderedDict
 from agno.agent import Agent
 from agno.models.groq import Groq
 from agno.tools.yfinance import YFinanceTools
@@ -15,108 +18,263 @@ from agno.models.groq import Groq
 from agno.tools.googlesearch import GoogleSearchTools
 from textwrap import dedent
 from agno.utils.pprint import pprint_run_response
+from app.history import count_tokens, history, prompt_stats, relevant_memories
+from app.lazy import lazy
+from app.persistence import build_memory_db, build_storage
+from app.tool_cache import google_search_tools, yfinance_tools
+from app.semantic_cache import SEMANTIC_CACHE_ENABLED, pitch_cache, sentiment_cache
+from app.workflow_engine import AsyncWorkflow, Cached, Step, StepTiming, WorkflowRun
 load_dotenv()
 
+# Quotes fetched while the sentiment agent runs and handed to the suggestion and writer agents
+MARKET_WATCHLIST = [s for s in os.getenv("MARKET_WATCHLIST", "^NSEI,^BSESN,NIFTYBEES.NS,GOLDBEES.NS").split(",") if s]
+MARKET_DATA_TIMEOUT = float(os.getenv("MARKET_DATA_TIMEOUT", "3"))
+# Reuse the previous product suggestion when the new sentiment analysis is at least this similar
+SUGGESTION_REUSE_SIMILARITY = float(os.getenv("SUGGESTION_REUSE_SIMILARITY", "0.6"))
 
-memory_db = SqliteMemoryDb(table_name="user_memory", db_file="tmp/memory.db")
-storage = SqliteStorage(table_name="agent_sessions", db_file='tmp/agent.db')
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+# Nothing below is built at import time: the DB handles, the memory model and the
+# agents are created on first use (or by warm_up) and shared by every run in the process.
+@lazy
+def memory_db():
+    return build_memory_db("user_memory")
+
+
+@lazy
+def storage():
+    return build_storage("agent_sessions")
+
+
+@lazy
+def memory():
+    return Memory(model=Gemini(id="gemini-2.0-flash-exp"), db=memory_db.get())
+
+def format_agent_input(**sections) -> str:
+    # Plain markdown sections rather than json.dumps(..., indent=4): no escaped newlines, fewer prompt tokens.
+    # Empty sections are left out.
+    return "\n\n".join(f"## {name.replace('_', ' ').title()}\n{value}" for name, value in sections.items() if value)
+
+
+def prompt_tokens(response, message: str) -> int:
+    """Input tokens of the agent's first model call as reported by the provider, else estimated from our message."""
+    reported = (getattr(response, "metrics", None) or {}).get("input_tokens")
+    return reported[0] if reported else count_tokens(message)
+
+
+def sentiment_similarity(a: str, b: str) -> float:
+    """Word-set Jaccard similarity, used to tell whether the customer's sentiment actually moved."""
+    words_a, words_b = set(_WORD.findall(a.lower())), set(_WORD.findall(b.lower()))
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def fetch_market_snapshot(symbols) -> str:
+    # Same cached entrypoint the agents call, so these quotes are shared with their tool calls
+    quote = yfinance_tools.get().functions["get_current_stock_price"].entrypoint
+    return "\n".join(f"{symbol}: {quote(symbol)}" for symbol in symbols)
 
-memory = Memory(model=Gemini(id="gemini-2.0-flash-exp"), db=memory_db)
 
 # we can store the memory in a sqlite database for persistence and for context of the conversation
 class GPSuggestions():
-    sentiment_understanding_Agent: Agent = Agent(
-        name="Sentiment Understanding Agent",
-        role="Analyze the sentiment of the customer",
-        model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct"),
-        memory=memory,
-        enable_agentic_memory=True,
-        enable_user_memories=True,
-        storage=storage,
-        add_history_to_messages=True,
-        num_history_runs=3,
-        tools=[GoogleSearchTools()],
-        instructions=dedent("""You are expert of understanding the interest of the customer based on its conversation with the financial advisor.
-                            You will analyze the sentiment of the customer based on its conversation with the financial advisor and provide a detailed sentiment analysis, and notice all the conditions of the customer.give as much as short and to the point info that is required to understand the sentiment of the customer."""),
-        expected_output=dedent("""
-                                 #Sentiment Analysis
+    @lazy
+    def sentiment_understanding_Agent() -> Agent:
+        return Agent(
+            name="Sentiment Understanding Agent",
+            role="Analyze the sentiment of the customer",
+            model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct"),
+            memory=memory.get(),
+            enable_agentic_memory=True,
+            enable_user_memories=True,
+            # History and the relevant memories come in the message, bounded by app.history,
+            # instead of agno replaying whole runs and every stored memory into the prompt
+            add_memory_references=False,
+            storage=storage.get(),
+            tools=[google_search_tools.get()],
+            instructions=dedent("""You are expert of understanding the interest of the customer based on its conversation with the financial advisor.
+                                You will analyze the sentiment of the customer based on its conversation with the financial advisor and provide a detailed sentiment analysis, and notice all the conditions of the customer.give as much as short and to the point info that is required to understand the sentiment of the customer.
+                                The conversation so far and what you remember about the customer are given with the latest utterance. Use the `update_user_memory` tool to remember new facts about the customer."""),
+            expected_output=dedent("""
+                                     #Sentiment Analysis
                                    
-                               ##Sentiment: {What are the requirements of the customer based on its conversation with the financial advisor}
-                               ##Financial Condition: {What is the financial condition of the customer based on its conversation with the financial advisor}
-                               ##Customer Interest: {What is the interest of the customer based on its conversation with the financial advisor}
-                               ##Surrounding Factors: {What are the surrounding factors that make this product suitable for the customer}
-                               ##What Customer can afford: {What is the financial condition of the customer based on its conversation with the financial advisor}
-                               ##Final Response: {final response based on the sentiment analysis of the customer}
-                               """),
-        markdown=True,
-    )
-
-    suggestion_agent: Agent = Agent(
-        name="Product Suggestion Agent",
-        role="Suggest a financial product based on the sentiment analysis",
-        model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct"),
-        tools=[YFinanceTools()],
-        context={"fin_products": "Financial Products like Stocks, Bonds, Mutual Funds, ETFs, etc."},
-        add_context=True,
-        instructions=dedent("""You are a financial advisor. Based on the sentiment analysis provided by the Sentiment Understanding Agent, suggest a financial product that aligns with the customer's interest or can help improve their financial situation."""),
-        expected_output=dedent("""
-                               Suggested Products:
-                               ##Product Name: {product name}
-                               ##Product Description: {product description}
-                               ##Product Price: {product price}
-                               """),
-        markdown=True,
-    )
-
-    final_agent: Agent = Agent(
-        name="Writer Agent",
-        role="Write a final response based on the product suggestion",
-        model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct"),
-        tools=[GoogleSearchTools(),YFinanceTools()],
-        instructions=dedent("""You are a financial advisor. Based on the product suggestion provided by the Product Suggestion Agent, write a final response that explains the suggested financial product to the customer in a clear and concise manner."""),
-        expected_output=dedent("""
-                               #You Should Sell this product to the customer
-                               ##Product Name: {product name}
-                               ##Product Description: {product description}
-                               ##Product Price: {product price}
-                               ##Why this product is suitable for the customer: {reasoning for the product selection particularly based on the sentiment analysis of the customer}
-                               ##What are the surrounding factors that make this product suitable for the customer: {surrounding factors that make this product suitable for the customer}
-                               ##Final Response: {final response}
-                               """),
-        markdown=True,
-        add_history_to_messages=True,
-    )
-
-    def run(self, query,user_id) -> RunResponse:
-        input = query
-
-        agent_1_response: RunResponse = self.sentiment_understanding_Agent.run(input,user_id=user_id)
-        sentiment_analysis = agent_1_response.content
-        agent_2_input = {
-            "sentiment_analysis": sentiment_analysis,
-            "query": "provide suitable financial product based on the sentiment analysis of the customer",
-        }
-        agent_2_response: RunResponse = self.suggestion_agent.run(json.dumps(agent_2_input,indent=4))
-        product_suggestion = agent_2_response.content
-        final_agent_input = {
-            "product_suggestion": product_suggestion,
-            "sentiment_analysis": sentiment_analysis,
-            "query": "write a final response based on the product suggestion and sentiment analysis for the financial advisor to explain to the customer",
-        }
-        
-        agent_3_response: RunResponse = self.final_agent.run(json.dumps(final_agent_input,indent=4), user_id=user_id)
-
-        return agent_3_response.content
+                                   ##Sentiment: {What are the requirements of the customer based on its conversation with the financial advisor}
+                                   ##Financial Condition: {What is the financial condition of the customer based on its conversation with the financial advisor}
+                                   ##Customer Interest: {What is the interest of the customer based on its conversation with the financial advisor}
+                                   ##Surrounding Factors: {What are the surrounding factors that make this product suitable for the customer}
+                                   ##What Customer can afford: {What is the financial condition of the customer based on its conversation with the financial advisor}
+                                   ##Final Response: {final response based on the sentiment analysis of the customer}
+                                   """),
+            markdown=True,
+        )
+
+    @lazy
+    def suggestion_agent() -> Agent:
+        return Agent(
+            name="Product Suggestion Agent",
+            role="Suggest a financial product based on the sentiment analysis",
+            model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct"),
+            tools=[yfinance_tools.get()],
+            context={"fin_products": "Financial Products like Stocks, Bonds, Mutual Funds, ETFs, etc."},
+            add_context=True,
+            instructions=dedent("""You are a financial advisor. Based on the sentiment analysis provided by the Sentiment Understanding Agent, suggest a financial product that aligns with the customer's interest or can help improve their financial situation."""),
+            expected_output=dedent("""
+                                   Suggested Products:
+                                   ##Product Name: {product name}
+                                   ##Product Description: {product description}
+                                   ##Product Price: {product price}
+                                   """),
+            markdown=True,
+        )
+
+    @lazy
+    def final_agent() -> Agent:
+        return Agent(
+            name="Writer Agent",
+            role="Write a final response based on the product suggestion",
+            model=Groq(id="meta-llama/llama-4-scout-17b-16e-instruct"),
+            tools=[google_search_tools.get(), yfinance_tools.get()],
+            instructions=dedent("""You are a financial advisor. Based on the product suggestion provided by the Product Suggestion Agent, write a final response that explains the suggested financial product to the customer in a clear and concise manner."""),
+            expected_output=dedent("""
+                                   #You Should Sell this product to the customer
+                                   ##Product Name: {product name}
+                                   ##Product Description: {product description}
+                                   ##Product Price: {product price}
+                                   ##Why this product is suitable for the customer: {reasoning for the product selection particularly based on the sentiment analysis of the customer}
+                                   ##What are the surrounding factors that make this product suitable for the customer: {surrounding factors that make this product suitable for the customer}
+                                   ##Final Response: {final response}
+                                   """),
+            markdown=True,
+        )
+
+    # user_id -> (sentiment_analysis, product_suggestion) of the last turn that ran the suggestion agent
+    previous_turns: "OrderedDict[str, tuple]" = OrderedDict()
+    max_tracked_users = 1000
+
+    def plan(self, user_id, use_cache: bool = True, run: WorkflowRun = None) -> AsyncWorkflow:
+        # sentiment and market_data run concurrently; suggestion waits for both
+        async def sentiment(query, query_vector, **_):
+            if use_cache:
+                cached = sentiment_cache.get(user_id, query, query_vector)
+                if cached is not None:
+                    return Cached(cached)
+            memories = await asyncio.to_thread(relevant_memories, memory_db.get(), user_id, query)
+            message = format_agent_input(
+                what_you_remember_about_the_customer=memories,
+                conversation_so_far=history.render(user_id, "sentiment"),
+                latest_utterance=query,
+            )
+            response: RunResponse = await self.sentiment_understanding_Agent.arun(message, user_id=user_id)
+            if run is not None:
+                run.prompt_tokens["sentiment"] = prompt_tokens(response, message)
+            if SEMANTIC_CACHE_ENABLED:
+                sentiment_cache.put(user_id, query, response.content, query_vector)
+            return response.content
+
+        async def market_data(**_):
+            try:
+                return await asyncio.wait_for(
+                    asyncio.to_thread(fetch_market_snapshot, MARKET_WATCHLIST), MARKET_DATA_TIMEOUT
+                )
+            except Exception as e:
+                return f"Market data unavailable ({type(e).__name__})"
+
+        async def suggestion(sentiment, market_data, **_):
+            previous = self.previous_turns.get(user_id)
+            if previous and sentiment_similarity(previous[0], sentiment) >= SUGGESTION_REUSE_SIMILARITY:
+                return Cached(previous[1])
+            response: RunResponse = await self.suggestion_agent.arun(format_agent_input(
+                sentiment_analysis=sentiment,
+                market_data=market_data,
+                query="provide suitable financial product based on the sentiment analysis of the customer",
+            ))
+            self._remember(user_id, sentiment, response.content)
+            return response.content
+
+        return AsyncWorkflow(
+            Step("sentiment", sentiment),
+            Step("market_data", market_data),
+            Step("suggestion", suggestion, ("sentiment", "market_data")),
+        )
+
+    def _remember(self, user_id, sentiment, suggestion):
+        self.previous_turns[user_id] = (sentiment, suggestion)
+        self.previous_turns.move_to_end(user_id)
+        while len(self.previous_turns) > self.max_tracked_users:
+            self.previous_turns.popitem(last=False)
+
+    async def astream(self, query, user_id, run: WorkflowRun = None, use_cache: bool = True):
+        """Yields the writer agent's tokens as they arrive; step timings are recorded on `run`.
+
+        A near-duplicate of a query already answered for this user is served from
+        the semantic cache as a single chunk; `use_cache=False` forces a fresh run.
+        """
+        run = run or WorkflowRun()
+        use_cache = use_cache and SEMANTIC_CACHE_ENABLED
+        query_vector = pitch_cache.embedder.embed(query)
+        if use_cache:
+            cached = pitch_cache.get(user_id, query, query_vector)
+            if cached is not None:
+                run.mark("first_token")
+                run.timings["pitch_cache"] = StepTiming(0.0, run.elapsed(), cached=True)
+                run.emit("pitch_cache", "cached")
+                history.add_turn(user_id, query, cached)
+                yield cached
+                return
+        else:
+            pitch_cache.stats.bypassed += 1
+
+        await self.plan(user_id, use_cache, run).run(run, query=query, query_vector=query_vector)
+        final_agent_input = format_agent_input(
+            conversation_so_far=history.render(user_id, "writer"),
+            product_suggestion=run.results["suggestion"],
+            sentiment_analysis=run.results["sentiment"],
+            market_data=run.results["market_data"],
+            query="write a final response based on the product suggestion and sentiment analysis for the financial advisor to explain to the customer",
+        )
+
+        start = run.elapsed()
+        run.emit("writer", "started")
+        stream = await self.final_agent.arun(final_agent_input, user_id=user_id, stream=True)
+        tokens = []
+        async for chunk in stream:
+            if isinstance(chunk.content, str) and chunk.content:
+                if "first_token" not in run.marks:
+                    run.mark("first_token")
+                tokens.append(chunk.content)
+                yield chunk.content
+        run.timings["writer"] = StepTiming(start, run.elapsed())
+        run.emit("writer", "done")
+        run.prompt_tokens["writer"] = prompt_tokens(self.final_agent.run_response, final_agent_input)
+        for agent, count in run.prompt_tokens.items():
+            prompt_stats.record(agent, count)
+        pitch = "".join(tokens)
+        history.add_turn(user_id, query, pitch)
+        if SEMANTIC_CACHE_ENABLED:
+            pitch_cache.put(user_id, query, pitch, query_vector)
+
+    async def arun(self, query, user_id, run: WorkflowRun = None, use_cache: bool = True) -> str:
+        return "".join([token async for token in self.astream(query, user_id, run, use_cache)])
+
+    def run(self, query,user_id) -> str:
+        return asyncio.run(self.arun(query, user_id))
+
+
+def warm_up():
+    """Builds the shared agents (and their memory and storage) ahead of the first request."""
+    GPSuggestions.sentiment_understanding_Agent.get()
+    GPSuggestions.suggestion_agent.get()
+    GPSuggestions.final_agent.get()
+
 
 def run_workflow(query: str, user_id: str):
-    import time
-    st = time.time()
-    
     generate = GPSuggestions()
 
-    help_GP = generate.run(query,user_id)
-    et = time.time()
-    print(f"Time taken: {et - st} seconds")
+    run = WorkflowRun()
+    help_GP = asyncio.run(generate.arun(query, user_id, run))
+    print(f"Time taken: {run.elapsed():.2f} seconds ({run.timing_summary()})")
     print(help_GP)
 
-run_workflow("i have earnings around 10000 rupees per month and my expenses are around 8000 rupees per month. i want to invest in a financial product that can help me grow my wealth. i am interested in stocks and mutual funds. i am looking for a product that can give me good returns in the long term. i am also looking for a product that is low risk and has a good track record.", "user_123")
\ No newline at end of file
+if __name__ == "__main__":
+    run_workflow("i have earnings around 10000 rupees per month and my expenses are around 8000 rupees per month. i want to invest in a financial product that can help me grow my wealth. i am interested in stocks and mutual funds. i am looking for a product that can give me good returns in the long term. i am also looking for a product that is low risk and has a good track record.", "user_123")
@@ -0,0 +1,223 @@
+"""Pluggable streaming ASR engines, selected per deployment with ASR_ENGINE.
+
+    whisper      openai-whisper on utterances cut by the segmenter (default)
+    ct2          faster-whisper (CTranslate2) with int8 weights, for CPU-only nodes
+    assemblyai   AssemblyAI realtime WebSocket
+    fake         deterministic text, no model; for running the pipeline offline
+"""
+import os
+import time
+import zlib
+from dataclasses import dataclass
+from typing import List
+
+from dotenv import load_dotenv
+
+from app.asr_pool import CallASRQueue
+from app.audio_codec import PolyphaseResampler, float_to_pcm16
+from app.audio_preprocess import get_preprocessor
+from app.audio_segmenter import UtteranceSegmenter
+from app.lazy import lazy
+from app.transcriber import transcribe_user_audio, whisper_model
+
+load_dotenv()
+
+ASR_ENGINE = os.getenv("ASR_ENGINE", "whisper")
+CT2_MODEL = os.getenv("CT2_MODEL", "base.en")
+CT2_COMPUTE_TYPE = os.getenv("CT2_COMPUTE_TYPE", "int8")
+CT2_THREADS = int(os.getenv("CT2_THREADS", "1"))
+# ASR_ENGINE=fake: text for each utterance is picked from this file (one per line) instead of describing the
+# audio, and transcribing takes FAKE_ASR_RTF x the utterance's duration, as a model would
+FAKE_TRANSCRIPTS = os.getenv("FAKE_TRANSCRIPTS")
+FAKE_ASR_RTF = float(os.getenv("FAKE_ASR_RTF", "0"))
+
+ENGINES = {}
+
+
+def register_engine(name: str):
+    def wrap(cls):
+        ENGINES[name] = cls
+        return cls
+    return wrap
+
+
+def create_engine(call_sid: str, name: str = None) -> "StreamingASR":
+    name = name or ASR_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown ASR engine {name!r}, expected one of {sorted(ENGINES)}")
+    return ENGINES[name](call_sid)
+
+
+@dataclass
+class ASRResult:
+    text: str
+    is_final: bool
+    start: float = 0.0
+    end: float = 0.0
+
+
+class StreamingASR:
+    """Per-call recognizer fed with decoded 8 kHz int16 Twilio frames.
+
+    start()     once, when the media stream starts
+    feed()      every frame; must return quickly, inference happens elsewhere
+    partials()  drains the interim and final results produced since the last call
+    finalize()  flushes pending audio, releases resources, returns the final transcript
+    """
+
+    def __init__(self, call_sid: str):
+        self.call_sid = call_sid
+        self._results: List[ASRResult] = []
+        self._finals: List[str] = []
+
+    async def start(self):
+        pass
+
+    async def feed(self, samples):
+        raise NotImplementedError
+
+    def partials(self) -> List[ASRResult]:
+        results, self._results = self._results, []
+        return results
+
+    async def finalize(self) -> str:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _emit(self, result: ASRResult):
+        self._results.append(result)
+        if result.is_final:
+            self._finals.append(result.text)
+
+
+class SegmentedEngine(StreamingASR):
+    """Runs a batch recognizer on segmenter utterances through the shared ASR pool.
+
+    Subclasses set `transcribe_fn` to a module-level function (so it can be
+    sent to a process pool) taking 8 kHz int16 samples and returning text.
+    """
+
+    transcribe_fn = None
+
+    def __init__(self, call_sid: str):
+        super().__init__(call_sid)
+        self.segmenter = UtteranceSegmenter()
+        self.queue = None
+
+    async def start(self):
+        self.queue = CallASRQueue(type(self).transcribe_fn, self._on_transcript)
+
+    async def feed(self, samples):
+        if self.queue is None:
+            await self.start()
+        for segment in self.segmenter.push(samples):
+            self.queue.submit(segment)
+
+    async def _on_transcript(self, segment, text: str):
+        self._emit(ASRResult(text, segment.is_final, segment.start, segment.end))
+
+    async def finalize(self) -> str:
+        if self.queue is not None:
+            for segment in self.segmenter.flush():
+                self.queue.submit(segment)
+            await self.queue.drain()
+        self.close()
+        return " ".join(self._finals)
+
+    def close(self):
+        if self.queue is not None:
+            self.queue.close()
+
+
+@lazy
+def ct2_model():
+    from faster_whisper import WhisperModel
+
+    return WhisperModel(CT2_MODEL, device="cpu", compute_type=CT2_COMPUTE_TYPE, cpu_threads=CT2_THREADS)
+
+
+def _ct2_transcribe(samples) -> str:
+    try:
+        audio = get_preprocessor().process(samples)
+        segments, _ = ct2_model.get().transcribe(audio, beam_size=1, language="en", condition_on_previous_text=False)
+        return " ".join(s.text.strip() for s in segments)
+    except Exception as e:
+        print(f"Transcription error: {e}")
+        return ""
+
+
+def warm_up(name: str = None):
+    """Loads the configured engine's model now instead of on the first utterance."""
+    name = name or ASR_ENGINE
+    if name == "whisper":
+        whisper_model.get()
+    elif name == "ct2":
+        ct2_model.get()
+
+
+@lazy
+def fake_transcripts():
+    if not FAKE_TRANSCRIPTS:
+        return []
+    with open(FAKE_TRANSCRIPTS, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _fake_transcribe(samples) -> str:
+    seconds = len(samples) / 8000
+    if FAKE_ASR_RTF:
+        time.sleep(seconds * FAKE_ASR_RTF)
+    lines = fake_transcripts.get()
+    if lines:
+        # Same audio, same text; different utterances spread over the file
+        return lines[zlib.crc32(samples.tobytes()) % len(lines)]
+    return f"utterance of {seconds:.2f} seconds"
+
+
+@register_engine("whisper")
+class WhisperEngine(SegmentedEngine):
+    transcribe_fn = transcribe_user_audio
+
+
+@register_engine("ct2")
+class CTranslate2Engine(SegmentedEngine):
+    transcribe_fn = _ct2_transcribe
+
+
+@register_engine("fake")
+class FakeEngine(SegmentedEngine):
+    transcribe_fn = _fake_transcribe
+
+
+@register_engine("assemblyai")
+class AssemblyAIEngine(StreamingASR):
+    """Streams 16 kHz PCM16 to AssemblyAI, which does its own endpointing."""
+
+    def __init__(self, call_sid: str, client=None):
+        super().__init__(call_sid)
+        from app.assemblyai_stream import Transcriber, client as shared_client
+
+        self.transcriber = Transcriber(call_sid, on_result=self._on_message, client=client or shared_client)
+        self.resampler = PolyphaseResampler()
+
+    async def start(self):
+        await self.transcriber.connect()
+
+    async def feed(self, samples):
+        await self.transcriber.send_audio(float_to_pcm16(self.resampler.process(samples)).tobytes())
+
+    def _on_message(self, text: str, is_final: bool, start: float, end: float):
+        self._emit(ASRResult(text, is_final, start, end))
+
+    async def finalize(self) -> str:
+        await self.transcriber.close()
+        return " ".join(self._finals)
+
+    def close(self):
+        # The media stream ended without a Twilio stop, so finalize() never ran: end the session in the
+        # background, and stop the reader from reconnecting for a call that is gone
+        if not self.transcriber.closing:
+            self.transcriber.closing = True
+            self.transcriber.client.spawn(self.transcriber.close(), name=f"assemblyai-close-{self.call_sid}")
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app import telemetry
+
+load_dotenv()
+
+ASR_POOL_KIND = os.getenv("ASR_POOL_KIND", "thread")  # "thread" or "process"
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "2"))
+ASR_QUEUE_SIZE = int(os.getenv("ASR_QUEUE_SIZE", "4"))
+ASR_MAX_COALESCED_S = float(os.getenv("ASR_MAX_COALESCED_S", "30"))
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if ASR_POOL_KIND == "process":
+            _executor = ProcessPoolExecutor(max_workers=ASR_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=ASR_WORKERS, thread_name_prefix="asr")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class PoolStats:
+    def __init__(self):
+        self.queue_depth = 0  # jobs waiting across all calls
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.infer_total = 0.0
+
+    def as_dict(self):
+        done = max(self.completed, 1)
+        return {
+            "pool_kind": ASR_POOL_KIND,
+            "workers": ASR_WORKERS,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "wait_avg_s": self.wait_total / done,
+            "wait_max_s": self.wait_max,
+            "inference_avg_s": self.infer_total / done,
+        }
+
+
+stats = PoolStats()
+
+
+def _timed_call(fn, audio, enqueued_at):
+    started = time.time()
+    return fn(audio), started - enqueued_at, time.time() - started
+
+
+class CallASRQueue:
+    """Bounded per-call queue in front of the shared inference pool.
+
+    Each call has at most one job running in the pool, so a call that falls
+    behind only delays itself. While a job runs, new segments wait here and
+    the backlog is bounded as follows:
+
+    * partials: only the newest waiting partial is kept, and it is discarded
+      as soon as the final for the same utterance arrives;
+    * finals: up to `maxsize` wait; beyond that the two oldest are coalesced
+      into one job (audio concatenated) so no speech is lost, and if the
+      coalesced audio would exceed `ASR_MAX_COALESCED_S` the oldest final
+      is dropped instead.
+    """
+
+    def __init__(self, transcribe_fn, on_result, maxsize: int = ASR_QUEUE_SIZE, sample_rate: int = 8000):
+        self.transcribe_fn = transcribe_fn
+        self.on_result = on_result
+        self.maxsize = maxsize
+        self.max_coalesced = int(ASR_MAX_COALESCED_S * sample_rate)
+        self._finals = deque()
+        self._partial = None
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    @property
+    def depth(self):
+        return len(self._finals) + (self._partial is not None)
+
+    def submit(self, segment):
+        before = self.depth
+        stats.submitted += 1
+        now = time.time()
+        if segment.is_final:
+            if self._partial is not None:
+                self._partial = None
+                stats.dropped += 1
+            self._finals.append((segment, now))
+            if len(self._finals) > self.maxsize:
+                self._shed()
+        else:
+            if self._partial is not None:
+                stats.coalesced += 1
+            self._partial = (segment, now)
+        stats.queue_depth += self.depth - before
+        self._wakeup.set()
+
+    def _shed(self):
+        (first, t0), (second, _) = self._finals.popleft(), self._finals.popleft()
+        if len(first.audio) + len(second.audio) <= self.max_coalesced:
+            first.audio = np.concatenate((first.audio, second.audio))
+            first.end = second.end
+            stats.coalesced += 1
+            self._finals.appendleft((first, t0))
+        else:
+            stats.dropped += 1
+            self._finals.appendleft((second, t0))
+
+    def _next(self):
+        if self._finals:
+            return self._finals.popleft()
+        item, self._partial = self._partial, None
+        return item
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = self._next()
+            if item is None:
+                if self._closed:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            segment, enqueued_at = item
+            stats.queue_depth -= 1
+            stats.in_flight += 1
+            try:
+                text, waited, took = await loop.run_in_executor(
+                    get_executor(), _timed_call, self.transcribe_fn, segment.audio, enqueued_at
+                )
+                stats.wait_total += waited
+                stats.wait_max = max(stats.wait_max, waited)
+                stats.infer_total += took
+                stats.completed += 1
+                telemetry.record("asr_queue_wait", waited, start=enqueued_at)
+                telemetry.record("asr_inference", took, start=enqueued_at + waited, final=segment.is_final)
+            except Exception as e:
+                print(f"ASR worker error: {e}")
+                continue
+            finally:
+                stats.in_flight -= 1
+            if text:
+                try:
+                    await self.on_result(segment, text)
+                except Exception as e:
+                    # A failing consumer loses this result, not the rest of the call's transcription
+                    print(f"ASR result handler error: {e}")
+
+    async def drain(self):
+        """Finishes the queued finals, then stops the worker."""
+        if self._partial is not None:
+            self._partial = None
+            stats.queue_depth -= 1
+        self._closed = True
+        self._wakeup.set()
+        await self._task
+
+    def close(self):
+        self._closed = True
+        stats.queue_depth -= self.depth
+        self._finals.clear()
+        self._partial = None
+        self._task.cancel()
@@ -2,43 +2,233 @@ import aiohttp
 import asyncio
 import base64
 import json
+import random
 import websockets
 import os
+from collections import deque
 from dotenv import load_dotenv
 load_dotenv()
 
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+# Point at a local stand-in (app.benchmarks.assemblyai_standin) to test without the real service
+ASSEMBLYAI_URL = os.getenv("ASSEMBLYAI_URL", "wss://api.assemblyai.com/v2/realtime/ws")
+SAMPLE_RATE = 16000
+CONNECT_ATTEMPTS = int(os.getenv("ASSEMBLYAI_CONNECT_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("ASSEMBLYAI_BACKOFF_BASE", "0.2"))
+BACKOFF_MAX = float(os.getenv("ASSEMBLYAI_BACKOFF_MAX", "5"))
+# Audio kept for replay after a reconnect: everything since the last final transcript, up to this much
+REPLAY_SECONDS = float(os.getenv("ASSEMBLYAI_REPLAY_SECONDS", "10"))
+# A pre-warmed socket not claimed by its call within this long is closed (the service bills open sessions)
+PREWARM_TTL = float(os.getenv("ASSEMBLYAI_PREWARM_TTL", "20"))
+
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+
+class AssemblyAIClient:
+    """Process-wide connection manager: one HTTP session for every call,
+    pre-warmed sockets for calls about to start, and supervised background tasks."""
+
+    def __init__(self, url: str = ASSEMBLYAI_URL):
+        self.url = url
+        self._session = None
+        self._warm = {}  # call_sid -> (websocket, expiry timer)
+        self._tasks = set()
+        self.connects = self.reconnects = self.prewarm_hits = self.failures = 0
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=60),
+                headers={"Authorization": ASSEMBLYAI_API_KEY or ""},
+            )
+        return self._session
+
+    async def connect(self):
+        """Opens a realtime socket, retrying with jittered exponential backoff."""
+        for attempt in range(CONNECT_ATTEMPTS):
+            try:
+                ws = await self.session().ws_connect(f"{self.url}?sample_rate={SAMPLE_RATE}", heartbeat=15)
+                self.connects += 1
+                return ws
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.failures += 1
+                if attempt == CONNECT_ATTEMPTS - 1:
+                    raise
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                print(f"AssemblyAI connect failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def prewarm(self, call_sid: str):
+        """Opens the call's socket ahead of its media stream, e.g. while the TwiML greeting plays."""
+        if call_sid in self._warm:
+            return
+        try:
+            ws = await self.connect()
+        except Exception as e:
+            print(f"AssemblyAI pre-warm failed for {call_sid}: {e}")
+            return
+        timer = asyncio.get_running_loop().call_later(PREWARM_TTL, self._expire, call_sid)
+        self._warm[call_sid] = (ws, timer)
+
+    def _expire(self, call_sid: str):
+        stale = self._warm.pop(call_sid, None)
+        if stale is not None:
+            self.spawn(stale[0].close(), name=f"assemblyai-expire-{call_sid}")
+
+    async def acquire(self, call_sid: str):
+        warm = self._warm.pop(call_sid, None)
+        if warm is not None:
+            warm[1].cancel()
+            if not warm[0].closed:
+                self.prewarm_hits += 1
+                return warm[0]
+        return await self.connect()
+
+    def spawn(self, coro, name: str = None) -> asyncio.Task:
+        """create_task that is kept referenced, logged if it fails and cancelled on shutdown."""
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"AssemblyAI task {task.get_name()} failed: {task.exception()!r}")
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for ws, timer in self._warm.values():
+            timer.cancel()
+            await ws.close()
+        self._warm.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def as_dict(self):
+        return {
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "prewarm_hits": self.prewarm_hits,
+            "connect_failures": self.failures,
+            "tasks": len(self._tasks),
+            "warm": len(self._warm),
+        }
+
+
+client = AssemblyAIClient()
+
 
 class Transcriber:
-    def __init__(self, call_sid: str):
+    def __init__(self, call_sid: str, on_result=None, client: AssemblyAIClient = client):
         self.call_sid = call_sid
-        self.session = None
+        self.on_result = on_result
+        self.client = client
         self.ws = None
-        self.transcript = ""
+        self.reader = None
+        self.closing = False
+        # (offset into the call's audio in bytes, chunk) not yet covered by a final transcript
+        self.replay = deque()
+        self.replay_bytes = 0
+        self.sent_bytes = 0
+        self.session_offset = 0.0  # call time at which the current session's audio starts
 
     async def connect(self):
-        headers = {
-            "Authorization": ASSEMBLYAI_API_KEY,
-        }
-        self.session = aiohttp.ClientSession()
-        self.ws = await self.session.ws_connect("wss://api.assemblyai.com/v2/realtime/ws?sample_rate=16000", headers=headers)
-        asyncio.create_task(self.receive_transcript())
+        self.ws = await self.client.acquire(self.call_sid)
+        self.reader = self.client.spawn(self.receive_transcript(), name=f"assemblyai-{self.call_sid}")
 
     async def send_audio(self, audio_bytes: bytes):
-        if self.ws:
-            await self.ws.send_bytes(audio_bytes)
+        self.replay.append((self.sent_bytes, audio_bytes))
+        self.replay_bytes += len(audio_bytes)
+        self.sent_bytes += len(audio_bytes)
+        while self.replay_bytes > REPLAY_SECONDS * BYTES_PER_SECOND:
+            self.replay_bytes -= len(self.replay.popleft()[1])
+        if self.ws is not None and not self.ws.closed:
+            try:
+                await self.ws.send_bytes(audio_bytes)
+            except ConnectionError:
+                pass  # the reader notices the drop and reconnects; this chunk is in the replay buffer
+
+    def _trim_replay(self, call_time: float):
+        # Audio before the final transcript's end will never be needed again
+        cutoff = int(call_time * BYTES_PER_SECOND)
+        while self.replay and self.replay[0][0] + len(self.replay[0][1]) <= cutoff:
+            self.replay_bytes -= len(self.replay.popleft()[1])
 
     async def receive_transcript(self):
-        async for msg in self.ws:
-            if msg.type == aiohttp.WSMsgType.TEXT:
-                data = json.loads(msg.data)
-                if data.get("text"):
-                    print(f"Transcript ({self.call_sid}):", data["text"])
-                    self.transcript += data["text"] + " "
-
-    async def close(self):
-        if self.ws:
+        attempt = 0
+        while True:
+            try:
+                async for msg in self.ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        data = json.loads(msg.data)
+                        if data.get("message_type") == "SessionTerminated":
+                            return
+                        if data.get("text"):
+                            attempt = 0
+                            self._on_transcript(data)
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        break
+            except aiohttp.ClientError as e:
+                print(f"AssemblyAI stream for {self.call_sid} failed: {e}")
+            if self.closing:
+                return
+            try:
+                await self._reconnect(attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                # Keep trying for as long as the call lasts; the replay buffer is bounded meanwhile
+                print(f"AssemblyAI reconnect for {self.call_sid} failed: {e}")
+            attempt += 1
+
+    def _on_transcript(self, data: dict):
+        is_final = data.get("message_type") == "FinalTranscript"
+        start = self.session_offset + data.get("audio_start", 0) / 1000
+        end = self.session_offset + data.get("audio_end", 0) / 1000
+        if self.on_result:
+            self.on_result(data["text"], is_final, start, end)
+        if is_final:
+            self._trim_replay(end)
+            print(f"Transcript ({self.call_sid}):", data["text"])
+
+    async def _reconnect(self, attempt: int):
+        if not self.ws.closed:
             await self.ws.close()
-        if self.session:
-            await self.session.close()
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** min(attempt, 16)))
+        print(f"AssemblyAI stream for {self.call_sid} dropped, reconnecting in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        if self.closing:
+            return
+        ws = await self.client.connect()
+        self.client.reconnects += 1
+        # The new session's clock starts at the first replayed byte
+        replayed = self.replay[0][0] if self.replay else self.sent_bytes
+        self.session_offset = replayed / BYTES_PER_SECOND
+        # Audio keeps arriving while we replay; only hand the socket over once we have caught up
+        try:
+            while pending := [(offset, chunk) for offset, chunk in self.replay if offset >= replayed]:
+                for offset, chunk in pending:
+                    await ws.send_bytes(chunk)
+                    replayed = offset + len(chunk)
+        except ConnectionError:
+            await ws.close()
+            raise
+        self.ws = ws
 
+    async def close(self, timeout: float = 5.0):
+        self.closing = True
+        if self.ws and not self.ws.closed:
+            try:
+                await self.ws.send_str(json.dumps({"terminate_session": True}))
+            except ConnectionError:
+                pass
+        if self.reader is not None:
+            # Let the last finals arrive before SessionTerminated, then stop waiting
+            try:
+                await asyncio.wait_for(self.reader, timeout)
+            except Exception:
+                pass  # timed out (and so cancelled) or already reported by the client
+        if self.ws:
+            await self.ws.close()
@@ -0,0 +1,110 @@
+"""G.711 mu-law codec and 8 kHz -> 16 kHz resampling for Twilio media.
+
+Twilio Media Streams carry 8 kHz mono mu-law, one byte per sample. Both
+directions of the codec are table lookups and the resampler is a
+two-phase polyphase FIR, so a whole frame is handled with a few NumPy
+calls and no per-sample Python.
+"""
+import numpy as np
+
+ULAW_BIAS = 0x84
+ULAW_CLIP_14 = 8159  # 14-bit clip level of the reference encoder
+SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+
+
+def _build_decode_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    sign = u & 0x80
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    magnitude = (((mantissa << 3) + ULAW_BIAS) << exponent) - ULAW_BIAS
+    return np.where(sign != 0, -magnitude, magnitude).astype(np.int16)
+
+
+def _build_encode_table() -> np.ndarray:
+    # Indexed by the int16 sample reinterpreted as uint16. Follows the 14-bit
+    # reference encoder (CCITT G.711 / Sun g711.c), same as audioop.lin2ulaw.
+    x = np.arange(65536, dtype=np.int32)
+    x = np.where(x >= 32768, x - 65536, x) >> 2
+    mask = np.where(x < 0, 0x7F, 0xFF)
+    v = np.minimum(np.abs(x), ULAW_CLIP_14) + (ULAW_BIAS >> 2)
+    seg = np.searchsorted(SEGMENT_ENDS, v)
+    uval = np.where(seg >= 8, 0x7F, (np.minimum(seg, 7) << 4) | ((v >> (np.minimum(seg, 7) + 1)) & 0x0F))
+    return (uval ^ mask).astype(np.uint8)
+
+
+ULAW_DECODE = _build_decode_table()
+ULAW_ENCODE = _build_encode_table()
+
+
+def ulaw_to_pcm16(payload: bytes) -> np.ndarray:
+    return ULAW_DECODE[np.frombuffer(payload, dtype=np.uint8)]
+
+
+def pcm16_to_ulaw(samples: np.ndarray) -> bytes:
+    return ULAW_ENCODE[np.asarray(samples, dtype=np.int16).view(np.uint16)].tobytes()
+
+
+def design_halfband(taps_per_phase: int = 16, beta: float = 6.0) -> np.ndarray:
+    """Kaiser-windowed sinc lowpass at the 8 kHz Nyquist, gain 2 for 2x upsampling."""
+    n = np.arange(2 * taps_per_phase) - (2 * taps_per_phase - 1) / 2
+    h = np.sinc(n / 2) * np.kaiser(2 * taps_per_phase, beta)
+    return (2 * h / h.sum()).astype(np.float32)
+
+
+class PolyphaseResampler:
+    """Streaming 2x upsampler (8 kHz -> 16 kHz) that carries filter state across chunks.
+
+    Feeding a call frame by frame gives the same output as feeding it in one
+    piece, so there are no clicks at 20 ms frame boundaries.
+    """
+
+    def __init__(self, taps_per_phase: int = 16):
+        h = design_halfband(taps_per_phase)
+        # Column p holds phase p's taps, reversed so a sliding window times the
+        # matrix gives both output phases of an input sample in one matmul
+        self.phases = np.stack((h[0::2][::-1], h[1::2][::-1]), axis=1).copy()
+        self.history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+
+    def reset(self):
+        self.history[:] = 0
+
+    def process(self, samples: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """int16 (or float32 in [-1, 1]) at 8 kHz -> float32 at 16 kHz, length 2 * len(samples)."""
+        n = len(samples)
+        if out is None:
+            out = np.empty(2 * n, dtype=np.float32)
+        if n == 0:
+            return out
+        x = np.asarray(samples, dtype=np.float32)
+        if samples.dtype == np.int16:
+            x = x * (1.0 / 32768.0)
+        xx = np.concatenate((self.history, x))
+        windows = np.lib.stride_tricks.sliding_window_view(xx, len(self.history) + 1)
+        np.matmul(windows, self.phases, out=out.reshape(n, 2))
+        self.history[:] = xx[len(xx) - len(self.history):]
+        return out
+
+
+def float_to_pcm16(audio: np.ndarray) -> np.ndarray:
+    return (np.clip(audio, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+def resample_clip(samples: np.ndarray, rate: int, target: int = 8000, taps: int = 63) -> np.ndarray:
+    """Whole-clip resampling to `target` Hz (float32 in [-1, 1]) for pre-transcoding stored audio.
+
+    Lowpasses at 0.45 * min(rate, target) before interpolating so downsampling
+    does not alias; not for live frames, where PolyphaseResampler keeps state.
+    """
+    x = np.asarray(samples, dtype=np.float32)
+    if samples.dtype == np.int16:
+        x = x * (1.0 / 32768.0)
+    if rate == target or len(x) == 0:
+        return x
+    if target < rate:
+        cutoff = 0.45 * target / rate
+        n = np.arange(taps) - (taps - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(taps, 6.0)
+        x = np.convolve(x, (h / h.sum()).astype(np.float32), mode="same")
+    t = np.arange(int(len(x) * target / rate)) * (rate / target)
+    return np.interp(t, np.arange(len(x)), x).astype(np.float32)
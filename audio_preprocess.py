@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+
+from app.audio_codec import PolyphaseResampler
+
+MODEL_SAMPLE_RATE = 16000
+
+
+class AudioPreprocessor:
+    """Turns 8 kHz int16 utterances into the float32 16 kHz array Whisper takes.
+
+    Output lands in a buffer that is reused across calls and only grows, so
+    steady-state transcription does no large allocation here. The returned
+    array is a view into that buffer and is only valid until the next
+    `process` call.
+    """
+
+    def __init__(self, capacity_s: float = 30.0):
+        self.resampler = PolyphaseResampler()
+        self._out = np.zeros(int(capacity_s * MODEL_SAMPLE_RATE), dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        n = len(samples)
+        if 2 * n > len(self._out):
+            self._out = np.zeros(2 * n, dtype=np.float32)
+        # Each utterance is resampled on its own; the segmenter's preroll covers the filter warm-up
+        self.resampler.reset()
+        return self.resampler.process(samples, out=self._out[: 2 * n])
+
+
+_local = threading.local()
+
+
+def get_preprocessor() -> AudioPreprocessor:
+    """One preprocessor per ASR worker thread, since each owns its buffers."""
+    pre = getattr(_local, "preprocessor", None)
+    if pre is None:
+        pre = _local.preprocessor = AudioPreprocessor()
+    return pre
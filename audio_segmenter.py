@@ -0,0 +1,156 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+
+@dataclass
+class Segment:
+    audio: np.ndarray  # int16 samples of the utterance so far
+    is_final: bool
+    start: float  # seconds since the start of the stream
+    end: float
+
+
+class RingBuffer:
+    """Fixed-size int16 ring buffer addressed by absolute sample position."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=np.int16)
+        self.total = 0  # samples written since the start of the stream
+
+    def write(self, samples: np.ndarray):
+        n = len(samples)
+        if n >= self.capacity:
+            # Only the tail survives; each sample still goes to its absolute position modulo capacity
+            self._data[:] = np.roll(samples[-self.capacity:], (self.total + n) % self.capacity)
+            self.total += n
+            return
+        pos = self.total % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = samples[:first]
+        self._data[:n - first] = samples[first:]
+        self.total += n
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        start = max(start, self.total - self.capacity, 0)
+        n = end - start
+        if n <= 0:
+            return np.zeros(0, dtype=np.int16)
+        pos = start % self.capacity
+        if pos + n <= self.capacity:
+            return self._data[pos:pos + n].copy()
+        return np.concatenate((self._data[pos:], self._data[:n - (self.capacity - pos)]))
+
+
+class UtteranceSegmenter:
+    """Collects ~20 ms media frames and cuts them into utterances.
+
+    Speech is detected with an energy gate over an adaptive noise floor. An
+    utterance ends after `hangover_ms` of silence (or at `max_utterance_s`),
+    and while it is open a partial segment is emitted at most every
+    `partial_interval_s` of audio so callers can show interim text.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 8000,
+        max_utterance_s: float = 15.0,
+        preroll_ms: int = 200,
+        hangover_ms: int = 600,
+        onset_ms: int = 60,
+        min_speech_ms: int = 250,
+        partial_interval_s: float = 1.5,
+        threshold_ratio: float = 3.0,
+        min_rms: float = 200.0,
+    ):
+        self.sample_rate = sample_rate
+        self.max_utterance = int(max_utterance_s * sample_rate)
+        self.preroll = int(preroll_ms * sample_rate / 1000)
+        self.hangover = int(hangover_ms * sample_rate / 1000)
+        self.onset = int(onset_ms * sample_rate / 1000)
+        self.min_speech = int(min_speech_ms * sample_rate / 1000)
+        self.partial_interval = int(partial_interval_s * sample_rate)
+        self.threshold_ratio = threshold_ratio
+        self.min_rms = min_rms
+
+        self.ring = RingBuffer(self.max_utterance + self.preroll + sample_rate)
+        self.noise_floor = min_rms / threshold_ratio
+        self.in_speech = False
+        self._onset_run = 0
+        self._silence_run = 0
+        self._voiced = 0
+        self._utt_start = 0
+        self._last_partial = 0
+
+        self.frames = 0
+        self.partials = 0
+        self.finals = 0
+
+    def is_speech(self, samples: np.ndarray) -> bool:
+        if len(samples) == 0:
+            return False
+        x = samples.astype(np.float32)
+        rms = float(np.sqrt(np.dot(x, x) / len(x)))
+        speech = rms > max(self.min_rms, self.noise_floor * self.threshold_ratio)
+        if not speech:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return speech
+
+    def push(self, samples: np.ndarray) -> List[Segment]:
+        self.frames += 1
+        n = len(samples)
+        speech = self.is_speech(samples)
+        self.ring.write(samples)
+        now = self.ring.total
+        events = []
+
+        if not self.in_speech:
+            self._onset_run = self._onset_run + n if speech else 0
+            if self._onset_run >= self.onset:
+                self.in_speech = True
+                self._utt_start = max(now - self._onset_run - self.preroll, 0)
+                self._last_partial = now
+                self._voiced = self._onset_run
+                self._silence_run = 0
+            return events
+
+        if speech:
+            self._voiced += n
+            self._silence_run = 0
+        else:
+            self._silence_run += n
+
+        if self._silence_run >= self.hangover or now - self._utt_start >= self.max_utterance:
+            final = self._close(now)
+            if final is not None:
+                events.append(final)
+        elif now - self._last_partial >= self.partial_interval:
+            self._last_partial = now
+            self.partials += 1
+            events.append(self._segment(now, is_final=False))
+        return events
+
+    def flush(self) -> List[Segment]:
+        """Closes the open utterance, if any, at the end of the stream."""
+        if not self.in_speech:
+            return []
+        final = self._close(self.ring.total)
+        return [final] if final is not None else []
+
+    def _close(self, now: int):
+        self.in_speech = False
+        self._onset_run = 0
+        if self._voiced < self.min_speech:
+            return None
+        self.finals += 1
+        return self._segment(now, is_final=True)
+
+    def _segment(self, now: int, is_final: bool) -> Segment:
+        return Segment(
+            audio=self.ring.read(self._utt_start, now),
+            is_final=is_final,
+            start=self._utt_start / self.sample_rate,
+            end=now / self.sample_rate,
+        )
@@ -0,0 +1,186 @@
+"""Serving public_audio/: safe names, strong ETags and telephony-native variants.
+
+Twilio plays 8 kHz μ-law no matter what it fetches, so a 44.1 kHz WAV or a
+128 kbps mp3 is mostly bytes it downloads only to throw away. Every clip
+can be served as `<stem>.ulaw.wav` instead: 8 kHz mono μ-law in a WAV
+container, 8 KB per second of audio. Variants are transcoded once, written
+next to the source, and rebuilt if the source changes. PCM WAVs are
+transcoded with NumPy; mp3s need an ffmpeg binary (FFMPEG_BIN or PATH),
+without which the mp3 itself is served.
+"""
+import hashlib
+import os
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import wave
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.audio_codec import float_to_pcm16, pcm16_to_ulaw, resample_clip
+from app.tts_cache import AUDIO_DIR, PREFIX, tts_cache
+
+load_dotenv()
+
+FFMPEG = os.getenv("FFMPEG_BIN") or shutil.which("ffmpeg")
+TELEPHONY_SUFFIX = ".ulaw.wav"
+TELEPHONY_RATE = 8000
+MEDIA_TYPES = {".wav": "audio/wav", ".mp3": "audio/mpeg"}
+# Content-addressed names never change content, so clients may keep them for good
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+MUTABLE_CACHE = "no-cache"  # anything else is revalidated; with the ETag that is a 304 without a body
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,200}$")
+_etags: Dict[str, Tuple[int, int, str]] = {}  # path -> (mtime_ns, size, etag)
+_building: Dict[str, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def safe_path(filename: str, directory: str = AUDIO_DIR) -> Optional[str]:
+    """Path of `filename` inside `directory`, or None for anything that could escape it."""
+    if not _SAFE_NAME.match(filename) or ".." in filename:
+        return None
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, filename))
+    return path if os.path.dirname(path) == root else None
+
+
+def media_type(filename: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(filename)[1], "application/octet-stream")
+
+
+def is_content_addressed(filename: str) -> bool:
+    return filename.startswith(PREFIX)
+
+
+def cache_control(filename: str) -> str:
+    return IMMUTABLE_CACHE if is_content_addressed(filename) else MUTABLE_CACHE
+
+
+def etag(path: str, stat: os.stat_result) -> str:
+    """Strong ETag: the content hash already in the name, else a hash of the bytes (memoized per mtime/size)."""
+    name = os.path.basename(path)
+    if is_content_addressed(name):
+        return '"' + name[len(PREFIX):].replace(".", "-") + '"'
+    cached = _etags.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    tag = f'"{digest.hexdigest()[:32]}"'
+    _etags[path] = (stat.st_mtime_ns, stat.st_size, tag)
+    return tag
+
+
+def not_modified(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or tag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+
+def telephony_name(filename: str) -> str:
+    if filename.endswith(TELEPHONY_SUFFIX):
+        return filename
+    return os.path.splitext(filename)[0] + TELEPHONY_SUFFIX
+
+
+def ulaw_wav(ulaw: bytes, rate: int = TELEPHONY_RATE) -> bytes:
+    """8-bit μ-law mono WAV (format tag 7), which Twilio <Play> accepts as is."""
+    fmt = struct.pack("<HHIIHHH", 7, 1, rate, rate, 1, 8, 0)
+    fact = struct.pack("<I", len(ulaw))
+    pad = b"\0" if len(ulaw) % 2 else b""
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"fact" + struct.pack("<I", 4) + fact
+            + b"data" + struct.pack("<I", len(ulaw)) + ulaw + pad)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def _decode_pcm_wav(path: str) -> Optional[np.ndarray]:
+    try:
+        with wave.open(path, "rb") as f:
+            if f.getsampwidth() != 2:
+                return None
+            rate, channels = f.getframerate(), f.getnchannels()
+            samples = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+    except (wave.Error, EOFError):
+        return None  # not PCM (e.g. already μ-law), leave it to ffmpeg
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return float_to_pcm16(resample_clip(samples, rate, TELEPHONY_RATE))
+
+
+def _decode_ffmpeg(path: str) -> Optional[np.ndarray]:
+    if not FFMPEG:
+        return None
+    result = subprocess.run(
+        [FFMPEG, "-v", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(TELEPHONY_RATE), "-"],
+        capture_output=True, timeout=60,
+    )
+    if result.returncode != 0:
+        print(f"ffmpeg could not decode {path}: {result.stderr.decode(errors='replace')[:200]}")
+        return None
+    return np.frombuffer(result.stdout, dtype="<i2")
+
+
+def decode_audio(path: str) -> Optional[np.ndarray]:
+    """8 kHz int16 mono samples of a WAV or anything ffmpeg reads; None if it cannot be decoded here."""
+    samples = _decode_pcm_wav(path) if path.endswith(".wav") else None
+    return samples if samples is not None else _decode_ffmpeg(path)
+
+
+def _source_for(variant: str, directory: str) -> Optional[str]:
+    stem = variant[: -len(TELEPHONY_SUFFIX)]
+    for ext in (".wav", ".mp3"):
+        path = safe_path(stem + ext, directory)
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def build_telephony_variant(variant: str, directory: str = AUDIO_DIR) -> Optional[str]:
+    """Path of the 8 kHz μ-law variant, transcoding it first if it is missing or older than its source.
+
+    Returns None when there is no source or it cannot be decoded here; callers then serve the source.
+    """
+    path = safe_path(variant, directory)
+    source = _source_for(variant, directory) if path else None
+    if source is None:
+        return path if path and os.path.exists(path) else None
+    with _lock:
+        building = _building.setdefault(path, threading.Lock())
+    with building:  # concurrent first requests transcode once
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+            return path
+        samples = decode_audio(source)
+        if samples is None:
+            return None
+        data = ulaw_wav(pcm16_to_ulaw(samples))
+        if is_content_addressed(variant) and os.path.dirname(path) == os.path.realpath(tts_cache.directory):
+            tts_cache.put(variant, data)  # counted against, and evicted with, the TTS cache budget
+        else:
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+    return path
+
+
+def resolve(filename: str, directory: str = AUDIO_DIR) -> Optional[str]:
+    """File to send for `filename`: the telephony variant (its source if that cannot be built), or the file itself."""
+    if filename.endswith(TELEPHONY_SUFFIX):
+        return build_telephony_variant(filename, directory) or _source_for(filename, directory)
+    path = safe_path(filename, directory)
+    return path if path and os.path.isfile(path) else None
+
+
+def prewarm_telephony(phrases):
+    """Transcodes the cached clips of `phrases` ahead of their first <Play>."""
+    for phrase in phrases:
+        clip = tts_cache.lookup(phrase)
+        if clip:
+            build_telephony_variant(telephony_name(clip))
@@ -0,0 +1,176 @@
+"""Local stand-in for the AssemblyAI realtime WebSocket, plus a self-test.
+
+The server speaks enough of the v2 realtime protocol for Transcriber:
+SessionBegins, a PartialTranscript every second of audio, a FinalTranscript
+every two seconds, and SessionTerminated after {"terminate_session": true}.
+With --drop-after it cuts the first connection once that many seconds of
+audio have arrived, to exercise reconnect and replay; with --refuse it then
+answers that many connection attempts with a 503.
+
+    python -m app.benchmarks.assemblyai_standin --port 8765          # serve; then
+    ASSEMBLYAI_URL=ws://localhost:8765/v2/realtime/ws uvicorn app.main:app ...
+
+    python -m app.benchmarks.assemblyai_standin --selftest           # stream fake calls through it
+"""
+import argparse
+import asyncio
+import json
+
+from aiohttp import WSMsgType, web
+
+BYTES_PER_SECOND = 16000 * 2
+
+
+def make_app(
+    drop_after: float = None, refuse: int = 0, partial_every: float = 1.0, final_every: float = 2.0,
+) -> web.Application:
+    state = {"sessions": 0, "dropped": False, "refusing": 0}
+
+    async def realtime(request):
+        if state["refusing"]:
+            state["refusing"] -= 1
+            return web.Response(status=503)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        state["sessions"] += 1
+        session = state["sessions"]
+        await ws.send_str(json.dumps({"message_type": "SessionBegins", "session_id": f"standin-{session}"}))
+        received, final_end, partial_at = 0, 0, 0
+
+        async def final(upto_ms):
+            nonlocal final_end
+            await ws.send_str(json.dumps({
+                "message_type": "FinalTranscript", "audio_start": final_end, "audio_end": upto_ms,
+                "text": f"session {session} words {final_end}-{upto_ms}",
+            }))
+            final_end = upto_ms
+
+        async for msg in ws:
+            if msg.type == WSMsgType.BINARY:
+                received += len(msg.data)
+                seconds = received / BYTES_PER_SECOND
+                if drop_after and not state["dropped"] and seconds >= drop_after:
+                    state["dropped"] = True
+                    state["refusing"] = refuse
+                    request.transport.close()  # abrupt, no close frame
+                    break
+                if seconds - final_end / 1000 >= final_every:
+                    await final(int(seconds * 1000))
+                elif seconds - partial_at >= partial_every:
+                    partial_at = seconds
+                    await ws.send_str(json.dumps({
+                        "message_type": "PartialTranscript", "audio_start": final_end,
+                        "audio_end": int(seconds * 1000), "text": "partial",
+                    }))
+            elif msg.type == WSMsgType.TEXT and json.loads(msg.data).get("terminate_session"):
+                if received * 1000 // BYTES_PER_SECOND > final_end:
+                    await final(received * 1000 // BYTES_PER_SECOND)
+                await ws.send_str(json.dumps({"message_type": "SessionTerminated"}))
+                break
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/v2/realtime/ws", realtime)
+    app["state"] = state
+    return app
+
+
+async def serve(app: web.Application):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"ws://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v2/realtime/ws"
+
+
+async def selftest(seconds: float, drop_after: float):
+    from app import assemblyai_stream
+
+    app = make_app(drop_after)
+    runner, url = await serve(app)
+    client = assemblyai_stream.AssemblyAIClient(url)
+    client.spawn(client.prewarm("CA-selftest"))
+    await asyncio.sleep(0.2)
+    finals = []
+    transcriber = assemblyai_stream.Transcriber(
+        "CA-selftest", client=client,
+        on_result=lambda text, is_final, start, end: is_final and finals.append((start, end, text)),
+    )
+    await transcriber.connect()
+    chunk = bytes(640)  # 20 ms of 16 kHz PCM16
+    for _ in range(int(seconds * 50)):
+        await transcriber.send_audio(chunk)
+        await asyncio.sleep(0.001)
+    await transcriber.close()
+
+    covered = finals[-1][1] if finals else 0.0
+    print(f"streamed {seconds:.1f}s, sessions {app['state']['sessions']}, transcript covers {covered:.2f}s")
+    for start, end, text in finals:
+        print(f"  {start:6.2f}-{end:6.2f}  {text}")
+    print("client:", client.as_dict())
+    assert abs(covered - seconds) < 0.05, "transcript does not cover the whole call"
+    assert client.as_dict()["tasks"] == 0, "reader task leaked"
+
+    # A media stream that drops without a Twilio stop: only engine.close() runs
+    from app.asr_engines import AssemblyAIEngine
+
+    engine = AssemblyAIEngine("CA-selftest-dropped", client=client)
+    await engine.start()
+    for _ in range(50):
+        await engine.transcriber.send_audio(chunk)
+        await asyncio.sleep(0.001)
+    engine.close()
+    engine.close()  # main.py calls it again after finalize(); must not start a second close
+    for _ in range(100):
+        if client.as_dict()["tasks"] == 0:
+            break
+        await asyncio.sleep(0.1)
+    print("client after dropped call:", client.as_dict())
+    await client.shutdown()
+    await runner.cleanup()
+    assert client.as_dict()["tasks"] == 0, "reader task leaked after close() without stop"
+    assert engine.transcriber.ws.closed, "AssemblyAI socket left open after close() without stop"
+
+    # The service stays down for longer than one connect() retries: the reader must keep trying
+    app = make_app(drop_after=0.5, refuse=assemblyai_stream.CONNECT_ATTEMPTS + 2)
+    runner, url = await serve(app)
+    client = assemblyai_stream.AssemblyAIClient(url)
+    finals.clear()
+    transcriber = assemblyai_stream.Transcriber(
+        "CA-selftest-outage", client=client,
+        on_result=lambda text, is_final, start, end: is_final and finals.append((start, end, text)),
+    )
+    await transcriber.connect()
+    for _ in range(50):
+        await transcriber.send_audio(chunk)
+        await asyncio.sleep(0.001)
+    for _ in range(300):
+        if client.reconnects:
+            break
+        await asyncio.sleep(0.1)
+    await transcriber.close()
+    covered = finals[-1][1] if finals else 0.0
+    print(f"after outage: transcript covers {covered:.2f}s, client:", client.as_dict())
+    await client.shutdown()
+    await runner.cleanup()
+    assert client.reconnects == 1, "reader gave up while the service was down"
+    assert abs(covered - 1.0) < 0.05, "audio sent during the outage was not replayed"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--drop-after", type=float, default=None)
+    parser.add_argument("--refuse", type=int, default=0)
+    parser.add_argument("--selftest", action="store_true")
+    parser.add_argument("--seconds", type=float, default=8.0)
+    args = parser.parse_args()
+    if args.selftest:
+        asyncio.run(selftest(args.seconds, args.drop_after or 3.0))
+    else:
+        web.run_app(make_app(args.drop_after, args.refuse), port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Golden-file check and per-core throughput for app.audio_codec.
+
+The golden file holds the full mu-law decode table, the mu-law encoding of
+an int16 sweep (both generated with the stdlib audioop reference codec),
+and the 16 kHz output of a chirp fed through the resampler in 20 ms frames.
+The check runs before any timing, and the script exits non-zero on a
+mismatch.
+
+    python -m app.benchmarks.bench_audio_codec [--update-golden]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.audio_codec import PolyphaseResampler, pcm16_to_ulaw, ulaw_to_pcm16
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden", "audio_codec.npz")
+FRAME = 160  # 20 ms at 8 kHz
+CALL_FRAMES = 30000  # a 10 minute call
+
+
+def sweep():
+    return np.arange(-32768, 32768, 7, dtype=np.int16)
+
+
+def chirp():
+    t = np.arange(4000) / 8000
+    return (12000 * np.sin(2 * np.pi * (100 + 3600 * t) * t)).astype(np.int16)
+
+
+def resample_framed(samples):
+    r = PolyphaseResampler()
+    return np.concatenate([r.process(samples[i:i + FRAME]) for i in range(0, len(samples), FRAME)])
+
+
+def compute():
+    return {
+        "ulaw_decode": ulaw_to_pcm16(bytes(range(256))),
+        "ulaw_encode": np.frombuffer(pcm16_to_ulaw(sweep()), dtype=np.uint8),
+        "resample_chirp": resample_framed(chirp()),
+    }
+
+
+def update_golden():
+    golden = compute()
+    try:
+        import audioop  # removed in Python 3.13
+
+        golden["ulaw_decode"] = np.frombuffer(audioop.ulaw2lin(bytes(range(256)), 2), dtype=np.int16)
+        golden["ulaw_encode"] = np.frombuffer(audioop.lin2ulaw(sweep().tobytes(), 2), dtype=np.uint8)
+    except ImportError:
+        print("audioop unavailable; codec goldens taken from the current implementation")
+    os.makedirs(os.path.dirname(GOLDEN), exist_ok=True)
+    np.savez_compressed(GOLDEN, **golden)
+    print(f"wrote {GOLDEN}")
+
+
+def check_golden() -> bool:
+    golden = np.load(GOLDEN)
+    current = compute()
+    ok = True
+    for key in golden.files:
+        if key == "resample_chirp":
+            match = np.allclose(golden[key], current[key], atol=1e-5)
+        else:
+            match = np.array_equal(golden[key], current[key])
+        print(f"golden {key:<15} {'ok' if match else 'MISMATCH'}")
+        ok &= match
+    return ok
+
+
+def throughput():
+    rng = np.random.default_rng(0)
+    frames = [pcm16_to_ulaw(rng.integers(-8000, 8000, FRAME, dtype=np.int16)) for _ in range(100)]
+    call = [frames[i % 100] for i in range(CALL_FRAMES)]
+
+    start = time.perf_counter()
+    for payload in call:
+        ulaw_to_pcm16(payload)
+    decode = time.perf_counter() - start
+
+    r = PolyphaseResampler()
+    out = np.empty(2 * FRAME, dtype=np.float32)
+    pcm = [ulaw_to_pcm16(p) for p in frames]
+    start = time.perf_counter()
+    for i in range(CALL_FRAMES):
+        r.process(pcm[i % 100], out=out)
+    resample = time.perf_counter() - start
+
+    pcm_frame = pcm[0]
+    start = time.perf_counter()
+    for _ in range(CALL_FRAMES):
+        pcm16_to_ulaw(pcm_frame)
+    encode = time.perf_counter() - start
+
+    print(f"{CALL_FRAMES} frames (10 min call), single core:")
+    for name, took in (("mu-law decode", decode), ("8k->16k resample", resample), ("mu-law encode", encode)):
+        print(f"  {name:<17} {CALL_FRAMES / took:>10,.0f} frames/s  ({took * 1e3:.1f} ms per call)")
+
+
+def main():
+    if "--update-golden" in sys.argv:
+        update_golden()
+    if not check_golden():
+        sys.exit(1)
+    throughput()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Per-utterance audio overhead before and after the in-memory path.
+
+"before" replays what transcriber.py used to do ahead of the model call:
+write the samples to a temp WAV, then decode it back through the same
+ffmpeg command whisper.load_audio runs, then delete the file.
+"after" is AudioPreprocessor.process on reused buffers.
+The model itself is not run, so only the plumbing is measured.
+
+Run from the directory that contains the app package:
+    python -m app.benchmarks.bench_audio_path
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from app.audio_preprocess import AudioPreprocessor
+
+
+def legacy_path(samples: np.ndarray) -> np.ndarray:
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+        path = tmp.name
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(samples.tobytes())
+    cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-i", path,
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", "16000", "-"]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    os.remove(path)
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def bench(fn, samples, repeat):
+    fn(samples)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(samples)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    rng = np.random.default_rng(0)
+    for seconds in (0.02, 2.0, 10.0):
+        samples = rng.integers(-8000, 8000, int(seconds * 8000), dtype=np.int16)
+        after = bench(AudioPreprocessor().process, samples, 2000)
+        line = f"{seconds:>6.2f}s chunk  in-memory {after * 1e6:9.1f} us"
+        if shutil.which("ffmpeg"):
+            before = bench(legacy_path, samples, 20)
+            line += f"  temp-file+ffmpeg {before * 1e6:10.1f} us  ({before / after:,.0f}x)"
+        else:
+            line += "  temp-file+ffmpeg: skipped (ffmpeg not on PATH)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Concurrent fetches of one clip from /audio, the way Twilio pulls <Play> media.
+
+A 30 s 44.1 kHz stereo PCM WAV is put in a scratch public_audio/ and the
+real serve_audio route is run under uvicorn. Each mode fetches with
+--concurrency clients until --requests are done:
+
+  - original:    the full WAV, what every playback used to download
+  - telephony:   its 8 kHz μ-law variant (<stem>.ulaw.wav), transcoded on the first fetch
+  - revalidate:  the variant with If-None-Match, answered 304 without a body
+  - range:       the first 64 KB of the original, as a seeking player would ask
+
+    python -m app.benchmarks.bench_audio_serving [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import aiohttp
+import numpy as np
+
+SECONDS = 30
+RATE = 44100
+
+
+def write_clip(path: str):
+    t = np.arange(SECONDS * RATE) / RATE
+    tone = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(np.repeat(tone, 2).tobytes())
+
+
+def serve(port: int):
+    import uvicorn
+    from fastapi import FastAPI
+
+    from app import twilio_audio_inject
+
+    app = FastAPI()
+    app.include_router(twilio_audio_inject.router)
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    return server
+
+
+async def fetch_all(url: str, requests: int, concurrency: int, headers=None):
+    latencies, received, statuses = [], 0, set()
+    remaining = requests
+
+    async def client(session):
+        nonlocal remaining, received
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            async with session.get(url, headers=headers) as res:
+                body = await res.read()
+                statuses.add(res.status)
+            latencies.append(time.perf_counter() - started)
+            received += len(body)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "status": sorted(statuses),
+        "req/s": requests / elapsed,
+        "MB": received / 1e6,
+        "p50 ms": 1000 * statistics.median(latencies),
+        "p95 ms": 1000 * latencies[int(len(latencies) * 0.95)],
+    }
+
+
+async def bench(requests: int, concurrency: int, port: int):
+    base = f"http://127.0.0.1:{port}/audio"
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(f"{base}/clip.ulaw.wav") as res:
+                    etag = res.headers["ETag"]
+                    variant_size = len(await res.read())
+                break
+            except aiohttp.ClientConnectionError:
+                await asyncio.sleep(0.1)
+    print(f"original {os.path.getsize('public_audio/clip.wav') / 1e6:.1f} MB, telephony variant {variant_size / 1e6:.2f} MB")
+    print(f"{'mode':>11} {'status':>7} {'req/s':>8} {'MB':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    modes = [
+        ("original", f"{base}/clip.wav", None),
+        ("telephony", f"{base}/clip.ulaw.wav", None),
+        ("revalidate", f"{base}/clip.ulaw.wav", {"If-None-Match": etag}),
+        ("range", f"{base}/clip.wav", {"Range": "bytes=0-65535"}),
+    ]
+    for name, url, headers in modes:
+        r = await fetch_all(url, requests, concurrency, headers)
+        print(f"{name:>11} {','.join(map(str, r['status'])):>7} {r['req/s']:>8.0f} {r['MB']:>9.1f} "
+              f"{r['p50 ms']:>8.2f} {r['p95 ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.path[:] = [os.path.abspath(p or ".") for p in sys.path]  # keep `app` importable from the new cwd
+        os.chdir(tmp)  # AUDIO_DIR is relative to the working directory
+        os.makedirs("public_audio")
+        write_clip("public_audio/clip.wav")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        server = serve(port)
+        asyncio.run(bench(args.requests, args.concurrency, port))
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Concurrent-call capacity: simulated Twilio media streams against a real server.
+
+Starts `python -m app.run` with WEB_CONCURRENCY=--workers (and the Redis
+stand-in when there is more than one), ASR_ENGINE=fake so the number is the
+server's own per-call cost (μ-law decode, segmentation, transcript,
+registry) rather than a model's. Each simulated call streams 20 ms μ-law
+frames in real time: 1.5 s of noise standing in for speech, then 0.7 s of
+near silence. Near the end of each call its session is fetched over HTTP,
+which with several workers usually lands on a worker that does not hold
+the call, and an injection clear is sent the same way.
+
+CPU time of the server's process tree is read from /proc (Linux), so the
+report includes CPU milliseconds per second of call audio and the calls one
+core could carry at that rate.
+
+    python -m app.benchmarks.bench_calls [--calls 10 50 100] [--seconds 15] [--workers 2]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+import websockets
+
+from app.audio_codec import pcm16_to_ulaw
+
+FRAME_S = 0.02
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def speech_frames(seconds: float):
+    rng = np.random.default_rng(0)
+    frames, t = [], 0.0
+    while t < seconds:
+        loud = (t % 2.2) < 1.5
+        samples = rng.normal(0, 3000 if loud else 30, 160).clip(-32768, 32767).astype(np.int16)
+        frames.append(base64.b64encode(pcm16_to_ulaw(samples)).decode())
+        t += FRAME_S
+    return frames
+
+
+def tree_cpu_seconds(root: int) -> float:
+    """utime + stime of `root` and its descendants."""
+    stats = {}
+    for pid in os.listdir("/proc"):
+        if pid.isdigit():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                stats[int(pid)] = (int(fields[1]), (int(fields[11]) + int(fields[12])) / CLK_TCK)
+            except (OSError, IndexError):
+                pass
+    tree, frontier = {root}, [root]
+    while frontier:
+        parent = frontier.pop()
+        children = [pid for pid, (ppid, _) in stats.items() if ppid == parent and pid not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    return sum(stats[pid][1] for pid in tree if pid in stats)
+
+
+async def simulate_call(index: int, ws_url: str, http: aiohttp.ClientSession, base: str, frames, results):
+    call_sid = f"CAbench{index:05d}{random.randrange(1 << 20)}"
+    lag = []
+    await asyncio.sleep(random.uniform(0, FRAME_S))  # staggered, like real calls, so frames do not all land at once
+    async with websockets.connect(ws_url, max_queue=None) as ws:
+        await ws.send(json.dumps({"event": "start", "start": {"callSid": call_sid, "streamSid": f"MZ{call_sid}"}}))
+        started = time.perf_counter()
+        for k, payload in enumerate(frames):
+            due = started + k * FRAME_S
+            if (delay := due - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            lag.append(time.perf_counter() - due)
+            await ws.send(json.dumps({"event": "media", "media": {"payload": payload}}))
+            if k == len(frames) - 25:  # half a second before the end, while the call is still live
+                t0 = time.perf_counter()
+                async with http.get(f"{base}/calls/{call_sid}") as res:
+                    snapshot = await res.json() if res.status == 200 else None
+                results["snapshot_ms"].append(1000 * (time.perf_counter() - t0))
+                async with http.post(f"{base}/inject/clear", json={"call_sid": call_sid}) as res:
+                    results["clear_ok"].append(res.status == 200)
+                if snapshot is not None:
+                    results["segments"].append(len(snapshot["segments"]))
+                    results["remote"].append(snapshot["worker"])
+                else:
+                    results["segments"].append(0)
+        await ws.send(json.dumps({"event": "stop"}))
+    results["lag_ms"].extend(1000 * x for x in lag)
+
+
+async def run_level(calls: int, seconds: float, port: int, server_pid: int):
+    frames = speech_frames(seconds)
+    results = {"lag_ms": [], "snapshot_ms": [], "clear_ok": [], "segments": [], "remote": []}
+    base = f"http://127.0.0.1:{port}"
+    async with aiohttp.ClientSession() as http:
+        cpu_before, wall_before = tree_cpu_seconds(server_pid), time.perf_counter()
+        await asyncio.gather(*(
+            simulate_call(i, f"ws://127.0.0.1:{port}/audio", http, base, frames, results) for i in range(calls)
+        ))
+        cpu = tree_cpu_seconds(server_pid) - cpu_before
+        wall = time.perf_counter() - wall_before
+    call_seconds = calls * seconds
+    per_call_second_ms = 1000 * cpu / call_seconds
+    lag = sorted(results["lag_ms"])
+    return {
+        "calls": calls,
+        "cpu_cores": cpu / wall,
+        "cpu_ms_per_call_s": per_call_second_ms,
+        "calls_per_core": 1000 / per_call_second_ms if per_call_second_ms else float("inf"),
+        "send_lag_p95_ms": lag[int(len(lag) * 0.95)],
+        "snapshot_p50_ms": statistics.median(results["snapshot_ms"]),
+        "clear_ok": sum(results["clear_ok"]) / len(results["clear_ok"]),
+        "segments_per_call": statistics.mean(results["segments"]),
+        "workers_seen": len(set(results["remote"])),
+    }
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "PORT": str(port), "RELOAD": "0", "ASR_ENGINE": "fake",
+           "AUTO_PITCH": "0", "WARMUP": "", "NGROK_URL": os.getenv("NGROK_URL", "https://bench.invalid"),
+           "REDIS_STANDIN_PORT": str(port + 1)}
+    server = subprocess.Popen([sys.executable, "-m", "app.run"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+
+    server = start_server(args.workers, args.port)
+    try:
+        time.sleep(1.0)  # let every worker finish its startup
+        print(f"workers={args.workers}, {args.seconds:.0f}s calls, ASR_ENGINE=fake, cores available={os.cpu_count()}")
+        print(f"{'calls':>6} {'cores':>6} {'cpu ms/call-s':>14} {'calls/core':>11} {'lag p95 ms':>11} "
+              f"{'snap p50 ms':>12} {'clear ok':>9} {'segs/call':>10} {'workers':>8}")
+        for calls in args.calls:
+            r = asyncio.run(run_level(calls, args.seconds, args.port, server.pid))
+            print(f"{r['calls']:>6} {r['cpu_cores']:>6.2f} {r['cpu_ms_per_call_s']:>14.2f} {r['calls_per_core']:>11.0f} "
+                  f"{r['send_lag_p95_ms']:>11.1f} {r['snapshot_p50_ms']:>12.1f} {r['clear_ok']:>9.0%} "
+                  f"{r['segments_per_call']:>10.1f} {r['workers_seen']:>8}")
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Import-time benchmark for the server modules.
+
+Each module is imported in a fresh interpreter (so nothing is cached) and
+timed end to end, then `-X importtime` shows where the time goes. Importing
+must not load models or open databases; that is what the lazy singletons
+and the lifespan warm-up are for.
+
+    python -m app.benchmarks.bench_import [module ...]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ["app.main", "app.agno_workflow"]
+RUNS = 5
+
+
+def wall_time(module: str) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def top_imports(module: str, n: int = 8):
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Only imports made directly by the interpreter or the module itself, so nested ones are not counted twice
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    baseline = wall_time("json")
+    for module in sys.argv[1:] or MODULES:
+        try:
+            took = wall_time(module)
+        except subprocess.CalledProcessError as e:
+            print(f"{module}: import failed\n{e.stderr.decode()[-500:]}")
+            continue
+        print(f"{module}: {took * 1e3:.0f} ms (interpreter start {baseline * 1e3:.0f} ms)")
+        for cumulative_us, name in top_imports(module):
+            print(f"    {cumulative_us / 1e3:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Memory retrieval cost as a user's memory count grows.
+
+For each size, a user gets that many synthetic memories written through
+IndexedMemoryDb into a temporary SQLite file, then the same utterance is
+answered with:
+
+  - load-all: every memory read from the table and put in the prompt, as agno does by default
+  - top-k:    IndexedMemoryDb.search (MEMORY_TOP_K memories)
+
+Retrieval latency and the prompt tokens spent on memories should stay flat
+for top-k.
+
+    python -m app.benchmarks.bench_memory_index [--sizes 10 100 1000 5000]
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from agno.memory.v2.db.schema import MemoryRow
+
+from app import persistence
+from app.history import MEMORY_TOP_K, count_tokens
+
+FACTS = [
+    "earns around {n} rupees a month", "has a son in school", "pays {n} rupees rent", "prefers low risk products",
+    "already holds a gold ETF", "asked about SIPs in mutual funds", "is saving for a wedding in {n} months",
+    "has a home loan of {n} rupees", "distrusts stocks after a loss", "wants tax saving options",
+]
+QUERY = "my salary is about 25000 and I want a safe investment for my son's education"
+RUNS = 50
+
+
+def populate(db, user_id: str, count: int):
+    for i in range(count):
+        fact = random.choice(FACTS).format(n=random.randint(1, 100) * 1000)
+        db.upsert_memory(MemoryRow(id=f"{user_id}-{i}", user_id=user_id, memory={"memory": f"Customer {fact}"}))
+
+
+def timed(fn) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return 1000 * statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        persistence.SQLITE_DIR = tmp
+        db = persistence.build_memory_db()
+        db.create()
+        print(f"index backend: {db.as_dict()['backend']}, k={MEMORY_TOP_K}")
+        print(f"{'memories':>9} {'load-all ms':>12} {'tokens':>8} {'top-k ms':>9} {'tokens':>7}")
+        for size in args.sizes:
+            user_id = f"user_{size}"
+            populate(db, user_id, size)
+            db.search(user_id, QUERY, MEMORY_TOP_K)  # build the index outside the timing
+            load_all = lambda: [m.memory["memory"] for m in db.read_memories(user_id=user_id)]
+            top_k = lambda: db.search(user_id, QUERY, MEMORY_TOP_K)
+            print(f"{size:>9} {timed(load_all):>12.2f} {count_tokens(chr(10).join(load_all())):>8} "
+                  f"{timed(top_k):>9.3f} {count_tokens(chr(10).join(top_k())):>7}")
+
+
+if __name__ == "__main__":
+    main()
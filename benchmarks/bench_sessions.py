@@ -0,0 +1,109 @@
+"""Concurrent agent-session throughput for the storage backends.
+
+Each simulated session does what an agent run does to storage: read the
+session, then upsert it with the new turn appended, a few turns in a row.
+Several worker processes (standing in for uvicorn workers) run sessions
+from a thread pool against the same database:
+
+  - baseline:     SqliteStorage(db_file=...), as the agents were wired before
+  - pooled-wal:   the shared pooled engine with WAL (persistence.build_storage without write-behind)
+  - write-behind: pooled-wal plus the batched write-behind buffer
+
+    python -m app.benchmarks.bench_sessions [--workers 4] [--threads 8] [--sessions 400] [--url postgresql+psycopg://...]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from agno.storage.session.agent import AgentSession
+
+TURNS = 3
+TURN_TEXT = "customer earns around 10000 a month and wants a low risk product " * 8
+
+
+def make_storage(kind: str, url: str):
+    from app import persistence
+
+    if kind == "baseline":
+        from agno.storage.sqlite import SqliteStorage
+
+        return SqliteStorage(table_name="agent_sessions", db_file=url[len("sqlite:///"):])
+    persistence.AGENT_DB_URL = url
+    return persistence.build_storage("agent_sessions", write_behind=kind == "write-behind")
+
+
+def one_session(storage, user_id: str):
+    session_id = str(uuid.uuid4())
+    runs = []
+    for turn in range(TURNS):
+        storage.read(session_id, user_id)
+        runs.append({"input": TURN_TEXT, "output": TURN_TEXT, "turn": turn})
+        storage.upsert(AgentSession(
+            session_id=session_id, user_id=user_id, agent_id="bench",
+            memory={"runs": runs}, session_data={}, agent_data={"name": "bench"}, extra_data={},
+        ))
+
+
+def worker(kind, url, threads, sessions, ready, go, results):
+    storage = make_storage(kind, url)
+    ready.set()
+    go.wait()
+    errors = 0
+
+    def session(i):
+        nonlocal errors
+        try:
+            one_session(storage, f"user_{os.getpid()}_{i % 50}")
+        except Exception:  # "database is locked" and friends
+            errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(session, range(sessions)))
+    if hasattr(storage, "close"):
+        storage.close()  # count the final flush, the data has to reach the database
+    results.put((time.perf_counter() - start, errors))
+
+
+def run(kind: str, url: str, workers: int, threads: int, sessions: int):
+    make_storage(kind, url).create()  # once up front, workers racing to create it would fail
+    ctx = multiprocessing.get_context("spawn")
+    go, results = ctx.Event(), ctx.Queue()
+    readies = [ctx.Event() for _ in range(workers)]
+    procs = [ctx.Process(target=worker, args=(kind, url, threads, sessions // workers, r, go, results))
+             for r in readies]
+    for p in procs:
+        p.start()
+    for r in readies:
+        r.wait()
+    go.set()
+    outcomes = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    completed = (sessions // workers) * workers - sum(errors for _, errors in outcomes)
+    return completed / max(elapsed for elapsed, _ in outcomes), sum(errors for _, errors in outcomes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=400)
+    parser.add_argument("--url", help="server database to benchmark instead of temporary SQLite files")
+    args = parser.parse_args()
+
+    kinds = ["pooled-wal", "write-behind"] if args.url else ["baseline", "pooled-wal", "write-behind"]
+    print(f"{args.workers} workers x {args.threads} threads, {args.sessions} sessions of {TURNS} turns")
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in kinds:
+            url = args.url or f"sqlite:///{os.path.join(tmp, kind + '.db')}"
+            rate, errors = run(kind, url, args.workers, args.threads, args.sessions)
+            print(f"  {kind:<13} {rate:8.1f} sessions/s  {errors} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-frame cost of the tracing in /audio, with TRACING off and on.
+
+Times exactly what the media branch of main.audio_stream adds to a frame
+(two perf_counter reads and record_frame) around an empty body, so the
+number is the instrumentation alone. Also reports the cost of a non-frame
+span (kept in the call's trace) and of rendering /metrics.
+
+    python -m app.benchmarks.bench_telemetry [--frames 200000]
+"""
+import argparse
+import time
+
+from app import telemetry
+from app.telemetry import Tracer
+
+
+def per_frame(tracer: Tracer, frames: int) -> float:
+    started = time.perf_counter()
+    for _ in range(frames):
+        received = time.perf_counter()
+        decoded = time.perf_counter()
+        tracer.record_frame(received, decoded)
+    return (time.perf_counter() - started) / frames
+
+
+def baseline(frames: int) -> float:
+    started = time.perf_counter()
+    for _ in range(frames):
+        pass
+    return (time.perf_counter() - started) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200_000)
+    args = parser.parse_args()
+
+    empty = baseline(args.frames)
+    telemetry.current_call.set("CAbench")
+    for enabled in (False, True):
+        tracer = Tracer(enabled)
+        cost = per_frame(tracer, args.frames) - empty
+        print(f"TRACING={int(enabled)}  {1e9 * cost:7.0f} ns per frame")
+
+    tracer = Tracer(True)
+    started = time.perf_counter()
+    for i in range(args.frames // 10):
+        with tracer.span("asr_inference", final=True):
+            pass
+    print(f"stored span     {1e9 * (time.perf_counter() - started) / (args.frames // 10):7.0f} ns")
+    per_frame(tracer, 1000)
+    started = time.perf_counter()
+    body = tracer.render()
+    print(f"render /metrics {1000 * (time.perf_counter() - started):7.2f} ms, {len(body.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Time-to-first-audio for a pitch: whole-clip synthesis vs sentence streaming.
+
+Runs against a local stand-in for ElevenLabs' /stream endpoint that takes
+FIRST_BYTE seconds to start and then produces audio at SPEED x real time
+(about 15 characters of text per second of speech), so the numbers are
+about the pipeline, not the network. Modes:
+
+  - whole:      one request for the whole pitch, played once the body is complete (generate_tts_audio)
+  - stream-1:   tts_stream.stream_tts one sentence at a time
+  - stream-N:   tts_stream.stream_tts with TTS_CONCURRENCY sentences in flight
+  - cached:     stream-N again; every sentence now comes from tts_cache
+
+    python -m app.benchmarks.bench_tts_stream [--runs 5]
+    python -m app.benchmarks.bench_tts_stream --serve --port 8766    # just the stand-in, for ELEVENLABS_URL
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from aiohttp import web
+
+from app import tts_stream
+from app.tts_cache import TTSCache
+
+FIRST_BYTE = 0.35
+SPEED = 4.0  # seconds of speech synthesized per second
+CHARS_PER_SECOND = 15
+BYTES_PER_SECOND = 16000  # 128 kbps mp3
+PITCH = (
+    "Based on what you told me, a recurring deposit is the safest fit for your son's education. "
+    "You can start with just five hundred rupees a month. "
+    "The interest is fixed when you open it, so market swings will not touch your savings. "
+    "If you want a little more growth, we can add a small SIP in a balanced fund later. "
+    "Shall I send you the details on WhatsApp?"
+)
+
+
+def make_app(first_byte: float = FIRST_BYTE, speed: float = SPEED) -> web.Application:
+    async def stream(request):
+        text = (await request.json())["text"]
+        speech = len(text) / CHARS_PER_SECOND
+        res = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await res.prepare(request)
+        await asyncio.sleep(first_byte)
+        step = 0.1  # seconds of speech per chunk
+        try:
+            for _ in range(max(1, int(speech / step))):
+                await asyncio.sleep(step / speed)
+                await res.write(bytes(int(BYTES_PER_SECOND * step)))
+            await res.write_eof()
+        except ConnectionResetError:
+            pass  # the client stopped listening (an interrupted stream)
+        return res
+
+    app = web.Application()
+    app.router.add_post("/v1/text-to-speech/{voice_id}/stream", stream)
+    return app
+
+
+async def whole_clip(text: str):
+    started = time.perf_counter()
+    async with tts_stream.session().post(
+        f"{tts_stream.ELEVENLABS_URL}/v1/text-to-speech/x/stream", json={"text": text}
+    ) as res:
+        await res.read()
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+async def streamed(text: str, concurrency: int):
+    started = time.perf_counter()
+    first = None
+    async for _ in tts_stream.stream_tts(text, concurrency=concurrency):
+        if first is None:
+            first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+async def bench(runs: int):
+    runner = web.AppRunner(make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    tts_stream.ELEVENLABS_URL = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    sentences = tts_stream.split_sentences(PITCH)
+    print(f"pitch: {len(PITCH)} chars, {len(sentences)} sentences, ~{len(PITCH) / CHARS_PER_SECOND:.1f}s of speech")
+    print(f"{'mode':>10} {'ttfa p50 s':>11} {'total p50 s':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        n = tts_stream.TTS_CONCURRENCY
+        warm = TTSCache(tempfile.mkdtemp(dir=tmp))
+        modes = [("whole", lambda: whole_clip(PITCH), None), ("stream-1", lambda: streamed(PITCH, 1), None),
+                 (f"stream-{n}", lambda: streamed(PITCH, n), None), ("cached", lambda: streamed(PITCH, n), warm)]
+        tts_stream.tts_cache = warm
+        await streamed(PITCH, n)  # fills the cache for the "cached" mode
+        for name, run, cache in modes:
+            results = []
+            for _ in range(runs):
+                # Every uncached run starts from an empty cache, or the second run would be a cache hit
+                tts_stream.tts_cache = cache or TTSCache(tempfile.mkdtemp(dir=tmp))
+                results.append(await run())
+            print(f"{name:>10} {statistics.median(r[0] for r in results):>11.3f} "
+                  f"{statistics.median(r[1] for r in results):>12.3f}")
+    print("stats:", tts_stream.stats.as_dict())
+    await tts_stream.shutdown()
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    if args.serve:
+        web.run_app(make_app(), port=args.port)
+    else:
+        asyncio.run(bench(args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Offline evaluation of the utterance gate: accuracy, latency and LLM calls saved.
+
+data/utterances.jsonl is split into --folds folds. For each fold the
+classifier is trained on the rest, then:
+
+  - intent and sentiment accuracy are measured on the held-out utterances;
+  - --calls synthetic calls are assembled from them (--filler-rate of the
+    utterances are backchannels, the rest drawn from the other intents, timed
+    at 2.5 words/s plus a 0.6 s pause) and played through a fresh CallGate.
+
+The baseline runs the agent chain on every final utterance. "urgent recall"
+is the share of questions, objections, closings and first product mentions
+on which the gate fired.
+
+    python -m app.benchmarks.eval_gate [--folds 5] [--calls 50] [--minutes 3] [--filler-rate 0.4]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.utterance_gate import URGENT_INTENTS, CallGate, UtteranceClassifier, find_products, load_rows
+
+WORDS_PER_SECOND = 2.5
+PAUSE_S = 0.6
+
+
+def synthetic_call(rows, minutes: float, filler_rate: float, rng: random.Random):
+    fillers = [r for r in rows if r["intent"] == "filler"]
+    others = [r for r in rows if r["intent"] != "filler"]
+    t, utterances = 0.0, []
+    while t < minutes * 60:
+        row = rng.choice(fillers if fillers and rng.random() < filler_rate else others)
+        t += len(row["text"].split()) / WORDS_PER_SECOND + PAUSE_S
+        utterances.append((t, row))
+    return utterances
+
+
+def evaluate_fold(train, test, args, rng):
+    model = UtteranceClassifier().fit(train)
+    intent_ok = sentiment_ok = 0
+    for row in test:
+        score = model.score(row["text"])
+        intent_ok += score.intent == row["intent"]
+        predicted = 0 if abs(score.sentiment) < 0.33 else (1 if score.sentiment > 0 else -1)
+        sentiment_ok += predicted == row["sentiment"]
+
+    utterances = triggers = urgent = urgent_hit = 0
+    latencies = []
+    for _ in range(args.calls):
+        gate, seen = CallGate(), set()
+        for at, row in synthetic_call(test, args.minutes, args.filler_rate, rng):
+            started = time.perf_counter()
+            decision = gate.observe(row["text"], at, model)
+            latencies.append(1000 * (time.perf_counter() - started))
+            new_products = set(find_products(row["text"])) - seen
+            seen |= new_products
+            is_urgent = row["intent"] in URGENT_INTENTS or bool(new_products)
+            utterances += 1
+            triggers += decision.trigger
+            urgent += is_urgent
+            urgent_hit += is_urgent and decision.trigger
+    return {
+        "intent_acc": intent_ok / len(test),
+        "sentiment_acc": sentiment_ok / len(test),
+        "utterances": utterances,
+        "triggers": triggers,
+        "urgent_recall": urgent_hit / urgent if urgent else 1.0,
+        "latencies": latencies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--minutes", type=float, default=3.0)
+    parser.add_argument("--filler-rate", type=float, default=0.4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = load_rows()
+    rng.shuffle(rows)
+    folds = [rows[i::args.folds] for i in range(args.folds)]
+    results = []
+    for i, test in enumerate(folds):
+        train = [r for j, fold in enumerate(folds) if j != i for r in fold]
+        results.append(evaluate_fold(train, test, args, rng))
+
+    call_minutes = args.folds * args.calls * args.minutes
+    utterances = sum(r["utterances"] for r in results)
+    triggers = sum(r["triggers"] for r in results)
+    latencies = sorted(x for r in results for x in r["latencies"])
+    print(f"{len(rows)} labelled utterances, {args.folds}-fold; {args.folds * args.calls} synthetic calls "
+          f"of {args.minutes:g} min, filler rate {args.filler_rate:.0%}")
+    print(f"intent accuracy      {statistics.mean(r['intent_acc'] for r in results):.1%}")
+    print(f"sentiment accuracy   {statistics.mean(r['sentiment_acc'] for r in results):.1%}")
+    print(f"gate latency         p50 {latencies[len(latencies) // 2]:.3f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms")
+    print(f"LLM chains / call-min  baseline {utterances / call_minutes:.1f}, gated {triggers / call_minutes:.1f}, "
+          f"saved {(utterances - triggers) / call_minutes:.1f} ({1 - triggers / utterances:.0%})")
+    print(f"urgent recall        {statistics.mean(r['urgent_recall'] for r in results):.1%}")
+
+
+if __name__ == "__main__":
+    main()
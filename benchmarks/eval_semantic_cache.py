@@ -0,0 +1,54 @@
+"""Checks that the semantic cache only reuses answers that still fit the query.
+
+Each MUST_MISS pair embeds well above the pitch cache threshold but asks
+for a different answer (risk profile, products, income, negation); a
+lookup with the second query after caching the first must miss. Each
+SHOULD_HIT pair is the same question reworded and must hit. Exits 1 on
+any failure.
+
+    python -m app.benchmarks.eval_semantic_cache
+"""
+import sys
+
+from app.semantic_cache import SemanticCache, key_facts, pitch_cache
+
+# The sample query from agno_workflow.run_workflow
+BASE = (
+    "i have earnings around 10000 rupees per month and my expenses are around 8000 rupees per month. "
+    "i want to invest in a financial product that can help me grow my wealth. i am interested in stocks "
+    "and mutual funds. i am looking for a product that can give me good returns in the long term. i am "
+    "also looking for a product that is low risk and has a good track record."
+)
+
+MUST_MISS = [
+    ("risk", BASE, BASE.replace("low risk", "high risk")),
+    ("products", BASE, BASE.replace("stocks and mutual funds", "bonds and gold")),
+    ("income x10", BASE, BASE.replace("10000 rupees", "100000 rupees")),
+    ("horizon", BASE, BASE.replace("long term", "short term")),
+    ("negation", BASE, BASE.replace("i am interested in stocks", "i am not interested in stocks")),
+]
+SHOULD_HIT = [
+    ("case and punctuation", BASE, BASE.upper().replace(".", "")),
+    ("stopwords", "i want to invest 5000 in a sip", "looking to invest 5,000 in a sip"),
+]
+
+
+def main():
+    failures = 0
+    for expect_hit, pairs in ((False, MUST_MISS), (True, SHOULD_HIT)):
+        for name, cached, query in pairs:
+            cache = SemanticCache(threshold=pitch_cache.threshold)
+            cache.put("user", cached, "answer")
+            hit = cache.get("user", query) is not None
+            score = float(cache.embedder.embed(cached) @ cache.embedder.embed(query))
+            ok = hit == expect_hit
+            failures += not ok
+            extra = sorted(key_facts(cached) ^ key_facts(query))
+            print(f"{'ok  ' if ok else 'FAIL'} {'hit ' if hit else 'miss'} cosine {score:.3f}  {name:22s} {extra}")
+    if failures:
+        print(f"{failures} failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Pitch workflow with no LLM behind it, for load tests.
+
+Same interface as agno_workflow.GPSuggestions (astream/arun filling a
+WorkflowRun) and the same step graph: sentiment and market_data
+concurrently, then suggestion, then the writer's tokens. Each agent step
+takes LLM_STANDIN_STEP_S, market data LLM_STANDIN_MARKET_S and each writer
+token LLM_STANDIN_TOKEN_S, so pitch latency under load is the fixed
+stand-in cost plus whatever the server adds.
+
+    PITCH_WORKFLOW=app.benchmarks.llm_standin:StandinSuggestions uvicorn app.main:app ...
+"""
+import asyncio
+import os
+
+from app.workflow_engine import AsyncWorkflow, Step, StepTiming, WorkflowRun
+
+STEP_S = float(os.getenv("LLM_STANDIN_STEP_S", "0.4"))
+MARKET_S = float(os.getenv("LLM_STANDIN_MARKET_S", "0.2"))
+TOKEN_S = float(os.getenv("LLM_STANDIN_TOKEN_S", "0.02"))
+PITCH = (
+    "A recurring deposit fits what you described: you can start with five hundred rupees a month, "
+    "the rate is fixed when you open it, and you can add a small SIP later for growth."
+)
+
+
+class StandinSuggestions:
+    def plan(self) -> AsyncWorkflow:
+        async def sentiment(query, **_):
+            await asyncio.sleep(STEP_S)
+            return f"Customer said: {query[:200]}"
+
+        async def market_data(**_):
+            await asyncio.sleep(MARKET_S)
+            return "^NSEI: 24000.0"
+
+        async def suggestion(sentiment, market_data, **_):
+            await asyncio.sleep(STEP_S)
+            return "Recurring deposit"
+
+        return AsyncWorkflow(
+            Step("sentiment", sentiment),
+            Step("market_data", market_data),
+            Step("suggestion", suggestion, ("sentiment", "market_data")),
+        )
+
+    async def astream(self, query, user_id, run: WorkflowRun = None, use_cache: bool = True):
+        run = run or WorkflowRun()
+        await self.plan().run(run, query=query)
+        start = run.elapsed()
+        run.emit("writer", "started")
+        for word in PITCH.split():
+            await asyncio.sleep(TOKEN_S)
+            if "first_token" not in run.marks:
+                run.mark("first_token")
+            yield word + " "
+        run.timings["writer"] = StepTiming(start, run.elapsed())
+        run.emit("writer", "done")
+
+    async def arun(self, query, user_id, run: WorkflowRun = None, use_cache: bool = True) -> str:
+        return "".join([token async for token in self.astream(query, user_id, run, use_cache)])
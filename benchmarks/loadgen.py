@@ -0,0 +1,324 @@
+"""Load generator: concurrent Twilio media streams against a real server, checked against a baseline.
+
+Starts `python -m app.run` wired to stand-ins, so every stage runs but
+nothing leaves the machine:
+
+  - ASR       ASR_ENGINE=fake; transcripts are lines of data/utterances.jsonl
+              and take --asr-rtf x the utterance's duration in the ASR pool
+  - LLM       PITCH_WORKFLOW=app.benchmarks.llm_standin:StandinSuggestions,
+              run by the utterance gate (AUTO_PITCH=1)
+  - TTS       the bench_tts_stream stand-in behind ELEVENLABS_URL
+
+Each call is a bidirectional Twilio media stream: a `start`, then 20 ms
+μ-law `media` frames paced in real time, then `stop`. Outbound audio is
+read and its `mark`s echoed back the way Twilio does. The audio is
+synthetic speech bursts and pauses (--audio FILE replays a recording
+instead; each call starts at a different offset). Every --inject-every
+seconds a call asks for an injection over /inject/play.
+
+What is reported:
+
+    frame_drop_rate          media frames sent but not processed by the end of the call
+    transcript_lag           end of an utterance on the wall clock to its final transcript (server span)
+    pitch_latency            gate trigger to stored pitch (server span)
+    injection_first_audio    /inject/play sent to the first outbound media frame (client side)
+    cpu_ms_per_call_s        server CPU per second of call audio, from /proc (Linux)
+    send_lag_p95_ms          how late the generator itself sent frames; if it is high the
+                             generator, not the server, is the bottleneck
+
+Results are compared with the baseline for the same scenario in
+--baseline (benchmarks/baselines/loadgen.json). A metric that is worse by
+more than --tolerance (relative) plus its own absolute slack fails the run
+with exit status 1. The first run of a scenario, or --save-baseline,
+records the baseline instead. Baselines depend on the machine, so record
+them where the check will run.
+
+    python -m app.benchmarks.loadgen [--calls 10] [--seconds 30] [--workers 1] [--audio FILE] [--save-baseline]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+import numpy as np
+import websockets
+
+from app.audio_codec import pcm16_to_ulaw
+from app.audio_store import decode_audio
+from app.benchmarks.bench_calls import tree_cpu_seconds
+from app.utterance_gate import load_rows
+
+FRAME_S = 0.02
+FRAME_BYTES = 160
+RATE = 8000
+DRAIN_S = 0.5  # after the last frame, before the call's trace is read
+INJECTION = "Sure, let me explain how a recurring deposit works. It takes five hundred rupees a month to start."
+BASELINES = Path(__file__).parent / "baselines" / "loadgen.json"
+# Metrics checked against the baseline, all lower-is-better, with the absolute slack each one gets on top of --tolerance
+CHECKS = {
+    "frame_drop_rate": 0.002,
+    "transcript_lag_p50_ms": 25,
+    "transcript_lag_p95_ms": 50,
+    "pitch_latency_p50_ms": 50,
+    "pitch_latency_p95_ms": 100,
+    "injection_first_audio_p50_ms": 50,
+    "injection_first_audio_p95_ms": 100,
+    "cpu_ms_per_call_s": 0.5,
+}
+
+
+def synthetic_audio(seconds: float, seed: int) -> bytes:
+    """μ-law speech stand-in: 1.2-3.5 s bursts of noise separated by 0.8-1.6 s of near silence."""
+    rng = np.random.default_rng(seed)
+    chunks, total = [], 0
+    while total < seconds * RATE:
+        for level, low, high in ((3000, 1.2, 3.5), (30, 0.8, 1.6)):
+            n = int(rng.uniform(low, high) * RATE)
+            chunks.append(rng.normal(0, level, n))
+            total += n
+    samples = np.concatenate(chunks)[: int(seconds * RATE)]
+    return pcm16_to_ulaw(samples.clip(-32768, 32767).astype(np.int16))
+
+
+def recorded_audio(samples: np.ndarray, seconds: float, offset: int) -> bytes:
+    needed = int(seconds * RATE)
+    looped = np.tile(samples, needed // len(samples) + 2)
+    return pcm16_to_ulaw(looped[offset % len(samples):][:needed])
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+async def read_outbound(ws, state: dict, results: dict):
+    """Plays Twilio's side of the return path: echoes marks, times the first frame of each injection."""
+    async for message in ws:
+        data = json.loads(message)
+        if data["event"] == "media" and state.get("inject_at") is not None:
+            results["injection_ms"].append(1000 * (time.perf_counter() - state.pop("inject_at")))
+        elif data["event"] == "mark":
+            await ws.send(json.dumps({"event": "mark", "streamSid": data["streamSid"], "mark": data["mark"]}))
+
+
+async def inject(http: aiohttp.ClientSession, base: str, call_sid: str, state: dict, results: dict):
+    state["inject_at"] = time.perf_counter()
+    async with http.post(f"{base}/inject/play", json={"call_sid": call_sid, "audio_text": INJECTION}) as res:
+        results["injections"].append(res.status == 200)
+        if res.status != 200:
+            state.pop("inject_at", None)
+
+
+async def simulate_call(index: int, audio: bytes, args, base: str, http: aiohttp.ClientSession, results: dict):
+    call_sid = f"CAload{index:05d}{random.randrange(1 << 20)}"
+    state = {}
+    await asyncio.sleep(random.uniform(0, 1.0))  # calls do not all start on the same frame
+    async with websockets.connect(base.replace("http", "ws", 1) + "/audio", max_queue=None) as ws:
+        reader = asyncio.create_task(read_outbound(ws, state, results))
+        await ws.send(json.dumps({"event": "start", "start": {"callSid": call_sid, "streamSid": f"MZ{call_sid}"}}))
+        frames = len(audio) // FRAME_BYTES
+        every = int(args.inject_every / FRAME_S) if args.inject_every else 0
+        started = time.perf_counter()
+        for k in range(frames):
+            due = started + k * FRAME_S
+            if (delay := due - time.perf_counter()) > 0:
+                await asyncio.sleep(delay)
+            results["send_lag_ms"].append(1000 * (time.perf_counter() - due))
+            payload = base64.b64encode(audio[k * FRAME_BYTES:(k + 1) * FRAME_BYTES]).decode()
+            await ws.send(json.dumps({"event": "media", "media": {"payload": payload}}))
+            if every and k and k % every == 0:
+                task = asyncio.create_task(inject(http, base, call_sid, state, results))
+                results["tasks"].add(task)
+                task.add_done_callback(results["tasks"].discard)
+        results["frames_sent"] += frames
+        await asyncio.sleep(DRAIN_S)
+        async with http.get(f"{base}/calls/{call_sid}", params={"seconds": 0}) as res:
+            trace = (await res.json()).get("trace") if res.status == 200 else None
+        await ws.send(json.dumps({"event": "stop"}))
+        reader.cancel()
+    if trace is None:
+        results["missing_traces"] += 1
+        return
+    results["frames_processed"] += trace["stages"].get("frame", {}).get("count", 0)
+    for span in trace["spans"]:
+        if span["stage"] == "transcript_lag":
+            results["transcript_lag_ms"].append(span["ms"])
+        elif span["stage"] == "pitch":
+            results["pitch_ms"].append(span["ms"])
+
+
+async def run_load(tracks, args, server_pid: int) -> dict:
+    base = f"http://127.0.0.1:{args.port}"
+    results = {
+        "frames_sent": 0, "frames_processed": 0, "missing_traces": 0, "send_lag_ms": [], "transcript_lag_ms": [],
+        "pitch_ms": [], "injection_ms": [], "injections": [], "tasks": set(),
+    }
+    async with aiohttp.ClientSession() as http:
+        cpu_before = tree_cpu_seconds(server_pid)
+        await asyncio.gather(*(simulate_call(i, tracks[i], args, base, http, results) for i in range(args.calls)))
+        cpu = tree_cpu_seconds(server_pid) - cpu_before
+    per_call_s = 1000 * cpu / (args.calls * args.seconds)
+    sent = results["frames_sent"]
+    metrics = {
+        "frame_drop_rate": max(0, sent - results["frames_processed"]) / sent if sent else 0.0,
+        "transcript_lag_p50_ms": percentile(results["transcript_lag_ms"], 0.5),
+        "transcript_lag_p95_ms": percentile(results["transcript_lag_ms"], 0.95),
+        "pitch_latency_p50_ms": percentile(results["pitch_ms"], 0.5),
+        "pitch_latency_p95_ms": percentile(results["pitch_ms"], 0.95),
+        "injection_first_audio_p50_ms": percentile(results["injection_ms"], 0.5),
+        "injection_first_audio_p95_ms": percentile(results["injection_ms"], 0.95),
+        "cpu_ms_per_call_s": per_call_s,
+        "calls_per_core": 1000 / per_call_s if per_call_s else None,
+        "send_lag_p95_ms": percentile(results["send_lag_ms"], 0.95),
+        "utterances": len(results["transcript_lag_ms"]),
+        "pitches": len(results["pitch_ms"]),
+        "injections_ok": sum(results["injections"]) / len(results["injections"]) if results["injections"] else None,
+        "missing_traces": results["missing_traces"],
+    }
+    return metrics
+
+
+def wait_for_port(port: int, process: subprocess.Popen, what: str):
+    for _ in range(150):
+        if process.poll() is not None:
+            raise RuntimeError(f"{what} exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{what} did not start on port {port}")
+
+
+def stop(process: subprocess.Popen, timeout: float = 60):
+    # The server finishes every call's queued ASR before exiting, which takes a while after an overloaded run
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def start_processes(args, transcripts_path: str):
+    tts_port, server_port = args.port + 2, args.port
+    quiet = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    tts = subprocess.Popen(
+        [sys.executable, "-m", "app.benchmarks.bench_tts_stream", "--serve", "--port", str(tts_port)], **quiet
+    )
+    wait_for_port(tts_port, tts, "TTS stand-in")
+    env = {
+        **os.environ, "WEB_CONCURRENCY": str(args.workers), "PORT": str(server_port), "RELOAD": "0",
+        "REDIS_STANDIN_PORT": str(args.port + 1), "WARMUP": "gate", "TRACING": "1", "MEDIA_STREAM_MODE": "connect",
+        "NGROK_URL": os.getenv("NGROK_URL", "https://loadgen.invalid"),
+        "ASR_ENGINE": "fake", "FAKE_TRANSCRIPTS": transcripts_path, "FAKE_ASR_RTF": str(args.asr_rtf),
+        "AUTO_PITCH": "1", "PITCH_WORKFLOW": "app.benchmarks.llm_standin:StandinSuggestions",
+        "ELEVENLABS_URL": f"http://127.0.0.1:{tts_port}",
+    }
+    server = subprocess.Popen([sys.executable, "-m", "app.run"], env=env, **quiet)
+    try:
+        wait_for_port(server_port, server, "server")
+    except RuntimeError:
+        stop(tts)
+        raise
+    return tts, server
+
+
+def scenario_key(args) -> str:
+    audio = Path(args.audio).name if args.audio else "synthetic"
+    return (f"calls={args.calls} seconds={args.seconds:g} workers={args.workers} audio={audio} "
+            f"inject_every={args.inject_every:g} asr_rtf={args.asr_rtf:g}")
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float):
+    """Rows of (metric, baseline, current, limit, ok) for every checked metric both runs have."""
+    rows = []
+    for name, slack in CHECKS.items():
+        before, now = baseline.get(name), metrics.get(name)
+        if before is None or now is None:
+            continue
+        limit = before * (1 + tolerance) + slack
+        rows.append((name, before, now, limit, now <= limit))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--audio", help="WAV, or anything ffmpeg reads, to replay instead of synthetic audio")
+    parser.add_argument("--inject-every", type=float, default=10, help="seconds between injections per call; 0 for none")
+    parser.add_argument("--asr-rtf", type=float, default=0.1, help="stand-in ASR time per second of audio")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--baseline", default=str(BASELINES))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.audio:
+        samples = decode_audio(args.audio)
+        if samples is None or not len(samples):
+            raise SystemExit(f"Cannot decode {args.audio}")
+        tracks = [recorded_audio(samples, args.seconds, i * len(samples) // args.calls) for i in range(args.calls)]
+    else:
+        tracks = [synthetic_audio(args.seconds, args.seed + i) for i in range(args.calls)]
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(row["text"] for row in load_rows()))
+    tts, server = start_processes(args, f.name)
+    try:
+        time.sleep(1.0)  # let every worker finish its startup
+        metrics = asyncio.run(run_load(tracks, args, server.pid))
+    finally:
+        for process in (server, tts):
+            stop(process)
+        os.unlink(f.name)
+
+    key = scenario_key(args)
+    print(f"{key}, cores available={os.cpu_count()}")
+    for name, value in metrics.items():
+        print(f"  {name:<30} {'-' if value is None else round(value, 4)}")
+    if metrics["send_lag_p95_ms"] is not None and metrics["send_lag_p95_ms"] > 1000 * FRAME_S:
+        print("  warning: the generator fell behind real time; the server was not the only bottleneck")
+
+    path = Path(args.baseline)
+    baselines = json.loads(path.read_text()) if path.exists() else {}
+    entry = {
+        "metrics": metrics,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"machine": platform.machine(), "python": platform.python_version(), "cpus": os.cpu_count()},
+    }
+    if args.save_baseline or key not in baselines:
+        baselines[key] = entry
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline recorded in {path}")
+        return
+
+    rows = compare(metrics, baselines[key]["metrics"], args.tolerance)
+    print(f"\nAgainst the baseline of {baselines[key]['recorded_at']} (tolerance {args.tolerance:.0%} + slack):")
+    for name, before, now, limit, ok in rows:
+        print(f"  {name:<30} {before:>10.3f} -> {now:>10.3f}  (limit {limit:.3f})  {'ok' if ok else 'REGRESSION'}")
+    failed = [row[0] for row in rows if not row[4]]
+    if failed:
+        print(f"Regressed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Local stand-in for the few Redis commands call_sessions uses.
+
+Speaks RESP2 over TCP: PING, SET (with EX)/GET, HSET/HGET/HDEL/HGETALL,
+PUBLISH and (UN)SUBSCRIBE, and answers OK to connection setup (CLIENT, SELECT). A
+client that negotiates RESP3 with HELLO 3, as redis-py 8 does, gets its
+hashes back as maps; everything else is the same in both. It is
+single-process and keeps nothing on disk; enough to run several workers on
+one machine (run.py starts it), not a Redis replacement.
+
+    python -m app.benchmarks.redis_standin --port 6390
+    REDIS_URL=redis://127.0.0.1:6390/0 ...
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v) for v in value)
+    if isinstance(value, dict):  # RESP3 only
+        return b"%%%d\r\n" % len(value) + b"".join(encode(k) + encode(v) for k, v in value.items())
+    return b"$%d\r\n" % len(value) + value + b"\r\n"
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):  # inline command, e.g. from redis-cli / telnet
+        return line.split()
+    args = []
+    for _ in range(int(line[1:])):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+class Standin:
+    def __init__(self):
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = defaultdict(dict)
+        self.strings: Dict[bytes, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expiry)
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.resp3: Set[asyncio.StreamWriter] = set()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        try:
+            while (args := await read_command(reader)) is not None:
+                if not args:
+                    continue
+                writer.write(self.execute(args[0].upper(), args[1:], writer, subscribed))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for name in subscribed:
+                self.channels[name].discard(writer)
+            self.resp3.discard(writer)
+            writer.close()
+
+    def bulk(self, value: Optional[bytes], writer) -> bytes:
+        # A missing value is $-1 in RESP2 but its own null type in RESP3
+        return b"_\r\n" if value is None and writer in self.resp3 else encode(value)
+
+    def execute(self, command: bytes, args, writer, subscribed) -> bytes:
+        if command == b"PING":
+            return encode("PONG")
+        if command == b"HELLO":
+            if args and args[0] == b"3":
+                self.resp3.add(writer)
+                return encode({"server": "redis", "version": "7.0.0", "proto": 3, "mode": "standalone"})
+            return encode([b"server", b"redis", b"version", b"7.0.0", b"proto", 2, b"mode", b"standalone"])
+        if command == b"SET":
+            ttl = float(args[args.index(b"EX") + 1]) if b"EX" in args[2:] else None
+            self.strings[args[0]] = (args[1], None if ttl is None else time.monotonic() + ttl)
+            return encode("OK")
+        if command == b"GET":
+            value, expiry = self.strings.get(args[0], (None, None))
+            if expiry is not None and expiry <= time.monotonic():
+                del self.strings[args[0]]
+                value = None
+            return self.bulk(value, writer)
+        if command == b"HSET":
+            table = self.hashes[args[0]]
+            added = sum(1 for k in args[1::2] if k not in table)
+            table.update(zip(args[1::2], args[2::2]))
+            return encode(added)
+        if command == b"HGET":
+            return self.bulk(self.hashes.get(args[0], {}).get(args[1]), writer)
+        if command == b"HDEL":
+            table = self.hashes.get(args[0], {})
+            return encode(sum(1 for k in args[1:] if table.pop(k, None) is not None))
+        if command == b"HGETALL":
+            table = self.hashes.get(args[0], {})
+            return encode(dict(table) if writer in self.resp3 else [x for kv in table.items() for x in kv])
+        if command == b"PUBLISH":
+            message = encode([b"message", args[0], args[1]])
+            receivers = list(self.channels.get(args[0], ()))
+            for receiver in receivers:
+                receiver.write(message)
+            return encode(len(receivers))
+        if command == b"SUBSCRIBE":
+            replies = []
+            for name in args:
+                subscribed.add(name)
+                self.channels[name].add(writer)
+                replies.append(encode([b"subscribe", name, len(subscribed)]))
+            return b"".join(replies)
+        if command == b"UNSUBSCRIBE":
+            replies = []
+            for name in args or list(subscribed):
+                subscribed.discard(name)
+                self.channels[name].discard(writer)
+                replies.append(encode([b"unsubscribe", name, len(subscribed)]))
+            return b"".join(replies) or encode([b"unsubscribe", None, 0])
+        return encode("OK")  # CLIENT SETINFO, SELECT, ... are accepted and ignored
+
+
+async def serve(port: int):
+    server = await asyncio.start_server(Standin().handle, "127.0.0.1", port)
+    print(f"Redis stand-in listening on 127.0.0.1:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(serve(args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Live call events pushed to consoles: transcript segments, pitch tokens, call status.
+
+Producers call `registry.emit(call_sid, event)` (call_sessions) wherever the
+event happens; it is handed to this worker's subscribers right away and,
+with Redis, published once for the other workers to hand to theirs. A
+console holds one /events WebSocket for its whole session and switches
+calls by (un)subscribing over it.
+
+Each subscriber has a bounded queue. A console that stops reading loses
+its oldest events, not the worker's memory, and the producer never waits.
+Call status events go to every subscriber, so a console can discover calls;
+everything else only to the subscribers of that call.
+"""
+import asyncio
+import os
+from typing import Optional, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EVENTS_QUEUE = int(os.getenv("EVENTS_QUEUE", "256"))
+BROADCAST_TYPES = {"call_started", "call_ended"}
+
+
+class Subscription:
+    def __init__(self, maxsize: int = EVENTS_QUEUE):
+        self.call_sids: Set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def wants(self, call_sid: Optional[str], event: dict) -> bool:
+        return event["type"] in BROADCAST_TYPES or call_sid in self.call_sids
+
+    def put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()  # the oldest event is the least useful one to a live view
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventHub:
+    def __init__(self):
+        self.subscribers: Set[Subscription] = set()
+        self.delivered = self.dropped = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        self.dropped += subscription.dropped
+
+    def deliver(self, call_sid: Optional[str], event: dict):
+        for subscription in self.subscribers:
+            if subscription.wants(call_sid, event):
+                subscription.put(event)
+                self.delivered += 1
+
+    def as_dict(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "delivered": self.delivered,
+            "dropped": self.dropped + sum(s.dropped for s in self.subscribers),
+        }
+
+
+hub = EventHub()
@@ -0,0 +1,369 @@
+"""Live calls by call SID, reachable from any worker.
+
+A call's media stream is one WebSocket, so it lives on whichever worker
+accepted it; that worker holds its CallSession (stream, ASR engine,
+transcript, playout, workflow state). HTTP requests about the call
+(injections, transcripts, pitch updates) can land on any worker, so they go
+through `registry.call(call_sid, op, ...)`: run in place when the call is
+local, otherwise relayed to the owner over Redis pub/sub and answered the
+same way.
+
+Console events (call_events) travel the same way: `registry.emit()` hands
+them to this worker's subscribers and publishes them once on a channel every
+worker listens to.
+
+With one worker, or without REDIS_URL, everything stays in process.
+`run.py` starts app.benchmarks.redis_standin when it runs several workers
+without a Redis to point at.
+"""
+import asyncio
+import itertools
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app import telemetry
+from app.call_events import hub
+from app.media_playout import CallPlayout
+from app.pitch_screen import PitchScreen, etag_matches, recent as retired_screens, retire as retire_screen
+from app.transcript_store import CallTranscript
+from app.utterance_gate import CallGate, classifier
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+# Run the pitch agents from the call audio, whenever the utterance gate sees something worth a new pitch
+AUTO_PITCH = os.getenv("AUTO_PITCH", "1") == "1"
+CALLS_KEY = "gromo:calls"  # hash: call SID -> owning worker
+EVENTS_CHANNEL = "gromo:events"
+SCREEN_KEY = "gromo:screen:"  # + call SID: an ended call's last pitch screen, for whichever worker is asked
+SCREEN_TTL = int(os.getenv("PITCH_SCREEN_TTL", "3600"))
+OUTBOX_SIZE = 10000  # events waiting to be published to the other workers
+RPC_TIMEOUT = float(os.getenv("CALL_RPC_TIMEOUT", "2"))
+
+
+def channel(worker_id: str) -> str:
+    return f"gromo:worker:{worker_id}"
+
+
+class CallNotFound(Exception):
+    pass
+
+
+@dataclass
+class CallSession:
+    call_sid: str
+    stream_sid: str
+    engine: Any = None
+    transcript: Optional[CallTranscript] = None
+    playout: Optional[CallPlayout] = None
+    state: Dict[str, Any] = field(default_factory=dict)  # workflow state: user_id, latest pitch, ...
+    started_at: float = field(default_factory=time.time)
+    gate: CallGate = field(default_factory=CallGate)
+    pitch_task: Optional[asyncio.Task] = None
+    queued_query: str = ""
+    screen: Optional[PitchScreen] = None
+    unscored: list = field(default_factory=list)  # finals that arrived while the gate's model was training
+    gate_task: Optional[asyncio.Task] = None
+
+    def __post_init__(self):
+        if self.screen is None:
+            self.screen = PitchScreen(self.call_sid, self.started_at)
+
+    def on_final(self, text: str, at: float):
+        """Feeds a final utterance to the gate and the pitch screen; starts a pitch if the gate says so."""
+        if not text.strip():
+            return
+        if not classifier.loaded or self.unscored:
+            # Training takes ~150 ms; without a warm-up it would land on the event loop here
+            self.unscored.append((text, at))
+            if len(self.unscored) == 1:
+                self.gate_task = asyncio.create_task(self._score_when_trained(), name=f"gate-{self.call_sid}")
+            return
+        decision = self.gate.observe(text, at)
+        self.screen.observe(text, decision.score, self.gate.sentiment)
+        if not AUTO_PITCH or not decision.trigger:
+            return
+        self.state["last_trigger"] = decision.reason
+        if self.pitch_task is not None and not self.pitch_task.done():
+            # One pitch at a time per call; what arrives meanwhile goes into the next one
+            self.queued_query = f"{self.queued_query} {decision.query}".strip()
+            return
+        self.pitch_task = asyncio.create_task(self._pitch(decision.query), name=f"pitch-{self.call_sid}")
+
+    async def _score_when_trained(self):
+        try:
+            await asyncio.to_thread(classifier.get)
+        except Exception as e:
+            print(f"Utterance gate failed to load, {len(self.unscored)} utterances of {self.call_sid} unscored: {e}")
+            self.unscored.clear()
+            return
+        pending, self.unscored = self.unscored, []
+        for text, at in pending:
+            self.on_final(text, at)
+
+    async def _pitch(self, query: str):
+        from app.pitch_api import get_workflow, stats as pitch_stats
+        from app.workflow_engine import WorkflowRun
+
+        while query:
+            run = WorkflowRun()
+            pitch_stats.requests += 1
+            trigger = self.state.get("last_trigger")
+            registry.emit(self.call_sid, {"type": "pitch_started", "query": query, "trigger": trigger})
+            try:
+                tokens = []
+                with telemetry.span("pitch", trigger=trigger):
+                    async for token in get_workflow().astream(query, self.state.get("user_id", self.call_sid), run):
+                        tokens.append(token)
+                        registry.emit(self.call_sid, {"type": "pitch_token", "text": token})
+                pitch = "".join(tokens)
+                pitch_stats.record(run)
+                self.state.update(query=query, pitch=pitch, updated_at=time.time())
+                self.screen.set_pitch(query, pitch)
+                registry.emit(self.call_sid, {"type": "pitch", "query": query, "pitch": pitch, "trigger": trigger})
+            except Exception as e:
+                pitch_stats.errors += 1
+                print(f"Pitch for {self.call_sid} failed: {e}")
+            query, self.queued_query = self.queued_query, ""
+
+    def close(self):
+        for task in (self.gate_task, self.pitch_task):
+            if task is not None:
+                task.cancel()
+        retire_screen(self.screen)
+
+    def as_dict(self, seconds: Optional[float] = None) -> dict:
+        return {
+            "call_sid": self.call_sid,
+            "stream_sid": self.stream_sid,
+            "worker": registry.worker_id,
+            "started_at": self.started_at,
+            "duration_s": time.time() - self.started_at,
+            "asr_engine": type(self.engine).__name__ if self.engine is not None else None,
+            "bidirectional": self.playout is not None,
+            "playing": self.playout.playing if self.playout is not None else False,
+            "state": self.state,
+            "gate": {"pending": len(self.gate.pending), "products": sorted(self.gate.products), "sentiment": self.gate.sentiment},
+            "segments": [s.as_row() + [s.is_final] for s in self.transcript.window(seconds)] if self.transcript else [],
+            "trace": telemetry.tracer.trace(self.call_sid),
+        }
+
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class CallRegistry:
+    def __init__(self, url: Optional[str] = REDIS_URL):
+        self.url = url
+        self.sessions: Dict[str, CallSession] = {}
+        self.handlers: Dict[str, Handler] = {}
+        # Taken again in start(): under preload_app the module is imported in the master, before the fork
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._redis = None
+        self._pubsub = None
+        self._listener = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+        self._outbox: Optional[asyncio.Queue] = None
+        self._publisher = None
+        self._ids = itertools.count(1)
+        self.local_calls = self.relayed = self.served = self.timeouts = 0
+
+    def handler(self, op: str):
+        def wrap(fn: Handler) -> Handler:
+            self.handlers[op] = fn
+            return fn
+        return wrap
+
+    async def start(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        if not self.url:
+            return
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(channel(self.worker_id), EVENTS_CHANNEL)
+        self._listener = asyncio.create_task(self._listen(), name="call-registry")
+        self._outbox = asyncio.Queue(OUTBOX_SIZE)
+        self._publisher = asyncio.create_task(self._publish_events(), name="call-events")
+
+    async def stop(self):
+        for task in (self._listener, self._publisher):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self._redis is not None:
+            if self.sessions:
+                await self._redis.hdel(CALLS_KEY, *self.sessions)
+            await self._pubsub.aclose()
+            await self._redis.aclose()
+            self._redis = None
+
+    async def register(self, session: CallSession):
+        self.sessions[session.call_sid] = session
+        if self._redis is not None:
+            await self._redis.hset(CALLS_KEY, session.call_sid, self.worker_id)
+
+    async def unregister(self, call_sid: str):
+        session = self.sessions.pop(call_sid, None)
+        if session is not None and self._redis is not None:
+            # Stored before the call leaves CALLS_KEY, so some worker can always answer for its screen
+            await self._redis.set(SCREEN_KEY + call_sid, json.dumps(session.screen.conditional()), ex=SCREEN_TTL)
+            await self._redis.hdel(CALLS_KEY, call_sid)
+
+    async def ended_screen(self, call_sid: str, if_none_match: Optional[str] = None) -> Optional[dict]:
+        """PitchScreen.conditional() of an ended call, from this worker or Redis; None if no worker kept it."""
+        screen = retired_screens.get(call_sid)
+        if screen is not None:
+            return screen.conditional(if_none_match)
+        if self._redis is None:
+            return None
+        stored = await self._redis.get(SCREEN_KEY + call_sid)
+        if stored is None:
+            return None
+        found = json.loads(stored)
+        if etag_matches(found["etag"], if_none_match):
+            found["screen"] = None
+        return found
+
+    async def live_calls(self) -> Dict[str, str]:
+        """Every live call, on any worker, with the worker that holds it."""
+        if self._redis is None:
+            return {sid: self.worker_id for sid in self.sessions}
+        return {k.decode(): v.decode() for k, v in (await self._redis.hgetall(CALLS_KEY)).items()}
+
+    async def call(self, call_sid: str, op: str, **args):
+        """Runs handler `op` against the call wherever it lives. Raises CallNotFound if no worker holds it."""
+        session = self.sessions.get(call_sid)
+        if session is not None:
+            self.local_calls += 1
+            return await self.handlers[op](session, **args)
+        if self._redis is None:
+            raise CallNotFound(call_sid)
+        owner = await self._redis.hget(CALLS_KEY, call_sid)
+        if owner is None:
+            raise CallNotFound(call_sid)
+        request_id = f"{self.worker_id}:{next(self._ids)}"
+        reply = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        self.relayed += 1
+        try:
+            message = {"id": request_id, "reply_to": self.worker_id, "call_sid": call_sid, "op": op, "args": args}
+            await self._redis.publish(channel(owner.decode()), json.dumps(message))
+            result = await asyncio.wait_for(reply, RPC_TIMEOUT)
+        except asyncio.TimeoutError:
+            # The owner died without unregistering; the call is gone with it
+            self.timeouts += 1
+            raise CallNotFound(call_sid)
+        finally:
+            self._pending.pop(request_id, None)
+        if result.get("error") == "not_found":
+            raise CallNotFound(call_sid)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result["result"]
+
+    def emit(self, call_sid: str, event: dict):
+        """Pushes a call event to the consoles subscribed to it, on every worker. Never waits."""
+        event = {"call_sid": call_sid, "at": time.time(), **event}
+        hub.deliver(call_sid, event)
+        if self._outbox is not None:
+            try:
+                self._outbox.put_nowait(json.dumps({"origin": self.worker_id, "event": event}))
+            except asyncio.QueueFull:
+                pass  # Redis is not keeping up; the local consoles still got it
+
+    async def _publish_events(self):
+        # One publisher, so events reach the other workers in the order they happened
+        while True:
+            message = await self._outbox.get()
+            try:
+                await self._redis.publish(EVENTS_CHANNEL, message)
+            except Exception as e:
+                print(f"Publishing call event failed: {e}")
+
+    async def _listen(self):
+        async for message in self._pubsub.listen():
+            # One bad message must not end the listener: every relayed op and event on this worker goes through it
+            try:
+                data = json.loads(message["data"])
+                if message["channel"].decode() == EVENTS_CHANNEL:
+                    if data["origin"] != self.worker_id:
+                        hub.deliver(data["event"]["call_sid"], data["event"])
+                elif "op" in data:
+                    task = asyncio.create_task(self._serve(data))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                elif (reply := self._pending.get(data["id"])) is not None and not reply.done():
+                    reply.set_result(data)
+            except Exception as e:
+                print(f"Call registry dropped a message on {message.get('channel')!r}: {type(e).__name__}: {e}")
+
+    async def _serve(self, request: dict):
+        try:
+            reply = {"id": request["id"]}
+            session = self.sessions.get(request["call_sid"])
+            if session is None:
+                reply["error"] = "not_found"
+            else:
+                self.served += 1
+                try:
+                    reply["result"] = await self.handlers[request["op"]](session, **request["args"])
+                except Exception as e:
+                    reply["error"] = f"{type(e).__name__}: {e}"
+            await self._redis.publish(channel(request["reply_to"]), json.dumps(reply))
+        except Exception as e:
+            print(f"Call registry could not serve {request.get('op')!r}: {type(e).__name__}: {e}")
+
+    def as_dict(self):
+        return {
+            "worker": self.worker_id,
+            "mode": "redis" if self._redis is not None else "local",
+            "calls_here": len(self.sessions),
+            "local_ops": self.local_calls,
+            "relayed_ops": self.relayed,
+            "served_for_others": self.served,
+            "relay_timeouts": self.timeouts,
+        }
+
+
+registry = CallRegistry()
+
+
+@registry.handler("inject")
+async def _inject(session: CallSession, text: str, interrupt: bool = False):
+    if session.playout is None:
+        return {"bidirectional": False, "injection": None}
+    if interrupt:
+        await session.playout.interrupt()
+    return {"bidirectional": True, "injection": session.playout.say(text)}
+
+
+@registry.handler("clear")
+async def _clear(session: CallSession):
+    return session.playout is not None and await session.playout.interrupt()
+
+
+@registry.handler("snapshot")
+async def _snapshot(session: CallSession, seconds: Optional[float] = None):
+    return session.as_dict(seconds)
+
+
+@registry.handler("pitch_screen")
+async def _pitch_screen(session: CallSession, if_none_match: Optional[str] = None):
+    return session.screen.conditional(if_none_match)
+
+
+@registry.handler("update_state")
+async def _update_state(session: CallSession, **state):
+    session.state.update(state, updated_at=time.time())
+    if "pitch" in state:
+        session.screen.set_pitch(state.get("query"), state["pitch"])
+        registry.emit(session.call_sid, {"type": "pitch", "query": state.get("query"), "pitch": state["pitch"], "trigger": None})
+    return session.state
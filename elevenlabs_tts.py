@@ -1,23 +1,24 @@
-from elevenlabs import generate, save, set_api_key
+from elevenlabs import generate, set_api_key
 import io
 import websockets
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
-ELEVENLABS_API_KEY = os.getenv()
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
 set_api_key(ELEVENLABS_API_KEY)
 
-def generate_tts_audio(text: str, voice: str = "Rachel") -> bytes:
+def generate_tts_audio(text: str, voice: str = "Rachel", model: str = "eleven_monolingual_v1") -> bytes:
+    """MP3 bytes for `text`. Callers that may repeat a phrase should go through app.tts_cache."""
     audio = generate(
         text=text,
         voice=voice,
-        model="eleven_monolingual_v1"
+        model=model
     )
-    audio_bytes = io.BytesIO()
-    save(audio, audio_bytes)
-    return audio_bytes.getvalue()
+    if isinstance(audio, bytes):
+        return audio
+    return b"".join(audio)
 """
 import shutil
 
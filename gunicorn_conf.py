@@ -0,0 +1,17 @@
+# Multi-worker deployment with models loaded once, before forking:
+#     gunicorn -c app/gunicorn_conf.py app.main:app
+# preload_app imports the app in the master and when_ready runs the warm-up there,
+# so every worker inherits the same model pages copy-on-write instead of loading its own.
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def when_ready(server):
+    from app.main import warm_up
+
+    warm_up()
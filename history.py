@@ -0,0 +1,172 @@
+"""Per-user conversation history that fits each agent's prompt budget.
+
+Instead of replaying whole previous runs into every prompt, each turn is
+kept as a (customer, advisor) pair. Once the retained turns outgrow the
+largest agent budget, the oldest are folded into a rolling summary, one
+line per turn, so the summary is extended rather than rewritten. Each agent
+then renders as much of the summary and as many recent turns as its own
+budget allows, and only the user memories relevant to the current
+utterance are added.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Prompt tokens each agent may spend on history and memories, on top of the current turn
+HISTORY_BUDGETS = {
+    "sentiment": int(os.getenv("HISTORY_BUDGET_SENTIMENT", "600")),
+    "writer": int(os.getenv("HISTORY_BUDGET_WRITER", "300")),
+}
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "5"))
+SUMMARY_LINE_TOKENS = int(os.getenv("HISTORY_SUMMARY_LINE_TOKENS", "40"))
+MAX_SUMMARY_LINES = int(os.getenv("HISTORY_MAX_SUMMARY_LINES", "30"))
+MAX_TRACKED_USERS = int(os.getenv("HISTORY_MAX_USERS", "1000"))
+
+# Roughly how BPE tokenizers split English: words, numbers and each punctuation mark
+_TOKEN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def count_tokens(text: str) -> int:
+    """Cheap prompt-token estimate; close enough to hold budgets and watch the trend."""
+    return len(_TOKEN.findall(text or ""))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    matches = list(_TOKEN.finditer(text))
+    if len(matches) <= limit:
+        return text
+    return text[:matches[limit - 1].end()] + "…"
+
+
+def _gist(text: str, limit: int) -> str:
+    """Leading sentences of `text` (markdown headings flattened), cut to `limit` tokens."""
+    sentences = [s.strip().lstrip("#").strip() for s in _SENTENCE.split(text.strip())]
+    return truncate_tokens("; ".join(s for s in sentences if s), limit)
+
+
+@dataclass
+class Turn:
+    customer: str
+    advisor: str
+    tokens: int = 0
+
+    def render(self) -> str:
+        return f"Customer: {self.customer}\nAdvisor: {self.advisor}"
+
+
+@dataclass
+class UserHistory:
+    turns: Deque[Turn] = field(default_factory=deque)
+    summary: Deque[str] = field(default_factory=deque)  # one line per folded turn, oldest first
+    turn_tokens: int = 0
+
+
+class ConversationHistory:
+    def __init__(self, budgets: Dict[str, int] = None, max_users: int = MAX_TRACKED_USERS):
+        self.budgets = budgets or HISTORY_BUDGETS
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add_turn(self, user_id: str, customer: str, advisor: str):
+        # The advisor side only needs its gist: the full pitch is long and the agents re-derive it anyway
+        retain = max(self.budgets.values())
+        turn = Turn(truncate_tokens(customer.strip(), retain // 2), _gist(advisor, SUMMARY_LINE_TOKENS * 2))
+        turn.tokens = count_tokens(turn.render())
+        with self._lock:
+            history = self._users.get(user_id) or UserHistory()
+            self._users[user_id] = history
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            history.turns.append(turn)
+            history.turn_tokens += turn.tokens
+            while len(history.turns) > 1 and history.turn_tokens > retain:
+                self._fold(history, history.turns.popleft())
+
+    @staticmethod
+    def _fold(history: UserHistory, turn: Turn):
+        history.turn_tokens -= turn.tokens
+        history.summary.append(
+            f"- Customer: {_gist(turn.customer, SUMMARY_LINE_TOKENS)} / Advisor: {_gist(turn.advisor, SUMMARY_LINE_TOKENS // 2)}"
+        )
+        while len(history.summary) > MAX_SUMMARY_LINES:
+            history.summary.popleft()
+
+    def render(self, user_id: str, agent: str) -> str:
+        """Summary plus the most recent turns that fit the agent's budget, newest turns taking priority."""
+        budget = self.budgets.get(agent, min(self.budgets.values()))
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is None:
+                return ""
+            turns, summary = list(history.turns), list(history.summary)
+        recent: List[str] = []
+        for turn in reversed(turns):
+            if turn.tokens > budget and recent:
+                break
+            recent.insert(0, turn.render())
+            budget -= turn.tokens
+        lines: List[str] = []
+        for line in reversed(summary):
+            cost = count_tokens(line)
+            if cost > budget:
+                break
+            lines.insert(0, line)
+            budget -= cost
+        parts = []
+        if lines:
+            parts.append("Earlier in the call:\n" + "\n".join(lines))
+        if recent:
+            parts.append("Recent turns:\n" + "\n\n".join(recent))
+        return "\n\n".join(parts)
+
+    def clear(self, user_id: str):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+def relevant_memories(memory_db, user_id: str, query: str, k: int = MEMORY_TOP_K) -> str:
+    """The user's k memories closest to the current utterance (app.memory_index), as a bullet list."""
+    try:
+        memories = memory_db.search(user_id, query, k)
+    except Exception as e:
+        print(f"Could not load memories for {user_id}: {e}")
+        return ""
+    return "\n".join(f"- {m}" for m in memories if m)
+
+
+class PromptStats:
+    """Prompt tokens per agent per turn; these should stay flat however long the call runs."""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._turns: Dict[str, Deque[int]] = {}
+
+    def record(self, agent: str, tokens: int):
+        self._turns.setdefault(agent, deque(maxlen=self.window)).append(tokens)
+
+    def as_dict(self):
+        stats = {}
+        for agent, values in self._turns.items():
+            ordered = sorted(values)
+            stats[agent] = {
+                "turns": len(values),
+                "last": values[-1],
+                "p50": ordered[len(ordered) // 2],
+                "max": ordered[-1],
+                "recent": list(values)[-20:],
+            }
+        return stats
+
+
+history = ConversationHistory()
+prompt_stats = PromptStats()
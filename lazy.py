@@ -0,0 +1,39 @@
+import threading
+
+
+class Lazy:
+    """Thread-safe, build-once holder for expensive objects (models, agents, DB handles).
+
+    Nothing is built at import time; the first `get()` runs the factory and
+    every later caller, from any thread, gets the same instance. A `Lazy`
+    can also be used as a class attribute, in which case reading it through
+    an instance returns the built object.
+    """
+
+    def __init__(self, factory, name: str = None):
+        self.factory = factory
+        self.name = name or getattr(factory, "__name__", "lazy")
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self.factory()
+                    self._loaded = True
+        return self._value
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return self.get()
+
+
+def lazy(factory):
+    return Lazy(factory)
@@ -1,16 +1,83 @@
 import os
+import sys
 import json
 import base64
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from dotenv import load_dotenv
-from app.transcriber import transcribe_user_audio_chunk
+from app.audio_codec import ulaw_to_pcm16
+from app import asr_engines
+from app import telemetry
+from app.asr_engines import create_engine
+from app.asr_pool import shutdown_executor, stats as asr_stats
+from app import pitch_api
+from app import twilio_audio_inject
+from app.assemblyai_stream import client as assemblyai_client
+from app.transcript_store import transcripts
+from app.tts_cache import DISCLAIMER, STOCK_PHRASES, tts_cache
+from app import audio_store
+from app import utterance_gate
+from app import tts_stream
+from app import media_playout
+from app.media_playout import CallPlayout
+from app.call_sessions import CallNotFound, CallSession, registry
+from app.call_events import hub
 
 load_dotenv()
 
-app = FastAPI()
+# What to load ahead of the first call: "asr" (the configured ASR model), "workflow" (the pitch agents),
+# "tts" (synthesize the greeting and stock phrases into the TTS cache), "gate" (train the utterance gate)
+WARMUP = [t.strip() for t in os.getenv("WARMUP", "asr,tts,gate").split(",") if t.strip()]
+
+
+def warm_up(targets=WARMUP):
+    """Builds the lazy singletons up front. Under gunicorn with preload_app this runs in
+    the master before forking, so workers share the loaded weights copy-on-write."""
+    try:
+        if "asr" in targets:
+            asr_engines.warm_up()
+        if "workflow" in targets:
+            from app import agno_workflow
+
+            agno_workflow.warm_up()
+        if "gate" in targets:
+            utterance_gate.classifier.get()
+        if "tts" in targets:
+            tts_cache.prewarm()
+            audio_store.prewarm_telephony(STOCK_PHRASES)
+    except Exception as e:
+        print(f"Warm-up failed, models will load on first use: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server starts accepting right away; an early
+    # request just waits on the model's load lock instead of loading it a second time
+    warmup = asyncio.get_running_loop().run_in_executor(None, warm_up)
+    await registry.start()
+    yield
+    warmup.cancel()
+    await registry.stop()
+    await assemblyai_client.shutdown()
+    await tts_stream.shutdown()
+    shutdown_executor()
+    if "app.persistence" in sys.modules:  # only loaded once the agents have run
+        sys.modules["app.persistence"].shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(pitch_api.router)
+app.include_router(twilio_audio_inject.router)
 
 NGROK_URL = os.getenv("NGROK_URL")  
+# "connect": bidirectional stream, injections are sent back on /audio; "start": listen-only fork
+MEDIA_STREAM_MODE = os.getenv("MEDIA_STREAM_MODE", "connect")
+# An idle /events socket gets a ping this often, so proxies keep it open and the console sees it is alive
+EVENTS_PING_S = float(os.getenv("EVENTS_PING_S", "15"))
 
 
 @app.get("/")
@@ -18,36 +85,221 @@ def home():
     return HTMLResponse("Twilio transcription server running.")
 
 @app.post("/twiml")
-def twiml():
-    twiml_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-  <Say>Disclaimer: This call may be recorded for quality and training purposes. Welcome to Gromo services. How can I help you today?</Say>
-  <Start>
+async def twiml(request: Request):
+    if asr_engines.ASR_ENGINE == "assemblyai":
+        # The greeting below plays for a few seconds before the media stream starts; open the socket meanwhile
+        call_sid = parse_qs((await request.body()).decode()).get("CallSid", [None])[0]
+        if call_sid:
+            assemblyai_client.spawn(assemblyai_client.prewarm(call_sid), name=f"assemblyai-prewarm-{call_sid}")
+    # Play the pre-synthesized greeting when it is cached; <Say> until the warm-up has produced it
+    clip = tts_cache.lookup(DISCLAIMER)
+    greeting = f"<Play>{NGROK_URL}/audio/{audio_store.telephony_name(clip)}</Play>" if clip else f"<Say>{DISCLAIMER}</Say>"
+    if MEDIA_STREAM_MODE == "connect":
+        # <Connect> holds the call on the stream until it closes, so no <Pause> is needed
+        stream = f"""<Connect>
+    <Stream url="wss://{NGROK_URL[8:]}/audio" />
+  </Connect>"""
+    else:
+        stream = f"""<Start>
     <Stream url="wss://{NGROK_URL[8:]}/audio" />
   </Start>
-  <Pause length="600"/>
+  <Pause length="600"/>"""
+    twiml_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+<Response>
+  {greeting}
+  {stream}
 </Response>
 """
     return HTMLResponse(content=twiml_xml, media_type="application/xml")
 
 
+telemetry.tracer.gauge("gromo_calls_live", "Calls whose media stream this worker holds.", lambda: len(registry.sessions))
+telemetry.tracer.gauge("gromo_asr_queue_depth", "ASR jobs waiting across all calls.", lambda: asr_stats.queue_depth)
+telemetry.tracer.gauge("gromo_asr_in_flight", "ASR jobs running in the inference pool.", lambda: asr_stats.in_flight)
+telemetry.tracer.gauge("gromo_tts_cache_bytes", "Size of the TTS clip cache on disk.", lambda: tts_cache.as_dict()["bytes"])
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms and a few gauges."""
+    return PlainTextResponse(telemetry.tracer.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/trace/{call_sid}")
+async def trace(call_sid: str):
+    """Per-stage latencies of a call, live on any worker or recently ended on this one."""
+    try:
+        return (await registry.call(call_sid, "snapshot", seconds=0))["trace"]
+    except CallNotFound:
+        pass
+    found = telemetry.tracer.trace(call_sid)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No trace for this SID")
+    return found
+
+
+@app.get("/metrics/asr")
+def asr_metrics():
+    return {**asr_stats.as_dict(), "assemblyai": assemblyai_client.as_dict()}
+
+
+@app.get("/metrics/gate")
+def gate_metrics():
+    return utterance_gate.stats.as_dict()
+
+
+@app.get("/metrics/tts")
+def tts_metrics():
+    return {**tts_cache.as_dict(), "stream": tts_stream.stats.as_dict(), "playout": media_playout.stats.as_dict()}
+
+
+@app.get("/transcript/{call_sid}")
+async def transcript(call_sid: str, seconds: float = None):
+    try:
+        snapshot = await registry.call(call_sid, "snapshot", seconds=seconds)
+    except CallNotFound:
+        return {"call_sid": call_sid, "open": False, "segments": []}
+    return {"call_sid": call_sid, "open": True, "segments": snapshot["segments"]}
+
+
+@app.get("/calls")
+async def calls():
+    """Live calls on every worker, and which worker holds each one."""
+    return {"calls": await registry.live_calls(), "registry": registry.as_dict(), "events": hub.as_dict()}
+
+
+@app.get("/calls/{call_sid}")
+async def call_session(call_sid: str, seconds: float = 30):
+    try:
+        return await registry.call(call_sid, "snapshot", seconds=seconds)
+    except CallNotFound:
+        raise HTTPException(status_code=404, detail="No live call with this SID")
+
+
 @app.websocket("/audio")
 async def audio_stream(websocket: WebSocket):
     await websocket.accept()
     print("WebSocket connection accepted")
+    engine = None
+    call_sid = None
+    playout = None
+    session = None
     try:
         while True:
             msg = await websocket.receive_text()
+            received = time.perf_counter()
             data = json.loads(msg)
 
-            if data["event"] == "media":
+            if data["event"] == "start":
+                # Engine is picked by ASR_ENGINE; segmented engines only transcribe whole utterances
+                call_sid = data["start"].get("callSid", data["start"].get("streamSid"))
+                # Every span from here on, including those of tasks the call starts, is filed under its SID
+                telemetry.current_call.set(call_sid)
+                engine = create_engine(call_sid)
+                await engine.start()
+                call = transcripts.get(call_sid)
+                if MEDIA_STREAM_MODE == "connect":
+                    playout = CallPlayout(websocket, data["start"]["streamSid"])
+                session = CallSession(call_sid, data["start"].get("streamSid"), engine, call, playout)
+                await registry.register(session)
+                registry.emit(call_sid, {"type": "call_started", "worker": registry.worker_id, "started_at": session.started_at})
+            elif data["event"] == "media" and engine is not None:
                 audio_b64 = data["media"]["payload"]
                 audio_bytes = base64.b64decode(audio_b64)
+                # Twilio sends 8 kHz mu-law, one byte per sample
+                samples = ulaw_to_pcm16(audio_bytes)
+                decoded = time.perf_counter()
 
-                transcript = await transcribe_user_audio_chunk(audio_bytes)
-                if transcript:
-                    print(f"User said: {transcript}")
+                await engine.feed(samples)
+                for result in engine.partials():
+                    on_transcript(session, result)
+                telemetry.tracer.record_frame(received, decoded)
+            elif data["event"] == "mark" and playout is not None:
+                playout.on_mark(data["mark"]["name"])
+            elif data["event"] == "stop":
+                if engine is not None:
+                    await engine.finalize()
+                    for result in engine.partials():
+                        on_transcript(session, result)
+                break
     except Exception as e:
         print("WebSocket error:", e)
     finally:
+        if engine is not None:
+            engine.close()
+        if session is not None:
+            session.close()
+            registry.emit(call_sid, {"type": "call_ended"})
+            await registry.unregister(call_sid)
+        if playout is not None:
+            await playout.close()
+        if call_sid is not None:
+            telemetry.tracer.end_call(call_sid)
+            # Off the event loop: this writes the call's segments to disk
+            await asyncio.to_thread(transcripts.close, call_sid)
         print("WebSocket disconnected")
+
+
+@app.websocket("/events")
+async def events(websocket: WebSocket, call_sid: str = None):
+    """Push channel for consoles: transcript segments, pitch tokens and call status as JSON.
+
+    Call status comes for every call; the rest only for subscribed calls. Send
+    {"subscribe": sid} or {"unsubscribe": sid} to switch; a subscribe is answered
+    with a `snapshot` event holding the call's current state.
+    """
+    await websocket.accept()
+    subscription = hub.subscribe()
+
+    async def subscribe(sid):
+        subscription.call_sids.add(sid)
+        try:
+            snapshot = await registry.call(sid, "snapshot")
+        except CallNotFound:
+            snapshot = None
+        subscription.put({"type": "snapshot", "call_sid": sid, "at": time.time(), "snapshot": snapshot})
+
+    async def receive():
+        try:
+            while True:
+                command = await websocket.receive_json()
+                if command.get("subscribe"):
+                    await subscribe(command["subscribe"])
+                elif command.get("unsubscribe"):
+                    subscription.call_sids.discard(command["unsubscribe"])
+        except Exception:
+            pass  # disconnected; the send loop stops at its next wake-up
+
+    receiver = asyncio.create_task(receive())
+    try:
+        await websocket.send_json({"type": "hello", "at": time.time(), "calls": await registry.live_calls()})
+        if call_sid:
+            await subscribe(call_sid)
+        while not receiver.done():
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), EVENTS_PING_S)
+            except asyncio.TimeoutError:
+                event = {"type": "ping", "at": time.time()}
+            await websocket.send_json(event)
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # the console went away mid-send
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(subscription)
+
+
+def on_transcript(session, result):
+    session.transcript.append(result.text, result.start, result.end, result.is_final)
+    registry.emit(session.call_sid, {
+        "type": "transcript", "speaker": "caller", "text": result.text, "start": result.start, "end": result.end, "is_final": result.is_final,
+    })
+    if session.playout is not None and result.text.strip():
+        # The caller is talking over the injection: stop it rather than talk back over them
+        session.playout.barge_in()
+    if result.is_final:
+        # How far behind the caller the transcript runs: the utterance ended at started_at + end on the wall clock
+        telemetry.record("transcript_lag", time.time() - session.started_at - result.end)
+        session.on_final(result.text, result.end)
+        print(f"User said: {result.text}")
+    else:
+        print(f"User (partial): {result.text}")
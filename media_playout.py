@@ -0,0 +1,160 @@
+"""Outbound audio on a bidirectional Twilio Media Stream.
+
+With <Connect><Stream> Twilio plays whatever μ-law frames we send back on
+the same /audio WebSocket, so an injection is heard one 20 ms frame after
+synthesis produces it instead of after a <Play> fetch and full download.
+
+Each call has one CallPlayout. Injections queue up and play in order; each
+is followed by a `mark`, which Twilio echoes back once the caller has heard
+everything before it, so `playing` reflects what is actually buffered on
+Twilio's side. `interrupt()` stops the current injection, drops the queued
+ones and sends `clear` so Twilio flushes its buffer too.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Optional
+
+from dotenv import load_dotenv
+
+from app import telemetry
+from app.tts_stream import stream_tts
+
+load_dotenv()
+
+FRAME_BYTES = 160  # 20 ms of 8 kHz μ-law
+ULAW_SILENCE = b"\xff"
+# Stop the injection when the caller starts talking over it
+BARGE_IN = os.getenv("PLAYOUT_BARGE_IN", "1") == "1"
+MAX_QUEUED = int(os.getenv("PLAYOUT_MAX_QUEUED", "8"))
+
+_ids = itertools.count(1)
+
+
+class PlayoutStats:
+    def __init__(self, window: int = 500):
+        self.first_frame: Deque[float] = deque(maxlen=window)
+        self.injections = self.completed = self.interrupted = self.rejected = self.frames = 0
+
+    def as_dict(self):
+        ordered = sorted(self.first_frame)
+        return {
+            "injections": self.injections,
+            "completed": self.completed,
+            "interrupted": self.interrupted,
+            "rejected": self.rejected,
+            "frames": self.frames,
+            "first_frame_p50_s": ordered[len(ordered) // 2] if ordered else None,
+            "first_frame_max_s": ordered[-1] if ordered else None,
+        }
+
+
+stats = PlayoutStats()
+
+
+class CallPlayout:
+    def __init__(self, websocket, stream_sid: str):
+        self.websocket = websocket
+        self.stream_sid = stream_sid
+        self.queue: asyncio.Queue = asyncio.Queue(MAX_QUEUED)
+        self.current: Optional[str] = None
+        self.marks = set()  # sent but not yet echoed, i.e. still in Twilio's buffer
+        self._barge_in: Optional[asyncio.Task] = None
+        self.task = asyncio.create_task(self._run(), name=f"playout-{stream_sid}")
+
+    @property
+    def playing(self) -> bool:
+        return self.current is not None or bool(self.marks)
+
+    def play(self, audio: AsyncIterator[bytes]) -> Optional[str]:
+        """Queues μ-law audio for the caller; returns its id, or None if the queue is full."""
+        name = f"inject-{next(_ids)}"
+        try:
+            self.queue.put_nowait((name, audio, time.perf_counter()))
+        except asyncio.QueueFull:
+            stats.rejected += 1
+            return None
+        stats.injections += 1
+        return name
+
+    def say(self, text: str) -> Optional[str]:
+        return self.play(stream_tts(text, output_format="ulaw_8000"))
+
+    async def _send(self, message: dict):
+        await self.websocket.send_text(json.dumps({**message, "streamSid": self.stream_sid}))
+
+    async def _run(self):
+        while True:
+            name, audio, queued_at = await self.queue.get()
+            self.current = name
+            try:
+                with telemetry.span("injection", injection=name):
+                    await self._stream(audio, queued_at)
+                self.marks.add(name)
+                await self._send({"event": "mark", "mark": {"name": name}})
+            except Exception as e:
+                print(f"Playout {name} on {self.stream_sid} failed: {e}")
+            finally:
+                self.current = None
+                if hasattr(audio, "aclose"):
+                    await audio.aclose()  # cancels synthesis still in flight
+
+    async def _stream(self, audio: AsyncIterator[bytes], queued_at: float):
+        pending, first = b"", True
+        async for chunk in audio:
+            pending += chunk
+            whole = len(pending) - len(pending) % FRAME_BYTES
+            for i in range(0, whole, FRAME_BYTES):
+                await self._send({"event": "media", "media": {"payload": base64.b64encode(pending[i:i + FRAME_BYTES]).decode()}})
+                stats.frames += 1
+                if first:
+                    first = False
+                    stats.first_frame.append(time.perf_counter() - queued_at)
+                    telemetry.record("injection_first_frame", stats.first_frame[-1])
+            pending = pending[whole:]
+        if pending:
+            padded = pending + ULAW_SILENCE * (FRAME_BYTES - len(pending))
+            await self._send({"event": "media", "media": {"payload": base64.b64encode(padded).decode()}})
+            stats.frames += 1
+
+    def on_mark(self, name: str):
+        if name in self.marks:
+            self.marks.discard(name)
+            stats.completed += 1
+
+    async def interrupt(self) -> bool:
+        """Stops what is playing and drops what is queued; False if nothing was."""
+        if not self.playing and self.queue.empty():
+            return False
+        stats.interrupted += 1
+        while not self.queue.empty():
+            _, audio, _ = self.queue.get_nowait()
+            if hasattr(audio, "aclose"):
+                await audio.aclose()
+        if self.current is not None:
+            self.current = None
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = asyncio.create_task(self._run(), name=f"playout-{self.stream_sid}")
+        self.marks.clear()
+        await self._send({"event": "clear"})
+        return True
+
+    def barge_in(self):
+        """Called on caller speech: interrupts the injection, once however many partials arrive."""
+        if BARGE_IN and self.playing and (self._barge_in is None or self._barge_in.done()):
+            self._barge_in = asyncio.create_task(self.interrupt())
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
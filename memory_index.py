@@ -0,0 +1,275 @@
+"""Top-k retrieval over each user's memories.
+
+Every memory written through `IndexedMemoryDb` is embedded once and stored
+next to its row in `<table>_vectors` (float32 bytes plus the memory text),
+and added to an in-process per-user index: FAISS when it is installed,
+otherwise a numpy matrix. A turn then costs one embedding and one index
+search, and only k memories reach the prompt, however many the user has.
+
+Other workers' writes are picked up incrementally: each user's index
+remembers the newest `updated_at` it has seen and, at most every
+MEMORY_SYNC_INTERVAL seconds, reads only the vector rows changed since.
+Deletes are kept as tombstones so they travel the same way.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from agno.memory.v2.db.base import MemoryDb
+from dotenv import load_dotenv
+from sqlalchemy import Boolean, Column, Float, LargeBinary, MetaData, String, Table, select
+
+from app.semantic_cache import HashingEmbedder
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+load_dotenv()
+
+MEMORY_SYNC_INTERVAL = float(os.getenv("MEMORY_SYNC_INTERVAL", "10"))
+# Rows written within this many seconds before the watermark are re-read, to tolerate clock skew between workers
+SYNC_OVERLAP = 5.0
+
+
+def memory_text(memory: dict) -> str:
+    return str(memory.get("memory", "")) if isinstance(memory, dict) else str(memory)
+
+
+class UserIndex:
+    """Inner-product index over one user's memory vectors, addressed by memory id."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.texts: Dict[str, str] = {}
+        self.watermark = 0.0
+        self.synced = 0.0
+        if faiss is not None:
+            self._faiss = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+            self._ids: Dict[str, int] = {}
+            self._names: Dict[int, str] = {}
+            self._next = 0
+        else:
+            self._faiss = None
+            self._matrix = np.zeros((16, dim), dtype=np.float32)
+            self._rows: List[str] = []
+            self._row_of: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, memory_id: str, text: str, vector: np.ndarray):
+        self.remove(memory_id)
+        self.texts[memory_id] = text
+        if self._faiss is not None:
+            self._ids[memory_id] = self._next
+            self._names[self._next] = memory_id
+            self._faiss.add_with_ids(vector.reshape(1, -1), np.array([self._next], dtype=np.int64))
+            self._next += 1
+            return
+        if len(self._rows) == len(self._matrix):
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._row_of[memory_id] = len(self._rows)
+        self._matrix[len(self._rows)] = vector
+        self._rows.append(memory_id)
+
+    def remove(self, memory_id: str):
+        if self.texts.pop(memory_id, None) is None:
+            return
+        if self._faiss is not None:
+            internal = self._ids.pop(memory_id)
+            del self._names[internal]
+            self._faiss.remove_ids(np.array([internal], dtype=np.int64))
+            return
+        # Move the last row into the hole so the matrix stays dense
+        row, last = self._row_of.pop(memory_id), len(self._rows) - 1
+        if row != last:
+            moved = self._rows[last]
+            self._matrix[row] = self._matrix[last]
+            self._rows[row] = moved
+            self._row_of[moved] = row
+        self._rows.pop()
+
+    def search(self, vector: np.ndarray, k: int) -> List[str]:
+        """Ids of the k nearest memories, best first."""
+        if not self.texts:
+            return []
+        k = min(k, len(self.texts))
+        if self._faiss is not None:
+            _, ids = self._faiss.search(vector.reshape(1, -1), k)
+            return [self._names[i] for i in ids[0] if i >= 0]
+        scores = self._matrix[:len(self._rows)] @ vector
+        best = np.argpartition(-scores, k - 1)[:k]
+        return [self._rows[i] for i in best[np.argsort(-scores[best])]]
+
+
+class IndexedMemoryDb(MemoryDb):
+    """Wraps an agno MemoryDb, keeping a vector per memory and a per-user index in step with it."""
+
+    def __init__(self, inner: MemoryDb, embedder=None, sync_interval: float = MEMORY_SYNC_INTERVAL):
+        self.inner = inner
+        self.embedder = embedder or HashingEmbedder()
+        self.sync_interval = sync_interval
+        self.vectors = Table(
+            f"{inner.table_name}_vectors",
+            MetaData(),
+            Column("memory_id", String, primary_key=True),
+            Column("user_id", String, index=True),
+            Column("memory", String),
+            Column("vector", LargeBinary),
+            Column("deleted", Boolean, default=False),
+            Column("updated_at", Float, index=True),
+            **({"schema": inner.schema} if getattr(inner, "schema", None) else {}),
+        )
+        self._indexes: Dict[str, UserIndex] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._created = False
+        self.searches = 0
+        self.search_total = 0.0
+
+    def __getattr__(self, name):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _embed(self, text: str) -> np.ndarray:
+        return np.ascontiguousarray(self.embedder.embed(text), dtype=np.float32)
+
+    # MemoryDb interface
+
+    def create(self) -> None:
+        self.inner.create()
+        self.vectors.create(self.inner.db_engine, checkfirst=True)
+        self._created = True
+
+    def memory_exists(self, memory) -> bool:
+        return self.inner.memory_exists(memory)
+
+    def read_memories(self, user_id: Optional[str] = None, limit: Optional[int] = None, sort: Optional[str] = None):
+        return self.inner.read_memories(user_id, limit, sort)
+
+    def upsert_memory(self, memory, create_and_retry: bool = True) -> None:
+        self.inner.upsert_memory(memory, create_and_retry)
+        text = memory_text(memory.memory)
+        vector = self._embed(text)
+        self._write_vector(memory.id, memory.user_id, text, vector, deleted=False)
+        index = self._indexes.get(memory.user_id)
+        if index is not None:
+            with self._lock(memory.user_id):
+                index.add(memory.id, text, vector)
+
+    def delete_memory(self, memory_id: str) -> None:
+        self.inner.delete_memory(memory_id)
+        with self.inner.db_engine.begin() as conn:
+            row = conn.execute(select(self.vectors.c.user_id).where(self.vectors.c.memory_id == memory_id)).first()
+            conn.execute(self.vectors.update().where(self.vectors.c.memory_id == memory_id).values(
+                deleted=True, vector=None, updated_at=time.time()
+            ))
+        if row is not None and row.user_id in self._indexes:
+            with self._lock(row.user_id):
+                self._indexes[row.user_id].remove(memory_id)
+
+    def drop_table(self) -> None:
+        self.inner.drop_table()
+        self.vectors.drop(self.inner.db_engine, checkfirst=True)
+        self._indexes.clear()
+
+    def table_exists(self) -> bool:
+        return self.inner.table_exists()
+
+    def clear(self) -> bool:
+        with self.inner.db_engine.begin() as conn:
+            conn.execute(self.vectors.delete())
+        self._indexes.clear()
+        return self.inner.clear()
+
+    # Vectors and retrieval
+
+    def _write_vector(self, memory_id, user_id, text, vector, deleted):
+        if not self._created:
+            self.create()
+        values = dict(user_id=user_id, memory=text, vector=None if vector is None else vector.tobytes(),
+                      deleted=deleted, updated_at=time.time())
+        with self.inner.db_engine.begin() as conn:
+            updated = conn.execute(
+                self.vectors.update().where(self.vectors.c.memory_id == memory_id).values(**values)
+            ).rowcount
+            if not updated:
+                conn.execute(self.vectors.insert().values(memory_id=memory_id, **values))
+
+    def _load(self, user_id: str) -> UserIndex:
+        """Builds a user's index from stored vectors, embedding any memory that does not have one yet."""
+        index = UserIndex(self.embedder.dim)
+        with self.inner.db_engine.connect() as conn:
+            rows = conn.execute(select(self.vectors).where(self.vectors.c.user_id == user_id)).all()
+        stored = set()
+        for row in rows:
+            stored.add(row.memory_id)
+            index.watermark = max(index.watermark, row.updated_at or 0.0)
+            if not row.deleted and row.vector is not None:
+                vector = np.frombuffer(row.vector, dtype=np.float32)
+                if len(vector) == index.dim:
+                    index.add(row.memory_id, row.memory, vector)
+                    continue
+                stored.discard(row.memory_id)  # written with a different embedder, redo it
+        for memory in self.inner.read_memories(user_id=user_id):
+            if memory.id not in stored:
+                text = memory_text(memory.memory)
+                vector = self._embed(text)
+                self._write_vector(memory.id, user_id, text, vector, deleted=False)
+                index.add(memory.id, text, vector)
+        index.synced = time.time()
+        return index
+
+    def _sync(self, user_id: str, index: UserIndex):
+        since = index.watermark - SYNC_OVERLAP
+        with self.inner.db_engine.connect() as conn:
+            rows = conn.execute(select(self.vectors).where(
+                self.vectors.c.user_id == user_id, self.vectors.c.updated_at > since
+            )).all()
+        for row in rows:
+            index.watermark = max(index.watermark, row.updated_at or 0.0)
+            if row.deleted or row.vector is None:
+                index.remove(row.memory_id)
+            elif index.texts.get(row.memory_id) != row.memory:
+                index.add(row.memory_id, row.memory, np.frombuffer(row.vector, dtype=np.float32))
+        index.synced = time.time()
+
+    def index_for(self, user_id: str) -> UserIndex:
+        with self._lock(user_id):
+            index = self._indexes.get(user_id)
+            if index is None:
+                if not self._created:
+                    self.create()
+                index = self._indexes[user_id] = self._load(user_id)
+            elif time.time() - index.synced > self.sync_interval:
+                self._sync(user_id, index)
+            return index
+
+    def search(self, user_id: str, query: str, k: int) -> List[str]:
+        """Texts of the user's k memories most relevant to `query`, best first."""
+        start = time.perf_counter()
+        index = self.index_for(user_id)
+        vector = self._embed(query)
+        with self._lock(user_id):
+            texts = [index.texts[i] for i in index.search(vector, k)]
+        self.searches += 1
+        self.search_total += time.perf_counter() - start
+        return texts
+
+    def as_dict(self):
+        return {
+            "backend": "faiss" if faiss is not None else "numpy",
+            "users": len(self._indexes),
+            "memories": sum(len(i) for i in self._indexes.values()),
+            "searches": self.searches,
+            "search_avg_ms": 1000 * self.search_total / self.searches if self.searches else None,
+        }
@@ -4,6 +4,8 @@ import asyncio
 import websockets
 import json
 import base64
+import html
+import queue
 import threading
 import time
 from typing import Dict, Any
@@ -13,10 +15,16 @@ import wave
 import io
 from datetime import datetime
 import streamlit.components.v1 as components
+from requests.adapters import HTTPAdapter
 
 # Configuration
 FASTAPI_BASE_URL = "http://localhost:8000"
 WS_BASE_URL = "ws://localhost:8000"
+REQUEST_TIMEOUT_S = 60  # pitch generation runs the agents, so this is generous
+EVENTS_QUEUE = 500  # live events buffered between two UI refreshes; the oldest are dropped beyond this
+EVENTS_IDLE_S = 300  # the event thread stops once its browser tab has not drained it for this long
+LIVE_REFRESH_S = 0.5  # how often the live panels redraw from the event queue
+TRANSCRIPT_LINES = 200
 
 # Page configuration
 st.set_page_config(
@@ -74,8 +82,16 @@ if "transcription_log" not in st.session_state:
     st.session_state.transcription_log = []
 if "pitch_history" not in st.session_state:
     st.session_state.pitch_history = []
-if "ws_connection" not in st.session_state:
-    st.session_state.ws_connection = None
+if "live_calls" not in st.session_state:
+    st.session_state.live_calls = {}
+if "live_partial" not in st.session_state:
+    st.session_state.live_partial = None
+if "live_pitch" not in st.session_state:
+    st.session_state.live_pitch = None
+if "pitch_screens" not in st.session_state:
+    st.session_state.pitch_screens = {}  # call SID -> (ETag, pitch screen)
+if "screen_stale" not in st.session_state:
+    st.session_state.screen_stale = True
 
 
 class AudioStreamHandler:
@@ -109,14 +125,188 @@ class AudioStreamHandler:
             await self.connection.close()
 
 
+@st.cache_resource
+def http_session() -> requests.Session:
+    """Keep-alive connection pool shared by every REST call of every browser session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class EventStream:
+    """The browser session's one /events WebSocket, read on a daemon thread.
+
+    Transcript segments, pitch tokens and call status land in a bounded queue
+    that the live panels drain; when the UI falls behind the oldest events go.
+    Reconnects with backoff and re-subscribes; stops when nobody drains it.
+    """
+
+    def __init__(self, url: str, maxsize: int = EVENTS_QUEUE):
+        self.url = url
+        self.events = queue.Queue(maxsize)
+        self.subscribed = set()
+        self.status = "connecting"
+        self.dropped = 0
+        self.last_drain = time.time()
+        self._socket = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="event-stream", daemon=True)
+        self._thread.start()
+
+    def alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def follow(self, call_sid):
+        """Switch the stream to one call's events (None: call status only)"""
+        for sid in self.subscribed - {call_sid}:
+            self._send({"unsubscribe": sid})
+        new = call_sid is not None and call_sid not in self.subscribed
+        self.subscribed = {call_sid} if call_sid else set()
+        if new:
+            self._send({"subscribe": call_sid})
+
+    def drain(self) -> list:
+        self.last_drain = time.time()
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _send(self, command: dict):
+        socket = self._socket
+        if socket is not None:
+            asyncio.run_coroutine_threadsafe(socket.send(json.dumps(command)), self._loop)
+
+    def _put(self, event: dict):
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _idle(self) -> bool:
+        return time.time() - self.last_drain > EVENTS_IDLE_S
+
+    def _run(self):
+        self._loop.run_until_complete(self._consume())
+        self._loop.close()
+
+    async def _consume(self):
+        backoff = 0.5
+        while not self._idle():
+            try:
+                async with websockets.connect(self.url) as socket:
+                    self._socket = socket
+                    self.status = "connected"
+                    backoff = 0.5
+                    for sid in list(self.subscribed):
+                        await socket.send(json.dumps({"subscribe": sid}))
+                    # The server pings idle sockets, so this wakes up to notice a closed tab
+                    async for message in socket:
+                        self._put(json.loads(message))
+                        if self._idle():
+                            break
+            except Exception as e:
+                self.status = f"reconnecting ({e})"
+            self._socket = None
+            if not self._idle():
+                await asyncio.sleep(backoff)
+                backoff = min(2 * backoff, 10)
+        self.status = "stopped"
+
+
+def event_stream() -> EventStream:
+    url = f"{WS_BASE_URL}/events"
+    stream = st.session_state.get("event_stream")
+    if stream is None or not stream.alive() or stream.url != url:
+        stream = st.session_state.event_stream = EventStream(url)
+        stream.follow(st.session_state.call_sid)
+    return stream
+
+
+def follow_call(call_sid):
+    """Point the console at a call: its transcript and pitches now arrive over the event stream"""
+    st.session_state.call_sid = call_sid
+    st.session_state.call_active = call_sid is not None
+    st.session_state.transcription_log = []
+    st.session_state.live_partial = None
+    st.session_state.live_pitch = None
+    st.session_state.screen_stale = True
+    event_stream().follow(call_sid)
+
+
+def transcript_entry(text: str, speaker: str, at: float = None) -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.fromtimestamp(at or time.time()).strftime("%H:%M:%S"),
+        "speaker": "Customer" if speaker == "caller" else speaker.title(),
+        "text": text,
+    }
+
+
+def pump_events():
+    """Apply everything the event stream received since the last call to the session state"""
+    state = st.session_state
+    for event in event_stream().drain():
+        kind, sid = event["type"], event.get("call_sid")
+        if sid is not None and sid == state.call_sid:
+            state.screen_stale = True  # whatever changed the call may have changed its pitch screen
+        if kind == "hello":
+            state.live_calls = dict(event["calls"])
+        elif kind == "call_started":
+            state.live_calls[sid] = event.get("worker")
+        elif kind == "call_ended":
+            state.live_calls.pop(sid, None)
+            if sid == state.call_sid:
+                state.live_partial = None
+        elif sid != state.call_sid:
+            continue  # left over from the call the console followed before
+        elif kind == "snapshot" and event["snapshot"]:
+            started = event["snapshot"]["started_at"]
+            state.transcription_log = [
+                transcript_entry(text, speaker, started + end)
+                for start, end, speaker, text, is_final in event["snapshot"]["segments"]
+                if is_final
+            ][-TRANSCRIPT_LINES:]
+        elif kind == "transcript":
+            if event["is_final"]:
+                if event["text"].strip():
+                    state.transcription_log.append(transcript_entry(event["text"], event["speaker"], event["at"]))
+                    del state.transcription_log[:-TRANSCRIPT_LINES]
+                state.live_partial = None
+            else:
+                state.live_partial = event["text"]
+        elif kind == "pitch_started":
+            state.live_pitch = ""
+        elif kind == "pitch_token":
+            state.live_pitch = (state.live_pitch or "") + event["text"]
+        elif kind == "pitch":
+            state.live_pitch = None
+            state.pitch_history.append(
+                {
+                    "timestamp": datetime.fromtimestamp(event["at"]).strftime("%H:%M:%S"),
+                    "input": event.get("query") or "",
+                    "pitch": event["pitch"],
+                }
+            )
+
+
 def make_api_request(endpoint: str, method: str = "GET", data: Dict[str, Any] = None):
     """Make API request to FastAPI backend"""
     url = f"{FASTAPI_BASE_URL}{endpoint}"
     try:
         if method == "GET":
-            response = requests.get(url)
+            response = http_session().get(url, timeout=REQUEST_TIMEOUT_S)
         elif method == "POST":
-            response = requests.post(url, json=data)
+            response = http_session().post(url, json=data, timeout=REQUEST_TIMEOUT_S)
 
         if response.status_code == 200:
             return response.json()
@@ -134,12 +324,26 @@ def generate_pitch(text: str, user_id: str):
     return make_api_request("/agno/generate-pitch", "POST", data)
 
 
+def generate_pitch_stream(text: str, user_id: str, bypass_cache: bool = False):
+    """Stream pitch generation, yielding (event, data) pairs as the backend sends them"""
+    data = {"text": text, "user_id": user_id, "bypass_cache": bypass_cache}
+    url = f"{FASTAPI_BASE_URL}/agno/generate-pitch/stream"
+    with http_session().post(url, json=data, stream=True, timeout=REQUEST_TIMEOUT_S) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+
+
 def synthesize_tts(text: str):
     """Synthesize text to speech"""
     data = {"text": text}
     try:
         url = f"{FASTAPI_BASE_URL}/tts/synthesize"
-        response = requests.post(url, json=data)
+        response = http_session().post(url, json=data, timeout=REQUEST_TIMEOUT_S)
         if response.status_code == 200:
             return response.content
         else:
@@ -156,9 +360,26 @@ def inject_audio(audio_text: str, call_sid: str):
     return make_api_request("/inject/play", "POST", data)
 
 
-def get_pitch_screen(call_id: str):
-    """Retrieve cached pitch for call"""
-    return make_api_request(f"/pitch-screen/{call_id}")
+def get_pitch_screen(call_id: str, quiet: bool = False):
+    """Retrieve cached pitch for call; the body is only downloaded again once its version changed"""
+    cached = st.session_state.pitch_screens.get(call_id)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    try:
+        response = http_session().get(
+            f"{FASTAPI_BASE_URL}/pitch-screen/{call_id}", headers=headers, timeout=REQUEST_TIMEOUT_S
+        )
+    except Exception as e:
+        if not quiet:
+            st.error(f"Request failed: {e}")
+        return cached and cached[1]
+    if response.status_code == 304:
+        return cached[1]
+    if response.status_code == 200:
+        st.session_state.pitch_screens[call_id] = (response.headers.get("ETag"), response.json())
+        return response.json()
+    if not quiet:
+        st.error(f"API Error: {response.status_code} - {response.text}")
+    return None
 
 
 # Main UI
@@ -174,6 +395,7 @@ with st.sidebar:
     api_url = st.text_input("FastAPI Base URL", value=FASTAPI_BASE_URL)
     if api_url != FASTAPI_BASE_URL:
         FASTAPI_BASE_URL = api_url
+        WS_BASE_URL = "ws" + api_url[len("http"):]
 
     # User ID for pitch generation
     user_id = st.text_input("User ID", value="default_user")
@@ -182,17 +404,35 @@ with st.sidebar:
 
     # Call Status
     st.header("📊 Call Status")
-    if st.session_state.call_active:
-        st.markdown(
-            '<div class="status-box status-active">🟢 Call Active</div>',
-            unsafe_allow_html=True,
-        )
-        st.write(f"**Call SID:** {st.session_state.call_sid}")
-    else:
-        st.markdown(
-            '<div class="status-box status-inactive">🔴 No Active Call</div>',
-            unsafe_allow_html=True,
+
+    @st.fragment(run_every=LIVE_REFRESH_S)
+    def call_status():
+        pump_events()
+        live_calls = st.session_state.live_calls
+        if st.session_state.call_active:
+            live = st.session_state.call_sid in live_calls
+            st.markdown(
+                f'<div class="status-box status-active">🟢 {"Call Live" if live else "Call Active"}</div>',
+                unsafe_allow_html=True,
+            )
+            st.write(f"**Call SID:** {st.session_state.call_sid}")
+        else:
+            st.markdown(
+                '<div class="status-box status-inactive">🔴 No Active Call</div>',
+                unsafe_allow_html=True,
+            )
+        options = [None] + sorted(set(live_calls) | {st.session_state.call_sid} - {None})
+        followed = st.selectbox(
+            f"Follow live call ({len(live_calls)} live)",
+            options,
+            index=options.index(st.session_state.call_sid),
+            format_func=lambda sid: "—" if sid is None else sid,
         )
+        if followed != st.session_state.call_sid:
+            follow_call(followed)
+            st.rerun()
+
+    call_status()
 
 # Main content area with tabs
 tab1, tab2, tab3, tab4, tab5 = st.tabs(
@@ -217,20 +457,53 @@ with tab1:
             placeholder="e.g., Customer is asking about pricing for our premium package...",
         )
 
+        bypass_cache = st.checkbox(
+            "Bypass cache", help="Run the agents even if a similar query was answered recently"
+        )
+
         if st.button("🚀 Generate Pitch", type="primary"):
             if pitch_input.strip():
-                with st.spinner("Generating AI-powered pitch..."):
-                    result = generate_pitch(pitch_input, user_id)
-                    if result:
-                        pitch_text = result.get("pitch", "No pitch generated")
-                        st.session_state.pitch_history.append(
-                            {
-                                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                                "input": pitch_input,
-                                "pitch": pitch_text,
-                            }
-                        )
-                        st.success("Pitch generated successfully!")
+                # Render stage progress and writer tokens as they stream in
+                status = st.status("Generating AI-powered pitch...")
+                pitch_placeholder = st.empty()
+                pitch_text = ""
+                summary = None
+                try:
+                    for event, payload in generate_pitch_stream(
+                        pitch_input, user_id, bypass_cache
+                    ):
+                        if event == "stage":
+                            status.write(
+                                f"{payload['stage']}: {payload['status']} ({payload['elapsed']:.2f}s)"
+                            )
+                        elif event == "token":
+                            pitch_text += payload["text"]
+                            pitch_placeholder.markdown(pitch_text + "▌")
+                        elif event == "done":
+                            summary = payload
+                        elif event == "error":
+                            st.error(f"Pitch generation failed: {payload['detail']}")
+                except Exception as e:
+                    st.error(f"Request failed: {e}")
+                pitch_placeholder.markdown(pitch_text)
+
+                if pitch_text:
+                    st.session_state.pitch_history.append(
+                        {
+                            "timestamp": datetime.now().strftime("%H:%M:%S"),
+                            "input": pitch_input,
+                            "pitch": pitch_text,
+                        }
+                    )
+                    ttft = summary and summary.get("time_to_first_token_s")
+                    label = (
+                        f"Pitch generated (first token in {ttft:.2f}s)"
+                        if ttft is not None
+                        else "Pitch generated"
+                    )
+                    status.update(label=label, state="complete")
+                else:
+                    status.update(label="No pitch generated", state="error")
             else:
                 st.warning("Please enter some context or query first.")
 
@@ -262,7 +535,7 @@ with tab1:
             ):
                 st.write("**Input:**", entry["input"])
                 st.markdown(
-                    f'<div class="pitch-box"><strong>Generated Pitch:</strong><br>{entry["pitch"]}</div>',
+                    f'<div class="pitch-box"><strong>Generated Pitch:</strong><br>{html.escape(entry["pitch"])}</div>',
                     unsafe_allow_html=True,
                 )
 
@@ -298,54 +571,64 @@ with tab2:
         # Simulate call start/stop (in real implementation, this would connect to Twilio)
         if not st.session_state.call_active:
             if st.button("📞 Start Simulated Call", type="primary"):
-                st.session_state.call_sid = f"call_{uuid.uuid4().hex[:8]}"
-                st.session_state.call_active = True
+                follow_call(f"call_{uuid.uuid4().hex[:8]}")
                 st.rerun()
         else:
             if st.button("📞 End Call", type="secondary"):
-                st.session_state.call_active = False
-                st.session_state.call_sid = None
+                follow_call(None)
                 st.rerun()
 
 with tab3:
     st.header("📝 Real-time Transcription")
 
-    if st.session_state.call_active:
-        st.info("Transcription would appear here during an active call")
-
-        # Simulated transcription display
-        if st.button("🔄 Refresh Transcription"):
-            # In real implementation, this would fetch from the transcription service
-            sample_transcription = [
-                {
-                    "timestamp": "14:30:15",
-                    "speaker": "Customer",
-                    "text": "I'm interested in your premium package",
-                },
-                {
-                    "timestamp": "14:30:22",
-                    "speaker": "Agent",
-                    "text": "Great! Let me tell you about our premium features...",
-                },
-            ]
-            st.session_state.transcription_log.extend(sample_transcription)
+    # Redraws on its own from the event stream; the rest of the page does not rerun
+    @st.fragment(run_every=LIVE_REFRESH_S)
+    def live_transcription():
+        pump_events()
+        if not st.session_state.call_active:
+            st.warning("No active call. Start or follow a call to see transcription.")
+            return
+        if st.session_state.call_sid not in st.session_state.live_calls:
+            st.info("Waiting for this call's media stream...")
+
+        call_sid = st.session_state.call_sid
+        if st.session_state.screen_stale and call_sid in st.session_state.live_calls:
+            get_pitch_screen(call_sid, quiet=True)
+            st.session_state.screen_stale = False
+        screen = st.session_state.pitch_screens.get(call_sid, (None, None))[1]
+        if screen:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Sentiment", (screen["sentiment_label"] or "—").title())
+            col2.metric("Suggested Product", (screen["suggested_product"] or "—").replace("_", " ").title())
+            col3.metric("Intent", (screen["intent"] or "—").replace("_", " ").title())
+            if screen["to_address"]:
+                st.write(f"**To address:** {screen['to_address']}")
+            for point in screen["talking_points"]:
+                st.markdown(f"- {point}")
+
+        if st.session_state.live_pitch is not None:
+            st.markdown(
+                f'<div class="pitch-box"><strong>Live Pitch:</strong><br>{html.escape(st.session_state.live_pitch)}▌</div>',
+                unsafe_allow_html=True,
+            )
 
         # Display transcription log
-        if st.session_state.transcription_log:
-            for entry in st.session_state.transcription_log:
-                speaker_color = "#1f77b4" if entry["speaker"] == "Agent" else "#ff7f0e"
-                st.markdown(
-                    f"""
-                <div style="margin: 0.5rem 0; padding: 0.5rem; border-left: 3px solid {speaker_color};">
-                    <strong style="color: {speaker_color};">{entry["speaker"]}</strong> 
-                    <span style="color: #666; font-size: 0.8rem;">({entry["timestamp"]})</span><br>
-                    {entry["text"]}
-                </div>
-                """,
-                    unsafe_allow_html=True,
-                )
-    else:
-        st.warning("No active call. Start a call to see transcription.")
+        for entry in st.session_state.transcription_log:
+            speaker_color = "#1f77b4" if entry["speaker"] == "Agent" else "#ff7f0e"
+            st.markdown(
+                f"""
+            <div style="margin: 0.5rem 0; padding: 0.5rem; border-left: 3px solid {speaker_color};">
+                <strong style="color: {speaker_color};">{html.escape(entry["speaker"])}</strong> 
+                <span style="color: #666; font-size: 0.8rem;">({entry["timestamp"]})</span><br>
+                {html.escape(entry["text"])}
+            </div>
+            """,
+                unsafe_allow_html=True,
+            )
+        if st.session_state.live_partial:
+            st.caption(f"Customer (speaking): {st.session_state.live_partial}")
+
+    live_transcription()
 
 with tab4:
     st.header("💉 Audio Injection")
@@ -376,6 +659,7 @@ with tab4:
 
         # Quick injection buttons
         st.subheader("🚀 Quick Injections")
+        # Kept in sync with tts_cache.QUICK_RESPONSES so these play from the pre-synthesized cache
         quick_responses = [
             "Thank you for holding. Let me get that information for you.",
             "I understand your concern. Let me explain how we can help.",
@@ -427,7 +711,7 @@ with tab5:
         # API Health Check
         if st.button("🏥 Check API Health"):
             try:
-                response = requests.get(f"{FASTAPI_BASE_URL}/docs")
+                response = http_session().get(f"{FASTAPI_BASE_URL}/docs", timeout=5)
                 if response.status_code == 200:
                     st.success("✅ FastAPI Backend: Healthy")
                 else:
@@ -437,7 +721,11 @@ with tab5:
 
         # WebSocket Health Check
         if st.button("🔌 Test WebSocket"):
-            st.info("WebSocket test would be performed here")
+            stream = event_stream()
+            if stream.status == "connected":
+                st.success(f"✅ Event stream: connected ({stream.dropped} events dropped)")
+            else:
+                st.error(f"❌ Event stream: {stream.status}")
 
         # Statistics
         st.subheader("📊 Session Statistics")
@@ -470,9 +758,3 @@ components.html(
     """,
     height=350,  # Or adjust as needed
 )
-
-
-# Auto-refresh for real-time updates (optional)
-if st.session_state.call_active:
-    time.sleep(1)  # Small delay for demo purposes
-    # In production, you'd use st.rerun() with proper WebSocket handling
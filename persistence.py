@@ -0,0 +1,281 @@
+"""Storage for the agents' `agent_sessions` and `user_memory` tables.
+
+By default both live in SQLite files under tmp/, opened through one pooled
+engine per file with WAL on, so readers never wait on the writer and several
+workers can share the files. Point AGENT_DB_URL at a server database
+(e.g. postgresql+psycopg://ai:ai@localhost:5532/ai) to share state across
+machines; a local stand-in is one command away:
+
+    docker run -d -p 5532:5432 -e POSTGRES_USER=ai -e POSTGRES_PASSWORD=ai -e POSTGRES_DB=ai postgres:16
+
+Session upserts, which agno does synchronously at the end of every agent
+run, go through a write-behind buffer and are flushed in batches by a
+background thread. Memories are written straight through: the memory
+agent reads them back within the same turn.
+"""
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from agno.storage.base import Storage
+from dotenv import load_dotenv
+from sqlalchemy import MetaData, create_engine, event, inspect
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+load_dotenv()
+
+AGENT_DB_URL = os.getenv("AGENT_DB_URL")  # unset: SQLite files in SQLITE_DIR
+SQLITE_DIR = os.getenv("AGENT_DB_DIR", "tmp")
+DB_POOL_SIZE = int(os.getenv("AGENT_DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("AGENT_DB_MAX_OVERFLOW", "8"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Write-behind: pending session updates are flushed this often, or sooner once this many pile up
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.5"))
+SESSION_FLUSH_BATCH = int(os.getenv("SESSION_FLUSH_BATCH", "64"))
+SESSION_READ_CACHE = int(os.getenv("SESSION_READ_CACHE", "1024"))
+SESSION_WRITE_BEHIND = os.getenv("SESSION_WRITE_BEHIND", "1") == "1"
+
+_engines = {}
+_engines_lock = threading.Lock()
+_write_behind = []
+
+
+def _sqlite_pragmas(dbapi_connection, _record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL only risks the last commits on power loss, never corruption
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def get_engine(url: str):
+    """One pooled engine per database, shared by every table and agent in the process."""
+    with _engines_lock:
+        engine = _engines.get(url)
+        if engine is None:
+            if url.startswith("sqlite"):
+                engine = create_engine(
+                    url,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+                )
+                event.listen(engine, "connect", _sqlite_pragmas)
+            else:
+                engine = create_engine(
+                    url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True
+                )
+            _engines[url] = engine
+    return engine
+
+
+def sqlite_url(name: str) -> str:
+    path = Path(SQLITE_DIR, name).resolve()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return f"sqlite:///{path}"
+
+
+def _rebind(store, engine, session_attr: str):
+    # agno 1.5's SQLite classes fall through to an in-memory database whenever
+    # db_engine is passed, so they are built on a throwaway engine and rebound here
+    store.db_engine = engine
+    store.inspector = inspect(engine)
+    store.metadata = MetaData()
+    setattr(store, session_attr, sessionmaker(bind=engine) if session_attr == "SqlSession"
+            else scoped_session(sessionmaker(bind=engine)))
+    store.table = store.get_table()
+    return store
+
+
+class WriteBehindStorage(Storage):
+    """Wraps an agno Storage so `upsert` returns immediately.
+
+    Updates to the same session coalesce while pending, and a background thread
+    writes them out in batches. Reads are served from pending and recently
+    written sessions first, so an agent reloading its own session never hits the
+    database; anything that lists sessions flushes first.
+    """
+
+    def __init__(self, inner: Storage, flush_interval: float = SESSION_FLUSH_INTERVAL,
+                 batch_size: int = SESSION_FLUSH_BATCH, read_cache: int = SESSION_READ_CACHE):
+        self.inner = inner
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.read_cache = read_cache
+        self._pending: "OrderedDict[str, object]" = OrderedDict()
+        self._recent: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.upserts = self.writes = self.flushes = self.read_hits = self.read_misses = 0
+        self._thread = threading.Thread(target=self._flush_loop, name="session-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def mode(self):
+        return self.inner.mode
+
+    @mode.setter
+    def mode(self, value):
+        self.inner.mode = value
+
+    def __getattr__(self, name):
+        # Anything agno reaches for beyond the Storage interface (table_name, db_engine, ...)
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def upsert(self, session):
+        with self._lock:
+            self._pending[session.session_id] = session
+            self._pending.move_to_end(session.session_id)
+            self._remember(session)
+            self.upserts += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return session
+
+    def read(self, session_id: str, user_id: Optional[str] = None):
+        with self._lock:
+            session = self._pending.get(session_id) or self._recent.get(session_id)
+            if session is not None and (user_id is None or session.user_id == user_id):
+                if session_id in self._recent:
+                    self._recent.move_to_end(session_id)
+                self.read_hits += 1
+                return session
+            self.read_misses += 1
+        session = self.inner.read(session_id, user_id)
+        if session is not None:
+            with self._lock:
+                if session_id not in self._pending:
+                    self._remember(session)
+        return session
+
+    def _remember(self, session):
+        self._recent[session.session_id] = session
+        self._recent.move_to_end(session.session_id)
+        while len(self._recent) > self.read_cache:
+            self._recent.popitem(last=False)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Session write-behind flush failed: {e}")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = list(self._pending.values()), OrderedDict()
+            if not batch:
+                return
+            failed = []
+            for session in batch:
+                try:
+                    self.inner.upsert(session)
+                    self.writes += 1
+                except Exception as e:
+                    print(f"Failed to persist session {session.session_id}: {e}")
+                    failed.append(session)
+            self.flushes += 1
+            if failed:
+                with self._lock:
+                    # Put them back unless a newer update arrived meanwhile
+                    for session in failed:
+                        self._pending.setdefault(session.session_id, session)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._wake.set()
+            self.flush()
+
+    def as_dict(self):
+        return {
+            "pending": len(self._pending),
+            "upserts": self.upserts,
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "read_hits": self.read_hits,
+            "read_misses": self.read_misses,
+        }
+
+    def create(self) -> None:
+        self.inner.create()
+
+    def get_all_session_ids(self, user_id: Optional[str] = None, agent_id: Optional[str] = None) -> List[str]:
+        self.flush()
+        return self.inner.get_all_session_ids(user_id, agent_id)
+
+    def get_all_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List:
+        self.flush()
+        return self.inner.get_all_sessions(user_id, entity_id)
+
+    def get_recent_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None,
+                            limit: Optional[int] = 2) -> List:
+        self.flush()
+        return self.inner.get_recent_sessions(user_id, entity_id, limit)
+
+    def delete_session(self, session_id: Optional[str] = None):
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._recent.pop(session_id, None)
+        self.inner.delete_session(session_id)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._recent.clear()
+        self.inner.drop()
+
+    def upgrade_schema(self) -> None:
+        self.inner.upgrade_schema()
+
+
+def build_storage(table_name: str = "agent_sessions", write_behind: bool = SESSION_WRITE_BEHIND):
+    if AGENT_DB_URL and not AGENT_DB_URL.startswith("sqlite"):
+        from agno.storage.postgres import PostgresStorage
+
+        store = PostgresStorage(table_name=table_name, db_engine=get_engine(AGENT_DB_URL))
+    else:
+        from agno.storage.sqlite import SqliteStorage
+
+        store = _rebind(SqliteStorage(table_name=table_name, db_url="sqlite://"),
+                        get_engine(AGENT_DB_URL or sqlite_url("agent.db")), "SqlSession")
+    if write_behind:
+        store = WriteBehindStorage(store)
+        _write_behind.append(store)
+    return store
+
+
+def build_memory_db(table_name: str = "user_memory"):
+    """The memory table wrapped in a vector index, see app.memory_index."""
+    from app.memory_index import IndexedMemoryDb
+
+    if AGENT_DB_URL and not AGENT_DB_URL.startswith("sqlite"):
+        from agno.memory.v2.db.postgres import PostgresMemoryDb
+
+        return IndexedMemoryDb(PostgresMemoryDb(table_name=table_name, db_engine=get_engine(AGENT_DB_URL)))
+    from agno.memory.v2.db.sqlite import SqliteMemoryDb
+
+    return IndexedMemoryDb(_rebind(SqliteMemoryDb(table_name=table_name, db_url="sqlite://"),
+                                   get_engine(AGENT_DB_URL or sqlite_url("memory.db")), "Session"))
+
+
+def shutdown():
+    """Flushes pending session writes and closes every pooled connection."""
+    for store in _write_behind:
+        store.close()
+    for engine in list(_engines.values()):
+        engine.dispose()
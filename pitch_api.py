@@ -0,0 +1,187 @@
+import asyncio
+import importlib
+import json
+import os
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+from app import telemetry
+from app.call_sessions import CallNotFound, registry
+from app.history import prompt_stats
+from app import pitch_screen
+from app.semantic_cache import pitch_cache, sentiment_cache
+from app.tool_cache import tool_cache
+from app.workflow_engine import WorkflowRun
+
+load_dotenv()
+
+# "module:Class" of the pitch workflow; load tests point it at app.benchmarks.llm_standin
+PITCH_WORKFLOW = os.getenv("PITCH_WORKFLOW", "app.agno_workflow:GPSuggestions")
+
+router = APIRouter()
+
+
+class PitchRequest(BaseModel):
+    text: str
+    user_id: str = "default_user"
+    bypass_cache: bool = False  # force a fresh agent run even if a similar query was answered recently
+    call_sid: Optional[str] = None  # live call the pitch is for; it is kept in that call's session
+
+
+class PitchStats:
+    """Time-to-first-token is the headline number: it is what the partner waits through on a live call."""
+
+    def __init__(self, window: int = 500):
+        self.requests = 0
+        self.errors = 0
+        self.ttft = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+
+    @staticmethod
+    def _percentile(values, p):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+    def record(self, run: WorkflowRun):
+        if "first_token" in run.marks:
+            self.ttft.append(run.marks["first_token"])
+        self.total.append(run.elapsed())
+        telemetry.tracer.record_run(run)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "time_to_first_token_p50_s": self._percentile(self.ttft, 0.5),
+            "time_to_first_token_p95_s": self._percentile(self.ttft, 0.95),
+            "total_p50_s": self._percentile(self.total, 0.5),
+            "total_p95_s": self._percentile(self.total, 0.95),
+        }
+
+
+stats = PitchStats()
+
+
+def get_workflow():
+    # Imported here so loading agno stays out of server startup
+    module, name = PITCH_WORKFLOW.split(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+async def record_pitch(payload: PitchRequest, pitch: str):
+    if not payload.call_sid:
+        return
+    try:
+        await registry.call(payload.call_sid, "update_state", user_id=payload.user_id, query=payload.text, pitch=pitch)
+    except CallNotFound:
+        pass  # the call ended while the pitch was being written
+
+
+def run_summary(run: WorkflowRun) -> dict:
+    return {
+        "time_to_first_token_s": run.marks.get("first_token"),
+        "total_s": run.elapsed(),
+        "prompt_tokens": run.prompt_tokens,
+        "steps": {name: {"start": t.start, "end": t.end, "cached": t.cached} for name, t in run.timings.items()},
+    }
+
+
+@router.post("/agno/generate-pitch")
+async def generate_pitch(payload: PitchRequest):
+    stats.requests += 1
+    if payload.call_sid:
+        telemetry.current_call.set(payload.call_sid)  # so the agent and tool spans land in the call's trace
+    run = WorkflowRun()
+    try:
+        pitch = await get_workflow().arun(payload.text, payload.user_id, run, not payload.bypass_cache)
+    except Exception:
+        stats.errors += 1
+        raise
+    stats.record(run)
+    await record_pitch(payload, pitch)
+    return {"pitch": pitch, "timings": run_summary(run)}
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/agno/generate-pitch/stream")
+async def generate_pitch_stream(payload: PitchRequest):
+    """Server-sent events: `stage` on every step start/finish, `token` for each writer chunk, then `done`."""
+    stats.requests += 1
+    if payload.call_sid:
+        telemetry.current_call.set(payload.call_sid)
+    events: asyncio.Queue = asyncio.Queue()
+    run = WorkflowRun(on_event=lambda step, status, at: events.put_nowait(
+        ("stage", {"stage": step, "status": status, "elapsed": at})
+    ))
+
+    async def produce():
+        try:
+            tokens = []
+            async for token in get_workflow().astream(payload.text, payload.user_id, run, not payload.bypass_cache):
+                tokens.append(token)
+                events.put_nowait(("token", {"text": token}))
+            stats.record(run)
+            await record_pitch(payload, "".join(tokens))
+            events.put_nowait(("done", run_summary(run)))
+        except Exception as e:
+            stats.errors += 1
+            events.put_nowait(("error", {"detail": str(e)}))
+        events.put_nowait(None)
+
+    async def stream():
+        task = asyncio.create_task(produce())
+        try:
+            while (item := await events.get()) is not None:
+                yield sse(*item)
+        finally:
+            task.cancel()
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/pitch-screen/{call_id}")
+async def get_pitch_screen(call_id: str, if_none_match: Optional[str] = Header(None)):
+    """The call's pitch screen, from memory. 304 with no body while the client's ETag is current."""
+    try:
+        found = await registry.call(call_id, "pitch_screen", if_none_match=if_none_match)
+    except CallNotFound:
+        found = await registry.ended_screen(call_id, if_none_match)
+        if found is None:
+            raise HTTPException(status_code=404, detail="No pitch screen for this call")
+    headers = {"ETag": found["etag"], "Cache-Control": "no-cache"}
+    if found["screen"] is None:
+        pitch_screen.stats.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    pitch_screen.stats.served += 1
+    return JSONResponse(found["screen"], headers=headers)
+
+
+@router.get("/metrics/pitch")
+def pitch_metrics():
+    return {**stats.as_dict(), "screen": pitch_screen.stats.as_dict()}
+
+
+@router.get("/metrics/prompt")
+def prompt_metrics():
+    return prompt_stats.as_dict()
+
+
+@router.get("/metrics/cache")
+def cache_metrics():
+    return {
+        "pitch": {**pitch_cache.stats.as_dict(), "entries": len(pitch_cache)},
+        "sentiment": {**sentiment_cache.stats.as_dict(), "entries": len(sentiment_cache)},
+        "tools": tool_cache.as_dict(),
+    }
@@ -0,0 +1,150 @@
+"""Per-call pitch screen: what the console shows next to a live call.
+
+Each CallSession holds one PitchScreen and updates it in place as the call
+goes on. Every final utterance moves the sentiment and adds the products it
+names; this reuses the utterance gate's scoring, so no LLM is involved. A
+question or objection is kept as the thing to address next. Every finished
+pitch replaces the talking points.
+
+Every change bumps `version`. The body is built at most once per version,
+so a read is a lookup. A client that sends the current ETag in
+If-None-Match gets a 304 with no body.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.utterance_gate import MIN_CONFIDENCE, URGENT_INTENTS, UtteranceScore
+
+load_dotenv()
+
+MAX_POINTS = int(os.getenv("PITCH_SCREEN_POINTS", "5"))
+RECENT_SCREENS = int(os.getenv("PITCH_SCREEN_RECENT", "500"))  # ended calls whose screen this worker keeps
+_POINT_BREAK = re.compile(r"\n+|(?<=[.!?])\s+|:\s+|;\s+")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def talking_points(pitch: str, limit: int = MAX_POINTS) -> List[str]:
+    points = [_BULLET.sub("", p).strip(" *") for p in _POINT_BREAK.split(pitch or "")]
+    return [p for p in points if len(p) > 2][:limit]
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def sentiment_label(sentiment: Optional[float]) -> Optional[str]:
+    if sentiment is None:
+        return None
+    return "positive" if sentiment > 0.25 else "negative" if sentiment < -0.25 else "neutral"
+
+
+class PitchScreen:
+    def __init__(self, call_sid: str, started_at: float = None):
+        self.call_sid = call_sid
+        self.epoch = f"{int(1000 * (started_at or time.time())):x}"  # a new call under a reused SID gets new ETags
+        self.version = 0
+        self.live = True
+        self.sentiment: Optional[float] = None
+        self.intent: Optional[str] = None
+        self.mentions: Dict[str, int] = {}
+        self.last_product: Optional[str] = None
+        self.to_address: Optional[str] = None
+        self.query: Optional[str] = None
+        self.pitch: Optional[str] = None
+        self.talking_points: List[str] = []
+        self.updated_at = time.time()
+        self._body = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}"'
+
+    def _changed(self):
+        self.version += 1
+        self.updated_at = time.time()
+        self._body = None
+
+    def observe(self, text: str, score: UtteranceScore, sentiment: Optional[float]):
+        """Folds one final utterance in; `sentiment` is the call's running value from its CallGate."""
+        before = (round(self.sentiment or 0, 2), self.intent, self.to_address)
+        for product in score.products:
+            self.mentions[product] = self.mentions.get(product, 0) + 1
+            self.last_product = product
+        self.sentiment = sentiment
+        self.intent = score.intent
+        if score.intent in URGENT_INTENTS and score.confidence >= MIN_CONFIDENCE:
+            self.to_address = text
+        if score.products or (round(self.sentiment or 0, 2), self.intent, self.to_address) != before:
+            self._changed()
+
+    def set_pitch(self, query: Optional[str], pitch: str):
+        self.query, self.pitch = query, pitch
+        self.talking_points = talking_points(pitch)
+        self.to_address = None  # the new pitch answers it
+        self._changed()
+
+    def end(self):
+        self.live = False
+        self._changed()
+
+    def suggested_product(self) -> Optional[str]:
+        # Most mentioned; the latest one breaks ties
+        if not self.mentions:
+            return None
+        return max(self.mentions, key=lambda p: (self.mentions[p], p == self.last_product))
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        return etag_matches(self.etag, if_none_match)
+
+    def as_dict(self) -> dict:
+        if self._body is None:
+            self._body = {
+                "call_sid": self.call_sid,
+                "version": self.version,
+                "live": self.live,
+                "sentiment": None if self.sentiment is None else round(self.sentiment, 3),
+                "sentiment_label": sentiment_label(self.sentiment),
+                "intent": self.intent,
+                "suggested_product": self.suggested_product(),
+                "products": sorted(self.mentions, key=self.mentions.get, reverse=True),
+                "to_address": self.to_address,
+                "talking_points": self.talking_points,
+                "pitch": self.pitch,
+                "query": self.query,
+                "updated_at": self.updated_at,
+            }
+        return self._body
+
+    def conditional(self, if_none_match: Optional[str] = None) -> dict:
+        """{"etag", "screen"}, with screen None when the client already has this version."""
+        return {"etag": self.etag, "screen": None if self.matches(if_none_match) else self.as_dict()}
+
+
+class ScreenStats:
+    def __init__(self):
+        self.served = 0
+        self.not_modified = 0
+
+    def as_dict(self):
+        return {"served": self.served, "not_modified": self.not_modified, "ended_kept": len(recent)}
+
+
+stats = ScreenStats()
+recent: "OrderedDict[str, PitchScreen]" = OrderedDict()
+
+
+def retire(screen: PitchScreen):
+    """Keeps an ended call's screen so the console can still read its last state."""
+    screen.end()
+    recent[screen.call_sid] = screen
+    recent.move_to_end(screen.call_sid)
+    while len(recent) > RECENT_SCREENS:
+        recent.popitem(last=False)
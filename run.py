@@ -1,4 +1,33 @@
+import os
+import socket
+import subprocess
+import sys
+import time
 import uvicorn
 
+# Several workers on one machine; each holds the calls whose media streams it accepted and the
+# others reach them over Redis pub/sub (app.call_sessions). gunicorn_conf.py is the same with preloading.
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+PORT = int(os.getenv("PORT", "8000"))
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    if WORKERS == 1:
+        uvicorn.run("app.main:app", host="0.0.0.0", port=PORT, reload=os.getenv("RELOAD", "1") == "1")
+    else:
+        standin = None
+        if not os.getenv("REDIS_URL"):
+            # No Redis configured: a local stand-in is enough for workers on this one machine
+            standin_port = os.getenv("REDIS_STANDIN_PORT", "6390")
+            standin = subprocess.Popen([sys.executable, "-m", "app.benchmarks.redis_standin", "--port", standin_port])
+            os.environ["REDIS_URL"] = f"redis://127.0.0.1:{standin_port}/0"
+            for _ in range(50):  # workers subscribe on startup, so it has to be listening first
+                try:
+                    socket.create_connection(("127.0.0.1", int(standin_port)), timeout=0.1).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            uvicorn.run("app.main:app", host="0.0.0.0", port=PORT, workers=WORKERS)
+        finally:
+            if standin is not None:
+                standin.terminate()
@@ -0,0 +1,212 @@
+"""Similarity-keyed cache for LLM results.
+
+Partners see the same customer situations over and over, so a query whose
+normalized embedding is close enough to one already answered for the same
+user reuses that answer instead of running the agents again. Entries are
+scoped per user so answers shaped by one user's memories never leak to
+another.
+
+Closeness alone is not enough: "low risk" and "high risk" differ by one
+word, so the embeddings score well above the threshold while the answers
+must differ. A hit also needs the same key facts: exact numbers, product
+terms, risk and horizon words, and negations.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") == "1"
+
+_TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+_STOPWORDS = frozenset(
+    "a an and are around as at be but by for from i im in is it looking me my of on or so that the this "
+    "to very want was we with you".split()
+)
+_FACT_TOKEN = re.compile(r"[a-z]+(?:'[a-z]+)?|\d+(?:\.\d+)?")
+# Words that change the answer when they change; singular forms, a trailing "s" is dropped before lookup
+KEY_TERMS = frozenset(
+    # products
+    "stock share equity mutual fund sip etf bond debt gilt gold silver fd fixed recurring deposit rd ppf nps "
+    "pension insurance policy premium term loan emi card crypto bitcoin property estate saving "
+    # risk
+    "low medium moderate high safe risky aggressive conservative volatile guaranteed stable "
+    # horizon and amounts
+    "short long month year week day monthly yearly annual lakh crore thousand hundred million k "
+    # negation
+    "no not never without neither nor don't dont can't cant won't wont isn't doesn't nahi nahin".split()
+)
+
+
+def normalize(text: str) -> list:
+    """Lowercased content words, with numbers bucketed by magnitude so 10000 and 12000 look alike."""
+    tokens = []
+    for tok in _TOKEN.findall(text.lower().replace(",", "")):
+        if tok[0].isdigit():
+            value = float(tok)
+            tok = f"<num:{round(math.log10(value) * 2) / 2 if value > 0 else 0}>"
+        elif tok in _STOPWORDS:
+            continue
+        tokens.append(tok)
+    return tokens
+
+
+def key_facts(text: str) -> FrozenSet[str]:
+    """Exact numbers and KEY_TERMS in the text; two queries can share a cached answer only if these match."""
+    facts = set()
+    for tok in _FACT_TOKEN.findall(text.lower().replace(",", "")):
+        if tok[0].isdigit():
+            facts.add(str(float(tok)))
+        elif tok in KEY_TERMS:
+            facts.add(tok)
+        elif tok.endswith("s") and tok[:-1] in KEY_TERMS:
+            facts.add(tok[:-1])
+    return frozenset(facts)
+
+
+class HashingEmbedder:
+    """Feature-hashed unigrams and bigrams, L2-normalized. No model, well under a millisecond per query."""
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little") % self.dim
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = normalize(text)
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for tok in tokens:
+            vec[self._bucket(tok)] += 1.0
+        for a, b in zip(tokens, tokens[1:]):
+            vec[self._bucket(f"{a} {b}")] += 0.5
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+
+@dataclass
+class CacheEntry:
+    scope: str
+    vector: np.ndarray
+    facts: FrozenSet[str]
+    value: Any
+    created: float
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.lookup_total = 0.0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "lookup_avg_ms": 1000 * self.lookup_total / lookups if lookups else None,
+        }
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.85, ttl: float = 900, max_entries: int = 2000, embedder=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedder = embedder or HashingEmbedder()
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()  # LRU order, oldest first
+        self._by_scope = {}  # scope -> list of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, scope: str, text: str, vector: np.ndarray = None) -> Optional[Any]:
+        start = time.perf_counter()
+        vector = self.embedder.embed(text) if vector is None else vector
+        facts = key_facts(text)
+        with self._lock:
+            best_id, best_score = self._nearest(scope, vector, facts)
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.stats.hits += 1
+                value = self._entries[best_id].value
+            else:
+                self.stats.misses += 1
+                value = None
+            self.stats.lookup_total += time.perf_counter() - start
+        return value
+
+    def put(self, scope: str, text: str, value: Any, vector: np.ndarray = None):
+        vector = self.embedder.embed(text) if vector is None else vector
+        facts = key_facts(text)
+        with self._lock:
+            best_id, best_score = self._nearest(scope, vector, facts)
+            if best_id is not None and best_score >= self.threshold:
+                self._remove(best_id)  # replace the near-duplicate rather than keep both
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = CacheEntry(scope, vector, facts, value, time.time())
+            self._by_scope.setdefault(scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats.evicted += 1
+
+    def _nearest(self, scope, vector, facts):
+        ids = self._by_scope.get(scope)
+        if not ids:
+            return None, 0.0
+        now = time.time()
+        for entry_id in [i for i in ids if now - self._entries[i].created > self.ttl]:
+            self._remove(entry_id)
+            self.stats.expired += 1
+        ids = [i for i in self._by_scope.get(scope, ()) if self._entries[i].facts == facts]
+        if not ids:
+            return None, 0.0
+        scores = np.stack([self._entries[i].vector for i in ids]) @ vector
+        best = int(np.argmax(scores))
+        return ids[best], float(scores[best])
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        ids = self._by_scope[entry.scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_scope[entry.scope]
+
+    def clear(self, scope: str = None):
+        with self._lock:
+            for entry_id in list(self._by_scope.get(scope, []) if scope else self._entries):
+                self._remove(entry_id)
+
+
+# Pitches go stale with market data, so they expire sooner than sentiment readings
+pitch_cache = SemanticCache(
+    threshold=float(os.getenv("PITCH_CACHE_THRESHOLD", "0.85")),
+    ttl=float(os.getenv("PITCH_CACHE_TTL", "600")),
+    max_entries=int(os.getenv("PITCH_CACHE_SIZE", "2000")),
+)
+sentiment_cache = SemanticCache(
+    threshold=float(os.getenv("SENTIMENT_CACHE_THRESHOLD", "0.85")),
+    ttl=float(os.getenv("SENTIMENT_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("SENTIMENT_CACHE_SIZE", "2000")),
+)
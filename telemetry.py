@@ -0,0 +1,262 @@
+"""Per-stage latency spans for the call pipeline, exported on /metrics.
+
+Every stage a call goes through records a span: frame receipt and μ-law
+decode on each media frame, ASR queue wait and inference per segment, each
+agent step and tool call of a pitch, TTS first byte per sentence, first
+audio of a stream and injection playout. A span lands in three places:
+
+  - a latency histogram per (stage, outcome), rendered in the Prometheus
+    text format by `render()`;
+  - the call's trace, found by call SID: count/total/max per stage, plus the
+    last TRACE_SPANS individual spans (per-frame stages are only counted);
+  - with OTEL_EXPORTER_OTLP_ENDPOINT set and the opentelemetry SDK
+    installed, an OpenTelemetry span under one root span per call.
+
+The call SID comes from `current_call`, a ContextVar set when the media
+stream starts, so tasks spawned for the call (ASR queue, playout, pitch)
+are attributed without passing it around. With TRACING=0 `span()` returns
+a shared no-op and `record()` returns at once, which keeps the cost to a
+few hundred nanoseconds per frame. Metrics are per process; with several workers each scrape sees the
+worker that answered it.
+"""
+import asyncio
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACING = os.getenv("TRACING", "1") == "1"
+TRACE_CALLS = int(os.getenv("TRACE_CALLS", "200"))  # calls whose traces are kept, most recent first
+TRACE_SPANS = int(os.getenv("TRACE_SPANS", "256"))  # individual spans kept per call
+OTEL_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "gromo")
+
+# Stages recorded on every media frame: histogram and per-call totals only, never stored or exported one by one
+HOT_STAGES = {"frame", "decode"}
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+current_call: ContextVar[Optional[str]] = ContextVar("current_call", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+
+class CallTrace:
+    def __init__(self, call_sid: str):
+        self.call_sid = call_sid
+        self.stages: Dict[str, list] = {}  # stage -> [count, total seconds, max seconds]
+        self.spans: Deque[tuple] = deque(maxlen=TRACE_SPANS)  # (stage, start, seconds, outcome, attrs)
+        self.root = None  # OpenTelemetry span the call's spans hang off
+
+    def add(self, stage: str, start: float, seconds: float, outcome: str, attrs: dict):
+        totals = self.stages.get(stage)
+        if totals is None:
+            totals = self.stages[stage] = [0, 0.0, 0.0]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+        if stage not in HOT_STAGES:
+            self.spans.append((stage, start, seconds, outcome, attrs))
+
+    def as_dict(self):
+        return {
+            "call_sid": self.call_sid,
+            "stages": {
+                stage: {"count": n, "total_ms": 1000 * total, "avg_ms": 1000 * total / n, "max_ms": 1000 * peak}
+                for stage, (n, total, peak) in self.stages.items()
+            },
+            "spans": [
+                {"stage": stage, "start": start, "ms": 1000 * seconds, "outcome": outcome, **attrs}
+                for stage, start, seconds, outcome, attrs in self.spans
+            ],
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "stage", "call_sid", "attrs", "started")
+
+    def __init__(self, tracer: "Tracer", stage: str, call_sid: Optional[str], attrs: dict):
+        self.tracer = tracer
+        self.stage = stage
+        self.call_sid = call_sid
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        if exc_type is None:
+            outcome = "ok"
+        else:
+            outcome = "cancelled" if issubclass(exc_type, asyncio.CancelledError) else "error"
+        self.tracer.record(self.stage, seconds, self.call_sid, outcome, time.time() - seconds, **self.attrs)
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING):
+        self.enabled = enabled
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.traces: "OrderedDict[str, CallTrace]" = OrderedDict()
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()  # tool calls record from worker threads
+        self._otel = None
+        self._otel_failed = not OTEL_ENDPOINT
+
+    def span(self, stage: str, call_sid: str = None, **attrs):
+        """Context manager timing the block as `stage`; outcome "error" or "cancelled" if it raises."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, stage, call_sid, attrs)
+
+    def record(self, stage: str, seconds: float, call_sid: str = None, outcome: str = "ok", start: float = None, **attrs):
+        """Records a span measured elsewhere, e.g. in a pool worker. `start` is wall-clock seconds."""
+        if not self.enabled:
+            return
+        call_sid = call_sid or current_call.get()
+        if start is None:
+            start = time.time() - seconds
+        with self._lock:
+            trace = self._observe(stage, seconds, outcome, call_sid, start, attrs)
+        if not self._otel_failed and stage not in HOT_STAGES:
+            self._export(stage, start, seconds, outcome, attrs, trace)
+
+    def record_frame(self, received: float, decoded: float):
+        """The per-frame stages, from perf_counter() readings: "decode" (JSON, base64, μ-law) and "frame" (to now)."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        call_sid = current_call.get()
+        with self._lock:
+            self._observe("decode", decoded - received, "ok", call_sid, 0.0, None)
+            self._observe("frame", now - received, "ok", call_sid, 0.0, None)
+
+    def _observe(self, stage, seconds, outcome, call_sid, start, attrs) -> Optional[CallTrace]:
+        histogram = self.histograms.get((stage, outcome))
+        if histogram is None:
+            histogram = self.histograms[(stage, outcome)] = Histogram()
+        histogram.observe(seconds)
+        if call_sid is None:
+            return None
+        trace = self.traces.get(call_sid)
+        if trace is None:
+            trace = self.traces[call_sid] = CallTrace(call_sid)
+            while len(self.traces) > TRACE_CALLS:
+                self.traces.popitem(last=False)
+        trace.add(stage, start, seconds, outcome, attrs)
+        return trace
+
+    def record_run(self, run, call_sid: str = None):
+        """Agent steps of a finished WorkflowRun, as "agent.<step>" spans."""
+        if not self.enabled:
+            return
+        origin = time.time() - run.elapsed()
+        for name, timing in run.timings.items():
+            self.record(f"agent.{name}", timing.duration, call_sid, "cached" if timing.cached else "ok", origin + timing.start)
+        if "first_token" in run.marks:
+            self.record("pitch_first_token", run.marks["first_token"], call_sid, start=origin)
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]):
+        self.gauges[name] = (help, read)
+
+    def trace(self, call_sid: str) -> Optional[dict]:
+        trace = self.traces.get(call_sid)
+        return trace.as_dict() if trace is not None else None
+
+    def end_call(self, call_sid: str):
+        """Closes the call's OpenTelemetry root span; its trace stays readable until evicted."""
+        trace = self.traces.get(call_sid)
+        if trace is not None and trace.root is not None:
+            trace.root.end()
+            trace.root = None
+
+    def _tracer(self):
+        if self._otel is None:
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            except ImportError as e:
+                print(f"OpenTelemetry export disabled, SDK not installed: {e}")
+                self._otel_failed = True
+                return None
+            provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))  # endpoint from OTEL_EXPORTER_OTLP_ENDPOINT
+            self._otel = provider.get_tracer("app.telemetry")
+        return self._otel
+
+    def _export(self, stage, start, seconds, outcome, attrs, trace: Optional[CallTrace]):
+        tracer = self._tracer()
+        if tracer is None:
+            return
+        from opentelemetry import trace as otel_trace
+
+        context = None
+        if trace is not None:
+            if trace.root is None:
+                trace.root = tracer.start_span("call", start_time=int(start * 1e9), attributes={"call.sid": trace.call_sid})
+            context = otel_trace.set_span_in_context(trace.root)
+        attributes = {"outcome": outcome, **{k: str(v) for k, v in attrs.items()}}
+        if trace is not None:
+            attributes["call.sid"] = trace.call_sid
+        span = tracer.start_span(stage, context=context, start_time=int(start * 1e9), attributes=attributes)
+        span.end(end_time=int((start + seconds) * 1e9))
+
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4."""
+        lines = [
+            "# HELP gromo_stage_seconds Time spent in each call pipeline stage.",
+            "# TYPE gromo_stage_seconds histogram",
+        ]
+        with self._lock:
+            histograms = [(key, list(h.counts), h.sum) for key, h in sorted(self.histograms.items())]
+        for (stage, outcome), counts, total in histograms:
+            labels = f'stage="{stage}",outcome="{outcome}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'gromo_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"gromo_stage_seconds_sum{{{labels}}} {total}")
+            lines.append(f"gromo_stage_seconds_count{{{labels}}} {cumulative}")
+        for name, (help, read) in self.gauges.items():
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+span = tracer.span
+record = tracer.record
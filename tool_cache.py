@@ -0,0 +1,167 @@
+"""Process-wide cache for agent tool calls (YFinance quotes, Google searches).
+
+Every agent shares one wrapped toolkit instance per tool, so a ticker or a
+query fetched by one agent is reused by the others until its TTL runs out.
+Concurrent identical calls are coalesced into a single fetch, and quotes
+that keep getting hit are refreshed in the background shortly before they
+expire, so hot tickers practically never miss.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+
+from app import telemetry
+from app.lazy import lazy
+
+load_dotenv()
+
+# Seconds each kind of result stays fresh
+TOOL_TTLS = {
+    "get_current_stock_price": float(os.getenv("TOOL_TTL_QUOTE", "15")),
+    "get_historical_stock_prices": float(os.getenv("TOOL_TTL_HISTORY", "3600")),
+    "get_company_news": float(os.getenv("TOOL_TTL_NEWS", "900")),
+    "google_search": float(os.getenv("TOOL_TTL_SEARCH", str(6 * 3600))),
+}
+DEFAULT_TTL = float(os.getenv("TOOL_TTL_DEFAULT", "3600"))
+# Only these are kept warm by the refresher
+HOT_TOOLS = {"get_current_stock_price"}
+HOT_MIN_HITS = int(os.getenv("TOOL_HOT_MIN_HITS", "3"))
+REFRESH_INTERVAL = float(os.getenv("TOOL_REFRESH_INTERVAL", "2"))
+MAX_ENTRIES = int(os.getenv("TOOL_CACHE_SIZE", "5000"))
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "ttl", "hits", "fetch")
+
+    def __init__(self, value, ttl, fetch):
+        self.value = value
+        self.ttl = ttl
+        self.expires = time.time() + ttl
+        self.hits = 0  # since the last (re)fetch
+        self.fetch = fetch
+
+
+class ToolCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._inflight = {}  # key -> Future of the fetch every concurrent caller waits on
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.hits = self.misses = self.coalesced = self.refreshed = 0
+
+    def get_or_fetch(self, key, fetch, ttl: float, hot: bool = False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.time():
+                entry.hits += 1
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._store(key, value, ttl, fetch if hot else None)
+        future.set_result(value)
+        if hot:
+            self._ensure_refresher()
+        return value
+
+    def _store(self, key, value, ttl, fetch):
+        self._entries[key] = _Entry(value, ttl, fetch)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _ensure_refresher(self):
+        if self._refresher is None:
+            with self._lock:
+                if self._refresher is None:
+                    self._refresher = threading.Thread(target=self._refresh_loop, name="tool-cache-refresh", daemon=True)
+                    self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            now = time.time()
+            with self._lock:
+                due = [
+                    (key, entry) for key, entry in self._entries.items()
+                    if entry.fetch is not None and entry.hits >= HOT_MIN_HITS
+                    and entry.expires - now < max(entry.ttl * 0.25, REFRESH_INTERVAL * 1.5)
+                ]
+            for key, entry in due:
+                try:
+                    value = entry.fetch()
+                except Exception as e:
+                    print(f"Tool cache refresh failed for {key[0]}: {e}")
+                    continue
+                with self._lock:
+                    self._store(key, value, entry.ttl, entry.fetch)
+                    self.refreshed += 1
+
+    def wrap(self, tool_name: str, fn, ttl: float = None, hot: bool = None):
+        ttl = TOOL_TTLS.get(tool_name, DEFAULT_TTL) if ttl is None else ttl
+        hot = tool_name in HOT_TOOLS if hot is None else hot
+
+        @functools.wraps(fn)
+        def cached(*args, **kwargs):
+            key = (tool_name, args, tuple(sorted(kwargs.items())))
+            with telemetry.span(f"tool.{tool_name}"):
+                return self.get_or_fetch(key, lambda: fn(*args, **kwargs), ttl, hot)
+
+        return cached
+
+    def as_dict(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshed": self.refreshed,
+        }
+
+
+tool_cache = ToolCache()
+
+
+def cache_toolkit(toolkit):
+    """Routes every function registered on an agno Toolkit through the shared cache."""
+    for name, function in toolkit.functions.items():
+        function.entrypoint = tool_cache.wrap(name, function.entrypoint)
+    return toolkit
+
+
+@lazy
+def yfinance_tools():
+    from agno.tools.yfinance import YFinanceTools
+
+    return cache_toolkit(YFinanceTools())
+
+
+@lazy
+def google_search_tools():
+    from agno.tools.googlesearch import GoogleSearchTools
+
+    return cache_toolkit(GoogleSearchTools())
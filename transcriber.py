@@ -1,32 +1,29 @@
-import whisper
-from pydub import AudioSegment
-import io
-import tempfile
 import os
+from dotenv import load_dotenv
+from app.audio_preprocess import get_preprocessor
+from app.lazy import lazy
 
-# Load Whisper model once
-model = whisper.load_model("base")  # use "tiny" if needed
+load_dotenv()
 
-# Set a safe custom temp directory
-safe_temp_dir = os.path.join(os.getcwd(), "temp_audio_files")
-os.makedirs(safe_temp_dir, exist_ok=True)
-tempfile.tempdir = safe_temp_dir
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")  # use "tiny" if needed
 
-async def transcribe_user_audio_chunk(audio_bytes: bytes) -> str:
-    try:
-        # Convert raw audio (Twilio: 8kHz, 16-bit PCM, mono)
-        audio = AudioSegment.from_raw(io.BytesIO(audio_bytes), sample_width=2, frame_rate=8000, channels=1)
 
-        # Create a safe temp .wav file in your controlled directory
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False, dir=safe_temp_dir) as tmp:
-            temp_wav_path = tmp.name
-            audio.export(temp_wav_path, format="wav")
+# Load Whisper model once, on first use (or at warm-up), and share it between threads
+@lazy
+def whisper_model():
+    import whisper
+
+    return whisper.load_model(WHISPER_MODEL)
 
-        # Transcribe using Whisper
-        result = model.transcribe(temp_wav_path)
 
-        # Clean up temp file
-        os.remove(temp_wav_path)
+# Blocking and CPU-heavy: called from the asr_pool workers, never on the event loop
+def transcribe_user_audio(samples) -> str:
+    try:
+        # Decoded Twilio audio is 8kHz PCM16 mono; Whisper takes float32 at 16kHz straight from memory
+        audio = get_preprocessor().process(samples)
+
+        # Transcribe using Whisper
+        result = whisper_model.get().transcribe(audio)
 
         return result["text"].strip()
     except Exception as e:
@@ -0,0 +1,195 @@
+"""Per-call transcripts as append-only segments.
+
+Final segments are appended in O(1) and never rewritten; each speaker's
+in-progress partial is held separately and replaced until its final arrives.
+`window(seconds)` walks back from the newest segment only as far as the
+window reaches, so feeding the last 30 s to the pitch workflow costs the
+same at minute 1 and minute 60.
+
+Memory per call is bounded: at most MAX_SEGMENTS final segments (about
+200 bytes each for a typical 2-4 s utterance, so ~400 KB at the default)
+plus one partial per speaker. Older segments are spilled to
+TRANSCRIPT_DIR/<call_sid>.jsonl.gz (a hash of the SID if it is not a plain
+one) as the call goes on, and the rest when it ends. Each line is
+`[start, end, speaker, text]`.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "tmp/transcripts")
+MAX_SEGMENTS = int(os.getenv("TRANSCRIPT_MAX_SEGMENTS", "2000"))
+SPILL_BATCH = int(os.getenv("TRANSCRIPT_SPILL_BATCH", "200"))
+MAX_OPEN_CALLS = int(os.getenv("TRANSCRIPT_MAX_OPEN_CALLS", "1000"))
+# One thread for every call's spills: append() runs on the event loop and must not wait on gzip,
+# and a single worker writes each call's batches in the order they were handed over
+_spiller = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcript-spill")
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def spill_name(call_sid: str) -> str:
+    # The SID comes unchecked from the media stream's start message; anything that is not a plain
+    # Twilio-style SID is hashed so it cannot name a path outside the spill directory
+    if not _SAFE_NAME.match(call_sid):
+        call_sid = "sid-" + hashlib.sha256(call_sid.encode()).hexdigest()[:32]
+    return f"{call_sid}.jsonl.gz"
+
+
+@dataclass(frozen=True)
+class TranscriptSegment:
+    __slots__ = ("start", "end", "text", "speaker", "is_final")
+
+    start: float  # seconds since the stream started
+    end: float
+    text: str
+    speaker: str
+    is_final: bool
+
+    def as_row(self) -> list:
+        return [round(self.start, 3), round(self.end, 3), self.speaker, self.text]
+
+
+class CallTranscript:
+    def __init__(self, call_sid: str, max_segments: int = MAX_SEGMENTS, spill_dir: str = TRANSCRIPT_DIR):
+        self.call_sid = call_sid
+        self.max_segments = max_segments
+        self.spill_path = Path(spill_dir, spill_name(call_sid))
+        self._finals: Deque[TranscriptSegment] = deque()
+        self._partials: Dict[str, TranscriptSegment] = {}
+        self._lock = threading.Lock()
+        self.spilled = 0  # segments handed to the spill thread
+        self.closed = False
+        self._last_spill: Optional[Future] = None
+
+    def append(self, text: str, start: float, end: float, is_final: bool, speaker: str = "caller"):
+        segment = TranscriptSegment(start, end, text.strip(), speaker, is_final)
+        to_spill = None
+        with self._lock:
+            if not is_final:
+                self._partials[speaker] = segment
+                return
+            self._partials.pop(speaker, None)
+            if segment.text:
+                self._finals.append(segment)
+            if len(self._finals) > self.max_segments:
+                to_spill = [self._finals.popleft() for _ in range(min(SPILL_BATCH, len(self._finals)))]
+                self.spilled += len(to_spill)
+                self._last_spill = _spiller.submit(self._spill, to_spill)
+
+    def window(self, seconds: Optional[float] = None, include_partials: bool = True) -> List[TranscriptSegment]:
+        """Segments that end within `seconds` of the newest one, oldest first (everything held if None)."""
+        with self._lock:
+            partials = list(self._partials.values()) if include_partials else []
+            latest = max([s.end for s in partials] + ([self._finals[-1].end] if self._finals else []), default=0.0)
+            cutoff = latest - seconds if seconds is not None else float("-inf")
+            segments = []
+            for segment in reversed(self._finals):
+                if segment.end < cutoff:
+                    break
+                segments.append(segment)
+        segments.reverse()
+        segments.extend(sorted((s for s in partials if s.end >= cutoff), key=lambda s: s.start))
+        return segments
+
+    def text(self, seconds: Optional[float] = None, include_partials: bool = True, speakers: bool = False) -> str:
+        segments = self.window(seconds, include_partials)
+        if speakers:
+            return "\n".join(f"{s.speaker}: {s.text}" for s in segments)
+        return " ".join(s.text for s in segments)
+
+    def __len__(self):
+        return self.spilled + len(self._finals)
+
+    def segments(self) -> Iterator[TranscriptSegment]:
+        """Every final segment of the call, spilled ones included. Waits for spills still being written."""
+        with self._lock:
+            held = list(self._finals)
+            pending = self._last_spill
+        if pending is not None:
+            pending.result()
+        if self.spill_path.exists() and self.spilled:
+            yield from read_spilled(self.spill_path)
+        yield from held
+
+    def _spill(self, segments: List[TranscriptSegment]):
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            # Appending gzip members keeps the file a valid stream without rewriting it
+            with gzip.open(self.spill_path, "at", encoding="utf-8") as f:
+                for segment in segments:
+                    f.write(json.dumps(segment.as_row(), ensure_ascii=False, separators=(",", ":")) + "\n")
+        except OSError as e:
+            print(f"Spilling {len(segments)} transcript segments of {self.call_sid} failed: {e}")
+
+    def close(self, persist: bool = True, wait: bool = True) -> Optional[Path]:
+        """Ends the call: pending partials are dropped and, if `persist`, the held segments spilled.
+
+        With `wait` (the default; call it off the event loop) it returns once everything is on disk.
+        """
+        with self._lock:
+            if self.closed:
+                return self.spill_path if self.spilled else None
+            self.closed = True
+            self._partials.clear()
+            held, self._finals = list(self._finals), deque()
+            if persist and held:
+                self.spilled += len(held)
+                self._last_spill = _spiller.submit(self._spill, held)
+            pending = self._last_spill
+        if wait and pending is not None:
+            pending.result()  # the spill thread is FIFO, so the earlier batches are done too
+        return self.spill_path if self.spilled else None
+
+
+def read_spilled(path) -> Iterator[TranscriptSegment]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            start, end, speaker, text = json.loads(line)
+            yield TranscriptSegment(start, end, text, speaker, True)
+
+
+class TranscriptStore:
+    """Open call transcripts by call SID; closed ones only live on disk."""
+
+    def __init__(self, max_open: int = MAX_OPEN_CALLS):
+        self.max_open = max_open
+        self._calls: "OrderedDict[str, CallTranscript]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, call_sid: str) -> CallTranscript:
+        with self._lock:
+            transcript = self._calls.get(call_sid)
+            if transcript is None:
+                transcript = self._calls[call_sid] = CallTranscript(call_sid)
+                # A call whose stream never sent "stop" must not pin its transcript forever
+                while len(self._calls) > self.max_open:
+                    _, stale = self._calls.popitem(last=False)
+                    stale.close(wait=False)
+            return transcript
+
+    def find(self, call_sid: str) -> Optional[CallTranscript]:
+        with self._lock:
+            return self._calls.get(call_sid)
+
+    def close(self, call_sid: str, persist: bool = True) -> Optional[Path]:
+        with self._lock:
+            transcript = self._calls.pop(call_sid, None)
+        return transcript.close(persist) if transcript is not None else None
+
+    def __len__(self):
+        return len(self._calls)
+
+
+transcripts = TranscriptStore()
@@ -0,0 +1,162 @@
+"""Content-addressed cache of synthesized speech under public_audio/.
+
+A clip is named after the hash of (text, voice, model), so the same phrase
+is synthesized once and then served as a static file: Twilio can <Play> it
+straight from /audio/<name> with no synthesis latency. The directory is
+kept under TTS_CACHE_MAX_MB by evicting the least recently used clips;
+recency survives restarts through the files' mtimes. The directory is
+scanned on first use (or by `prewarm` during warm-up), not at import.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.lazy import Lazy
+
+load_dotenv()
+
+AUDIO_DIR = "public_audio"
+PREFIX = "tts-"
+DEFAULT_VOICE = os.getenv("TTS_VOICE", "Rachel")
+DEFAULT_MODEL = os.getenv("TTS_MODEL", "eleven_monolingual_v1")
+MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+DISCLAIMER = (
+    "Disclaimer: This call may be recorded for quality and training purposes. "
+    "Welcome to Gromo services. How can I help you today?"
+)
+# The quick injections offered in the dashboard (myapp.py)
+QUICK_RESPONSES = [
+    "Thank you for holding. Let me get that information for you.",
+    "I understand your concern. Let me explain how we can help.",
+    "That's a great question. Here's what I recommend...",
+    "Let me transfer you to a specialist who can better assist you.",
+]
+STOCK_PHRASES = [DISCLAIMER, *QUICK_RESPONSES]
+
+
+def clip_name(text: str, voice: str = DEFAULT_VOICE, model: str = DEFAULT_MODEL) -> str:
+    key = hashlib.sha256("\0".join((model, voice, text.strip())).encode()).hexdigest()[:32]
+    return f"{PREFIX}{key}.mp3"
+
+
+def _synthesize(text: str, voice: str, model: str) -> bytes:
+    # Imported here so the cache (and serving cached clips) works without the ElevenLabs SDK loaded
+    from app.elevenlabs_tts import generate_tts_audio
+
+    return generate_tts_audio(text, voice, model)
+
+
+class TTSCache:
+    def __init__(self, directory: str = AUDIO_DIR, max_bytes: int = MAX_BYTES, synthesize=_synthesize):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()  # LRU order, oldest first
+        self._total = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evicted = 0
+        self._index = Lazy(self._scan, name=f"tts cache index ({directory})")
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith(PREFIX) and not name.endswith(".tmp"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._sizes[name] = size
+            self._total += size
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def lookup(self, text: str, voice: str = DEFAULT_VOICE, model: str = DEFAULT_MODEL) -> Optional[str]:
+        """Name of the cached clip for this phrase, or None; never synthesizes."""
+        name = clip_name(text, voice, model)
+        return name if self.touch(name) else None
+
+    def touch(self, name: str) -> bool:
+        """Marks a clip as just used; False if it is not cached."""
+        self._index.get()
+        with self._lock:
+            if name not in self._sizes:
+                return False
+            self._sizes.move_to_end(name)
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+        return True
+
+    def get_or_synthesize(self, text: str, voice: str = DEFAULT_VOICE, model: str = DEFAULT_MODEL) -> str:
+        """Name of the clip under AUDIO_DIR, synthesizing it on a miss. Concurrent misses share one synthesis."""
+        name = clip_name(text, voice, model)
+        if self.touch(name):
+            self.hits += 1
+            return name
+        with self._lock:
+            future = self._inflight.get(name)
+            owner = future is None
+            if owner:
+                future = self._inflight[name] = Future()
+                self.misses += 1
+        if not owner:
+            return future.result()
+        try:
+            self.put(name, self.synthesize(text, voice, model))
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[name]
+        future.set_result(name)
+        return name
+
+    def put(self, name: str, audio: bytes):
+        self._index.get()
+        tmp = self.path(name) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, self.path(name))  # readers never see a partial clip
+        with self._lock:
+            self._total += len(audio) - self._sizes.pop(name, 0)
+            self._sizes[name] = len(audio)
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                old, size = self._sizes.popitem(last=False)
+                self._total -= size
+                self.evicted += 1
+                try:
+                    os.remove(self.path(old))
+                except OSError:
+                    pass
+
+    def prewarm(self, phrases=STOCK_PHRASES, voice: str = DEFAULT_VOICE, model: str = DEFAULT_MODEL):
+        self._index.get()
+        for phrase in phrases:
+            try:
+                self.get_or_synthesize(phrase, voice, model)
+            except Exception as e:
+                print(f"TTS pre-warm failed for {phrase[:40]!r}: {e}")
+
+    def as_dict(self):
+        self._index.get()
+        return {
+            "clips": len(self._sizes),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+tts_cache = TTSCache()
@@ -0,0 +1,190 @@
+"""Streaming TTS: pitch text is split into sentences that are synthesized
+concurrently through ElevenLabs' /stream endpoint and yielded strictly in
+order, so the first sentence plays while the rest are still being made.
+
+At most TTS_CONCURRENCY sentences are in flight. The sentence being played
+is streamed through as its bytes arrive; the ones behind it buffer until
+their turn. Sentences already in tts_cache are read from disk, and finished
+mp3 sentences are added to it, so recurring pitch fragments are free the
+second time.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+from app import telemetry
+from app.tts_cache import DEFAULT_MODEL, DEFAULT_VOICE, clip_name, tts_cache
+
+load_dotenv()
+
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+# Point at a local stand-in (app.benchmarks.bench_tts_stream) to test without the real service
+ELEVENLABS_URL = os.getenv("ELEVENLABS_URL", "https://api.elevenlabs.io")
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "3"))
+MP3 = "mp3_44100_128"
+# Voice names used elsewhere (tts_cache keys, the legacy SDK) to the ids the HTTP API wants
+VOICE_IDS = {"Rachel": "21m00Tcm4TlvDq8ikWAM", "en": os.getenv("EN_VOICE_ID"), "hi": os.getenv("HI_VOICE_ID")}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n+")
+MIN_SENTENCE_CHARS = 20  # tiny fragments ("Sure.") are merged forward; each request has fixed overhead
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences, pending = [], ""
+    for part in _SENTENCE_END.split(text.strip()):
+        part = re.sub(r"^[-\s]+", "", re.sub(r"[*#_`]", "", part)).strip()  # markdown is not spoken
+        if not part:
+            continue
+        pending = f"{pending} {part}".strip()
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        sentences.append(pending)
+    return sentences
+
+
+class TTFAStats:
+    """Time from request to first audio byte, and to the last one."""
+
+    def __init__(self, window: int = 500):
+        self.first: Deque[float] = deque(maxlen=window)
+        self.total: Deque[float] = deque(maxlen=window)
+        self.streams = self.sentences = self.cached_sentences = self.errors = 0
+
+    def as_dict(self):
+        def summary(values):
+            ordered = sorted(values)
+            if not ordered:
+                return None
+            return {"p50": ordered[len(ordered) // 2], "p95": ordered[int(len(ordered) * 0.95)], "max": ordered[-1]}
+
+        return {
+            "streams": self.streams,
+            "sentences": self.sentences,
+            "cached_sentences": self.cached_sentences,
+            "errors": self.errors,
+            "concurrency": TTS_CONCURRENCY,
+            "ttfa_s": summary(self.first),
+            "total_s": summary(self.total),
+        }
+
+
+stats = TTFAStats()
+_session = None
+
+
+def session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=60),
+            headers={"xi-api-key": ELEVENLABS_API_KEY or ""},
+        )
+    return _session
+
+
+async def shutdown():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def synthesize_sentence(text: str, voice: str, model: str, output_format: str) -> AsyncIterator[bytes]:
+    voice_id = VOICE_IDS.get(voice) or voice
+    started, first = time.perf_counter(), True
+    async with session().post(
+        f"{ELEVENLABS_URL}/v1/text-to-speech/{voice_id}/stream",
+        params={"output_format": output_format, "optimize_streaming_latency": "3"},
+        json={"text": text, "model_id": model},
+    ) as res:
+        res.raise_for_status()
+        async for chunk in res.content.iter_chunked(4096):
+            if first:
+                first = False
+                telemetry.record("tts_first_byte", time.perf_counter() - started, format=output_format)
+            yield chunk
+
+
+def _read_cached(text: str, voice: str, model: str) -> Optional[bytes]:
+    cached = tts_cache.lookup(text, voice, model)
+    if not cached:
+        return None
+    with open(tts_cache.path(cached), "rb") as f:
+        return f.read()
+
+
+async def _produce(text: str, voice: str, model: str, output_format: str, out: asyncio.Queue):
+    """Feeds one sentence's audio into `out`, ending with None (or the exception that stopped it)."""
+    try:
+        if output_format == MP3:
+            # The lookup touches the clip's mtime and the read is a file read; neither belongs on the loop
+            cached = await asyncio.to_thread(_read_cached, text, voice, model)
+            if cached is not None:
+                stats.cached_sentences += 1
+                await out.put(cached)
+                return
+        audio = []
+        async for chunk in synthesize_sentence(text, voice, model, output_format):
+            audio.append(chunk)
+            await out.put(chunk)
+        if output_format == MP3:
+            await asyncio.to_thread(tts_cache.put, clip_name(text, voice, model), b"".join(audio))
+    except Exception as e:
+        await out.put(e)
+    finally:
+        await out.put(None)
+
+
+async def stream_tts(
+    text: str,
+    voice: str = DEFAULT_VOICE,
+    model: str = DEFAULT_MODEL,
+    output_format: str = MP3,
+    concurrency: int = TTS_CONCURRENCY,
+) -> AsyncIterator[bytes]:
+    """Audio for `text` in order, sentence by sentence, with `concurrency` sentences synthesizing ahead."""
+    started = time.perf_counter()
+    sentences = deque(split_sentences(text))
+    window: Deque[asyncio.Task] = deque()
+    queues: Deque[asyncio.Queue] = deque()
+    first = True
+    stats.streams += 1
+    stats.sentences += len(sentences)
+
+    def refill():
+        while sentences and len(window) < concurrency:
+            queue = asyncio.Queue()
+            queues.append(queue)
+            window.append(asyncio.create_task(_produce(sentences.popleft(), voice, model, output_format, queue)))
+
+    try:
+        refill()
+        while window:
+            queue = queues[0]
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if first:
+                    first = False
+                    stats.first.append(time.perf_counter() - started)
+                    telemetry.record("tts_first_audio", stats.first[-1])
+                yield chunk
+            window.popleft()
+            queues.popleft()
+            refill()
+        stats.total.append(time.perf_counter() - started)
+    except Exception:
+        stats.errors += 1
+        raise
+    finally:
+        # The listener hung up or an injection was interrupted: stop paying for sentences nobody will hear
+        for task in window:
+            task.cancel()
@@ -1,25 +1,97 @@
 import os
-from fastapi.responses import FileResponse
-from fastapi import APIRouter
+import asyncio
+from typing import Optional
+from urllib.parse import urlencode
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from twilio.twiml.voice_response import VoiceResponse
+from app.tts_cache import DEFAULT_MODEL, DEFAULT_VOICE, tts_cache
+from app.tts_stream import stream_tts
+from app.call_sessions import CallNotFound, registry
+from app import audio_store
 
 AUDIO_DIR = "public_audio"
+PUBLIC_URL = os.getenv("NGROK_URL", "https://yourdomain.com")
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
 router = APIRouter()
 
 class AudioPayload(BaseModel):
-    filename: str
+    filename: Optional[str] = None
+    text: Optional[str] = None  # played through /tts/stream when no pre-made file is given
+
+class InjectPayload(BaseModel):
+    call_sid: str
+    audio_text: str
+    interrupt: bool = False  # cut off whatever is playing instead of queueing behind it
+
+class CallPayload(BaseModel):
+    call_sid: str
+
+class TTSPayload(BaseModel):
+    text: str
+    voice: str = DEFAULT_VOICE
+    model: str = DEFAULT_MODEL
 
 @router.post("/inject-audio")
 def inject_audio(payload: AudioPayload):
     response = VoiceResponse()
-    public_url = f"https://yourdomain.com/audio/{payload.filename}"
+    if payload.filename:
+        # Twilio only plays 8 kHz μ-law; fetching that directly skips the oversized original
+        public_url = f"{PUBLIC_URL}/audio/{audio_store.telephony_name(payload.filename)}"
+    else:
+        public_url = f"{PUBLIC_URL}/tts/stream?{urlencode({'text': payload.text or ''})}"
     response.play(public_url)
     return str(response)
 
-@router.get("/audio/{filename}")
-async def serve_audio(filename: str):
-    file_path = os.path.join(AUDIO_DIR, filename)
-    return FileResponse(file_path, media_type="audio/wav")
+@router.api_route("/audio/{filename}", methods=["GET", "HEAD"])
+async def serve_audio(filename: str, request: Request):
+    # `<stem>.ulaw.wav` is transcoded from `<stem>.wav`/`.mp3` on first request, then served from disk
+    path = await asyncio.to_thread(audio_store.resolve, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    name = os.path.basename(path)
+    tts_cache.touch(name)  # keeps clips that are still being played out of LRU eviction
+    stat = os.stat(path)
+    if audio_store.is_content_addressed(name):
+        etag = audio_store.etag(path, stat)
+    else:
+        etag = await asyncio.to_thread(audio_store.etag, path, stat)  # hashes the file the first time
+    headers = {"ETag": etag, "Cache-Control": audio_store.cache_control(name)}
+    if audio_store.not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    # FileResponse answers Range requests, and hands the file to the server (pathsend) where supported
+    return FileResponse(path, media_type=audio_store.media_type(name), headers=headers, stat_result=stat)
+
+@router.post("/tts/synthesize")
+async def synthesize(payload: TTSPayload):
+    # Repeated phrases are a file read; only a miss pays for synthesis, off the event loop
+    filename = await asyncio.to_thread(tts_cache.get_or_synthesize, payload.text, payload.voice, payload.model)
+    return FileResponse(os.path.join(AUDIO_DIR, filename), media_type="audio/mpeg", headers={"X-Audio-File": filename})
+
+@router.get("/tts/stream")
+async def tts_stream(text: str, voice: str = DEFAULT_VOICE, model: str = DEFAULT_MODEL):
+    # Chunked: the first sentence is on the wire while the later ones are still being synthesized
+    return StreamingResponse(stream_tts(text, voice, model), media_type="audio/mpeg")
+
+@router.post("/inject/play")
+async def inject_play(payload: InjectPayload):
+    # Frames go back on the call's own media stream as synthesis produces them, on whichever worker holds it
+    try:
+        result = await registry.call(payload.call_sid, "inject", text=payload.audio_text, interrupt=payload.interrupt)
+    except CallNotFound:
+        raise HTTPException(status_code=404, detail="No live call with this SID")
+    if not result["bidirectional"]:
+        raise HTTPException(status_code=409, detail="Call is not on a bidirectional stream (MEDIA_STREAM_MODE=connect)")
+    if result["injection"] is None:
+        raise HTTPException(status_code=429, detail="Too many injections queued for this call")
+    return {"status": "queued", "injection": result["injection"], "call_sid": payload.call_sid}
+
+@router.post("/inject/clear")
+async def inject_clear(payload: CallPayload):
+    try:
+        cleared = await registry.call(payload.call_sid, "clear")
+    except CallNotFound:
+        raise HTTPException(status_code=404, detail="No live call with this SID")
+    return {"status": "cleared" if cleared else "idle", "call_sid": payload.call_sid}
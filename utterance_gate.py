@@ -0,0 +1,236 @@
+"""Local gate in front of the agent chain: does this utterance warrant a new pitch?
+
+Every final utterance is scored on the CPU in well under a millisecond:
+
+  - intent (filler, question, objection, interest, personal_info, closing) and
+    sentiment (-1..1), from two softmax-regression heads over the
+    HashingEmbedder vector plus a few surface features (raw and leading
+    words, per-intent cue words, question mark, length);
+  - product mentions, from a lexicon.
+
+The model trains on data/utterances.jsonl the first time it is used, which
+takes about 150 ms: main.py's warm-up does it in a thread, and otherwise
+CallSession holds a call's first utterances until it has trained off the
+event loop. A call's CallGate fires the agents only on meaningful
+change: a product mentioned for the first time, a confident question,
+objection or closing, a sentiment swing, or enough new substance since the
+last pitch. "okay" and "hmm" never do; they are kept and sent along with
+the next utterance that does.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.lazy import Lazy
+from app.semantic_cache import HashingEmbedder, normalize
+
+load_dotenv()
+
+TRAINING_DATA = Path(os.getenv("GATE_TRAINING_DATA", Path(__file__).parent / "data" / "utterances.jsonl"))
+MIN_CONFIDENCE = float(os.getenv("GATE_MIN_CONFIDENCE", "0.5"))
+SENTIMENT_SHIFT = float(os.getenv("GATE_SENTIMENT_SHIFT", "0.8"))
+MIN_NEW_WORDS = int(os.getenv("GATE_MIN_NEW_WORDS", "8"))  # content words since the last pitch
+COOLDOWN_S = float(os.getenv("GATE_COOLDOWN_S", "6"))  # between pitches fired for "new_context"
+
+INTENTS = ["filler", "question", "objection", "interest", "personal_info", "closing"]
+URGENT_INTENTS = {"question", "objection", "closing"}
+SENTIMENTS = [-1, 0, 1]
+PRODUCTS = {
+    "sip": r"\bsips?\b",
+    "mutual_fund": r"\bmutual funds?\b|\bfunds?\b",
+    "fixed_deposit": r"\bfixed deposits?\b|\bfds?\b",
+    "recurring_deposit": r"\brecurring deposits?\b|\brds?\b",
+    "insurance": r"\binsurance\b|\bpolicy\b|\bpremium\b|\bterm plan\b|\blic\b",
+    "loan": r"\bloans?\b|\bemis?\b",
+    "credit_card": r"\bcredit cards?\b|\bcard\b",
+    "gold": r"\bgold\b",
+    "ppf": r"\bppf\b",
+    "nps": r"\bnps\b|\bpension\b",
+    "demat": r"\bdemat\b|\bstocks?\b|\bshares?\b",
+}
+_PRODUCT_PATTERNS = {name: re.compile(pattern) for name, pattern in PRODUCTS.items()}
+_WORD = re.compile(r"[a-z']+|\d+")
+# Cue words per intent; they carry over to sentences the training set has never seen
+CUES = {
+    "question": "what how is are can does do will when which why who kitna kya kab kaise if any".split(),
+    "negation": "no not don't dont never can't cant won't nahi nahin".split(),
+    "objection": "too already trust scam fraud busy later afford waste lied lost risk stuck think".split(),
+    "closing": "send share link proceed sign start register apply next book agree form whatsapp email pay".split(),
+    "personal": "my i'm earn salary income kids son daughter wife husband father parents rent years old job work".split(),
+    "interest": "want like good interested sounds would helpful better idea needed safe grow save".split(),
+}
+SURFACE_DIM = 128
+
+
+def find_products(text: str) -> List[str]:
+    lowered = text.lower()
+    return [name for name, pattern in _PRODUCT_PATTERNS.items() if pattern.search(lowered)]
+
+
+class UtteranceFeatures:
+    def __init__(self, dim: int = 1024):
+        self.embedder = HashingEmbedder(dim)
+        self.dim = dim + SURFACE_DIM
+
+    @staticmethod
+    def _bucket(feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=2).digest(), "little") % (SURFACE_DIM - 4 - len(CUES))
+
+    def __call__(self, text: str) -> np.ndarray:
+        # The embedding drops stopwords, which are exactly what separates "what is it" from "it is"
+        words = _WORD.findall(text.lower())
+        surface = np.zeros(SURFACE_DIM, dtype=np.float32)
+        for feature in [f"first:{w}" for w in words[:2]] + [f"last:{w}" for w in words[-1:]] + words:
+            surface[self._bucket(feature)] += 1.0
+        for i, cues in enumerate(CUES.values()):
+            surface[-5 - i] = min(sum(w in cues for w in words), 3) / 3
+        surface[-4] = "?" in text
+        surface[-3] = any(w in CUES["question"] for w in words[:1])  # questions lead with their question word
+        surface[-2] = len(words) <= 3
+        surface[-1] = min(len(words), 20) / 20
+        return np.concatenate((self.embedder.embed(text), surface))
+
+
+class SoftmaxHead:
+    """Multinomial logistic regression trained with full-batch gradient descent."""
+
+    def __init__(self, labels: list):
+        self.labels = labels
+        self.W = None
+        self.b = None
+
+    @staticmethod
+    def _softmax(z: np.ndarray) -> np.ndarray:
+        z = z - z.max(axis=-1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=-1, keepdims=True)
+
+    def fit(self, X: np.ndarray, y: list, epochs: int = 300, lr: float = 1.0, l2: float = 1e-4):
+        Y = np.eye(len(self.labels), dtype=np.float32)[[self.labels.index(v) for v in y]]
+        self.W = np.zeros((X.shape[1], len(self.labels)), dtype=np.float32)
+        self.b = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(epochs):
+            grad = (self._softmax(X @ self.W + self.b) - Y) / len(X)
+            self.W -= lr * (X.T @ grad + l2 * self.W)
+            self.b -= lr * grad.sum(axis=0)
+        return self
+
+    def proba(self, x: np.ndarray) -> np.ndarray:
+        return self._softmax(x @ self.W + self.b)
+
+
+@dataclass
+class UtteranceScore:
+    intent: str
+    confidence: float
+    sentiment: float  # P(positive) - P(negative)
+    products: List[str]
+
+
+class UtteranceClassifier:
+    def __init__(self, features: UtteranceFeatures = None):
+        self.features = features or UtteranceFeatures()
+        self.intent = SoftmaxHead(INTENTS)
+        self.sentiment = SoftmaxHead(SENTIMENTS)
+
+    def fit(self, rows: List[dict]) -> "UtteranceClassifier":
+        X = np.stack([self.features(r["text"]) for r in rows])
+        self.intent.fit(X, [r["intent"] for r in rows])
+        self.sentiment.fit(X, [r["sentiment"] for r in rows])
+        return self
+
+    def score(self, text: str) -> UtteranceScore:
+        x = self.features(text)
+        intent = self.intent.proba(x)
+        sentiment = self.sentiment.proba(x)
+        best = int(intent.argmax())
+        return UtteranceScore(INTENTS[best], float(intent[best]), float(sentiment[2] - sentiment[0]), find_products(text))
+
+
+def load_rows(path: Path = TRAINING_DATA) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+classifier = Lazy(lambda: UtteranceClassifier().fit(load_rows()), name="utterance_classifier")
+
+
+class GateStats:
+    def __init__(self, window: int = 2000):
+        self.utterances = 0
+        self.triggers: Dict[str, int] = {}
+        self.score_ms: Deque[float] = deque(maxlen=window)
+
+    def as_dict(self):
+        ordered = sorted(self.score_ms)
+        return {
+            "utterances": self.utterances,
+            "triggers": sum(self.triggers.values()),
+            "by_reason": dict(self.triggers),
+            "suppressed": self.utterances - sum(self.triggers.values()),
+            "score_p50_ms": ordered[len(ordered) // 2] if ordered else None,
+            "score_p99_ms": ordered[int(len(ordered) * 0.99)] if ordered else None,
+        }
+
+
+stats = GateStats()
+
+
+@dataclass
+class GateDecision:
+    trigger: bool
+    reason: Optional[str]
+    score: UtteranceScore
+    query: str  # what the agents should see: every utterance since the last pitch
+    elapsed_ms: float
+
+
+@dataclass
+class CallGate:
+    """Per-call state: sentiment trend, products already discussed, utterances not yet pitched on."""
+
+    sentiment: Optional[float] = None
+    products: set = field(default_factory=set)
+    pending: Deque[str] = field(default_factory=lambda: deque(maxlen=20))
+    last_trigger_at: float = float("-inf")
+
+    def observe(self, text: str, at: float, model: UtteranceClassifier = None) -> GateDecision:
+        started = time.perf_counter()
+        score = (model or classifier.get()).score(text)
+        self.pending.append(text)
+        new_products = set(score.products) - self.products
+        self.products |= new_products
+        shift = abs(score.sentiment - self.sentiment) if self.sentiment is not None else 0.0
+        self.sentiment = score.sentiment if self.sentiment is None else 0.5 * self.sentiment + 0.5 * score.sentiment
+
+        reason = None
+        if new_products:
+            reason = "product"
+        elif score.intent == "filler":
+            reason = None
+        elif score.intent in URGENT_INTENTS and score.confidence >= MIN_CONFIDENCE:
+            reason = score.intent
+        elif shift >= SENTIMENT_SHIFT:
+            reason = "sentiment_shift"
+        elif at - self.last_trigger_at >= COOLDOWN_S and sum(len(normalize(t)) for t in self.pending) >= MIN_NEW_WORDS:
+            reason = "new_context"
+
+        query = ""
+        if reason:
+            query = " ".join(self.pending)
+            self.pending.clear()
+            self.last_trigger_at = at
+            stats.triggers[reason] = stats.triggers.get(reason, 0) + 1
+        elapsed = 1000 * (time.perf_counter() - started)
+        stats.utterances += 1
+        stats.score_ms.append(elapsed)
+        return GateDecision(reason is not None, reason, score, query, elapsed)
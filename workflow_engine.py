@@ -0,0 +1,95 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+@dataclass
+class Step:
+    """One node of a workflow: an async callable that receives its dependencies' results by name."""
+
+    name: str
+    fn: Callable[..., Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+
+
+@dataclass
+class StepTiming:
+    start: float  # seconds since the workflow run started
+    end: float
+    cached: bool = False
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class WorkflowRun:
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, StepTiming] = field(default_factory=dict)
+    marks: Dict[str, float] = field(default_factory=dict)  # named instants, e.g. first_token
+    prompt_tokens: Dict[str, int] = field(default_factory=dict)  # per agent, for this turn
+    started: float = field(default_factory=time.perf_counter)
+    # Called as on_event(step, status, elapsed) with status "started", "done" or "cached"
+    on_event: Optional[Callable[[str, str, float], None]] = None
+
+    def emit(self, step: str, status: str):
+        if self.on_event is not None:
+            self.on_event(step, status, self.elapsed())
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def mark(self, name: str):
+        self.marks[name] = self.elapsed()
+
+    def timing_summary(self) -> str:
+        parts = [f"{name} {t.duration:.2f}s{' (cached)' if t.cached else ''}" for name, t in self.timings.items()]
+        parts += [f"{name} at {at:.2f}s" for name, at in self.marks.items()]
+        return ", ".join(parts)
+
+
+class Cached:
+    """Return value for a step that reused an earlier result instead of doing the work."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class AsyncWorkflow:
+    """Runs steps concurrently; each one starts as soon as the steps it depends on have finished."""
+
+    def __init__(self, *steps: Step):
+        self.steps = {s.name: s for s in steps}
+        for s in steps:
+            missing = [d for d in s.deps if d not in self.steps]
+            if missing:
+                raise ValueError(f"Step {s.name!r} depends on unknown steps {missing}")
+
+    async def run(self, run: WorkflowRun = None, **inputs) -> WorkflowRun:
+        run = run or WorkflowRun()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def execute(step: Step):
+            deps = {d: await tasks[d] for d in step.deps}
+            start = run.elapsed()
+            run.emit(step.name, "started")
+            value = await step.fn(**inputs, **deps)
+            cached = isinstance(value, Cached)
+            if cached:
+                value = value.value
+            run.timings[step.name] = StepTiming(start, run.elapsed(), cached)
+            run.emit(step.name, "cached" if cached else "done")
+            run.results[step.name] = value
+            return value
+
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.ensure_future(execute(step))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return run